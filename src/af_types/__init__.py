@@ -8,14 +8,20 @@ INTRO 5 : Types drive all ActorForth behavior and construction. ActorForth
 """
 
 import logging
+import sys
 from typing import Dict, List, Tuple, Callable, Any, Optional, Generator, Sequence
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from itertools import chain
+from functools import partial
 
 
 from stack import Stack
 from aftype import AF_Type, AF_Continuation, StackObject, Symbol, Location
-from operation import Op_list, Op_map, Op_name, Operation, Operation_def, TypeSignature, op_nop, SigValueTypeMismatchException
+from operation import Op_list, Op_map, Op_name, Operation, Operation_def, TypeSignature, op_nop, SigValueTypeMismatchException, \
+                      SIG_MATCH, SIG_MISMATCH, SIG_UNDERRUN
+from dispatch import DispatchCache, DecisionTree, CtorIndex
+from tracing import trace, Lazy
+from wire import register_codec
 
 
 Type_name = str
@@ -44,11 +50,52 @@ def default_op_handler(cont): # Had to remove Python typing notation to get it t
 INTRO 5.2 : A TypeDefinition is defined as a list of named Operations, ops_list,
             and its handler, op_handler, which defines what you want to
             do with these named Operations when they're referenced.
+
+            The ops_index maps each name to its overloads (in ops_list order)
+            so that words can be found without walking the whole dictionary.
+            Names with several overloads get a DecisionTree, built when
+            first needed and thrown away whenever another overload is added.
 """
 @dataclass
 class TypeDefinition:
     ops_list: Op_list
     op_handler : Callable[["AF_Continuation"],None] = default_op_handler 
+    ops_index : Dict[Op_name, Op_list] = field(default_factory = dict, repr = False)
+    trees : Dict[Op_name, DecisionTree] = field(default_factory = dict, repr = False)
+
+    def __post_init__(self) -> None:
+        self.ops_index = {}
+        self.trees = {}
+        for op in self.ops_list:
+            self.ops_index.setdefault(sys.intern(op.name), []).append(op)
+
+    def add(self, op: Operation) -> None:
+        # Names are interned like Symbol ids so lookups match on identity.
+        self.ops_list.append(op)
+        self.ops_index.setdefault(sys.intern(op.name), []).append(op)
+        self.trees.pop(op.name, None)
+
+    def remove(self, op: Operation) -> None:
+        # Undoes add(op). Ops are only ever removed newest first.
+        assert self.ops_list[-1] is op
+        self.ops_list.pop()
+        named = self.ops_index[op.name]
+        named.remove(op)
+        if not named: del self.ops_index[op.name]
+        self.trees.pop(op.name, None)
+
+    def find(self, name: Op_name) -> Op_list:
+        # Returns all the overloads for a name or an empty list.
+        return self.ops_index.get(name, [])
+
+    def tree(self, name: Op_name) -> Optional[DecisionTree]:
+        # Returns the DecisionTree for a name with more than one overload.
+        tree = self.trees.get(name)
+        if tree is None:
+            ops = self.find(name)
+            if len(ops) < 2: return None
+            tree = self.trees[name] = DecisionTree(ops)
+        return tree
 
 
 """
@@ -80,17 +127,86 @@ class Type(AF_Type):
     """
     ctors : Dict[Type_name, Op_map] = {"Any":[]}
 
+    """
+    INTRO 5.7 : Every change to the dictionaries bumps the epoch so that
+                anything derived from them (like the dispatch cache used by
+                Type.op) knows to throw its results away.
+    """
+    epoch : int = 0
+    dispatch_cache : DispatchCache = DispatchCache()
+
+    # While there's a checkpoint outstanding every change to the dictionaries
+    # also pushes a function undoing it onto the journal. A checkpoint is just
+    # the journal's length at the time and rolling back to one runs the undos
+    # since, newest first - so neither depends on how big the dictionaries
+    # are. Once the last checkpoint is rolled back or released the journal
+    # is emptied (nothing can be undone without one).
+    journal : List[Callable[[], None]] = []
+    marks : List[int] = []      # Checkpoints outstanding.
+
+    # Files loaded by the load word (see modules.py) -> the Type.types they
+    # were loaded into. Loading one is journaled like any other change so
+    # rolling back past it means it gets loaded again.
+    loaded : Dict[str, Any] = {}
+    ctor_index : CtorIndex = CtorIndex()
+
+    # There is only ever one Type object per name - Type("Int") hands back
+    # the same instance every time - and each gets a small integer id in the
+    # order it was first seen. Whether it is generic and which TypeDefinition
+    # it uses are worked out once and kept on the instance (until Type.types
+    # is replaced wholesale, as restoring a checkpoint does).
+    registry : Dict[Type_name, "Type"] = {}
+    by_id : List["Type"] = []
+
+    def __new__(cls, typename: Type_name, handler = None) -> "Type":
+        self = Type.registry.get(typename)
+        if self is None:
+            self = super(Type, cls).__new__(cls)
+            self.name = typename
+            self.id = len(Type.by_id)
+            self.generic = Type.is_generic_name(typename)
+            self._types = None
+            self._ctors = None
+            self._definition = None
+            Type.registry[typename] = self
+            Type.by_id.append(self)
+        return self
+
     def __init__(self, typename: Type_name, handler = None):
+        # Nothing to do unless this is the first time we've seen this name
+        # since the dictionaries were (re)created.
+        if self._types is Type.types and self._ctors is Type.ctors: return
         assert Type.types["Any"]
         if handler is None:
             handler = default_op_handler
-        self.name = typename
-        if not self.is_generic():
+        if not self.generic:
             if not Type.ctors.get(self.name, False):
                 Type.ctors[self.name] = []
+                Type.record(partial(self._forget, Type.ctors))
             if not Type.types.get(self.name, False):
                 t_def = TypeDefinition(ops_list=[], op_handler=handler)
                 Type.types[self.name] = t_def    
+                Type.record(partial(self._forget, Type.types))
+        self._ctors = Type.ctors
+        self._bind()
+
+    def _bind(self) -> None:
+        self._definition = Type.types["Any"] if self.generic else Type.types[self.name]
+        self._types = Type.types
+
+    def _forget(self, dictionary: Dict[Type_name, Any]) -> None:
+        # Undoes our creation in one of the dictionaries.
+        dictionary.pop(self.name, None)
+        self._types = self._ctors = self._definition = None
+
+    def __copy__(self) -> "Type":
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "Type":
+        return self
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (Type, (self.name,))
 
     @staticmethod
     def is_generic_name(name: Type_name) -> bool:
@@ -100,21 +216,21 @@ class Type(AF_Type):
 
 
     def is_generic(self) -> bool:        
-        return Type.is_generic_name(self.name)
-        #print("is_generic for %s is: %s." % (self.name, result))
-        
+        return self.generic
+
+
+    def definition(self) -> TypeDefinition:
+        if self._types is not Type.types:
+            self._bind()
+        return self._definition
 
 
     def words(self) -> Op_list:
-        if self.is_generic():
-            return Type.types["Any"].ops_list
-        return Type.types[self.name].ops_list
+        return self.definition().ops_list
 
 
     def handler(self):
-        if self.is_generic():
-            return Type.types["Any"].op_handler
-        return Type.types[self.name].op_handler
+        return self.definition().op_handler
 
 
     @staticmethod
@@ -135,51 +251,18 @@ class Type(AF_Type):
         op_map = Type.ctors.get(name, None)
         assert op_map is not None, ("No ctor map for type %s found.\n\tCtors exist for the following types: %s." % (name, Type.ctors.keys()))
         op_map.append((input_sig,op))
+        Type.record(op_map.pop)
+        Type.ctor_index.clear()
 
 
     @staticmethod
-    def find_ctor(name: Type_name, inputs : List["StackObject"]) -> Optional[Operation]:
-        # Given a stack of input types, find the first matching ctor.
-        logging.debug("Attempting to find a ctor for Type '%s' using the following input types: %s." % (name, inputs))
-        logging.debug("Type '%s' has the following %s ctors: %s." % (name, len(Type.ctors.get(name,[])),Type.ctors.get(name,[])))
-
-        for type_sig in Type.ctors.get(name,[]):
-
-            logging.debug("Trying against type_sig = %s." % str(type_sig))
-            matching = False
-            inputs = inputs.copy()
-            try:
-                ctor_obj : StackObject
-                for ctor_obj in type_sig[0]:
-                    in_obj = inputs.pop(0)
-                    logging.debug("ctor_obj candidate: %s vs in_obj: %s." % (ctor_obj, in_obj))
-                    # Match against value first.
-                    if ctor_obj.value is not None:
-                        if ctor_obj.value != in_obj.value:
-                            logging.debug("Failed value match for %s against ctor value %s." % (ctor_obj.value, in_obj.value))
-                            matching = False
-                            break
-                    if in_obj.stype.is_generic() or ctor_obj.stype.is_generic():
-                        logging.debug("Matching ctor for Generic 'Any' type.")
-                        matching = True
-                        continue
-                    if in_obj.stype == ctor_obj.stype:
-                        logging.debug("Matching ctor for specific '%s' type." % in_obj.stype)
-                        matching = True
-                    else:
-                        logging.debug("Failed match for '%s' against ctor '%s' types." % (in_obj, ctor_obj))
-                        matching = False
-                        break
-            except IndexError:
-                # wasn't enough on the stack to match
-                logging.debug("Ran out of inputs to match a ctor for '%s' type." % name)
-                matching = False
-                break
-
-            if matching == True:
-                result : Operation = type_sig[1]
-                return result
-        return None
+    def find_ctor(name: Type_name, inputs : Sequence["StackObject"]) -> Optional[Operation]:
+        # Given a stack of input types (oldest first), find the first ctor
+        # whose input signature matches the top of it.
+        Type.ctor_index.validate(Type.ctors)
+        result = Type.ctor_index.find(name, inputs)
+        trace("find_ctor for Type '%s' with inputs %s found %s.", name, inputs, result)
+        return result
 
 
     # Inserts a new operations for the given type name (or global for Any).
@@ -201,28 +284,68 @@ class Type(AF_Type):
         if existing_words:
             assert existing_words, "ERROR - there are existing words of lengths other than %s : %s." \
                 % (op.sig.stack_in.depth(), [(x,x.sig.stack_in.depth()) for x in existing_words])
-        type_def.words().append(op)
-        logging.debug("Added Op:'%s' to %s." % (op,type_def))
+        t_def = type_def.definition()
+        t_def.add(op)
+        Type.record(partial(t_def.remove, op))
+        Type.dictionary_changed()
+        trace("Added Op:'%s' to %s.", op, type_def)
+
+
+    @staticmethod
+    def dictionary_changed() -> None:
+        Type.epoch += 1
+
+
+    @staticmethod
+    def record(undo: Callable[[], None]) -> None:
+        # Notes how to undo a change for any checkpoint outstanding.
+        if Type.marks: Type.journal.append(undo)
+
+
+    @staticmethod
+    def checkpoint() -> int:
+        # Marks the current state of the dictionaries for rollback (or release).
+        mark = len(Type.journal)
+        Type.marks.append(mark)
+        return mark
+
+
+    @staticmethod
+    def rollback(mark: int) -> None:
+        # Returns the dictionaries to how they were when checkpoint() returned mark.
+        assert mark in Type.marks and mark <= len(Type.journal), "Unknown checkpoint %s." % mark
+        while len(Type.journal) > mark:
+            Type.journal.pop()()
+        # Checkpoints taken since are gone too.
+        Type.marks = [m for m in Type.marks if m <= mark]
+        Type.release(mark)
+        Type.ctor_index.clear()
+        Type.dictionary_changed()
+
+
+    @staticmethod
+    def release(mark: int) -> None:
+        # Keeps everything since checkpoint() returned mark.
+        Type.marks.remove(mark)
+        if not Type.marks: Type.journal.clear()
 
 
     @staticmethod
     def find_named_ops_for_scope(name: Op_name, type_context: "Type", recurse_option: Optional[Operation] = None) -> Generator[Operation, None, None]:
-        logging.debug("find_named_ops_for_scope name:'%s', type_context:'%s', recurse_option:%s." % (name, type_context, recurse_option))
-        for op in type_context.words():
-            #logging.debug("Checking against: %s. op.name = '%s'." % (op, op.name))
-            if op.name == name: 
-                logging.debug("\tyielding op:%s" % op)
-                yield(op)  # Return any matching Ops with this name.
+        trace("find_named_ops_for_scope name:'%s', type_context:'%s', recurse_option:%s.", name, type_context, recurse_option)
+        for op in type_context.definition().find(name):
+            trace("\tyielding op:%s", op)
+            yield(op)  # Return any matching Ops with this name.
         # If there's a possible recursive call for an unregistered method with an input type sig...
         if recurse_option is not None:
             if recurse_option.sig.stack_in.depth():
                 # If the last type for the potential recursive call matches our scope...
                 if recurse_option.sig.stack_in.tos().stype == type_context:
-                    logging.debug("\tyielding recurse_option:%s" % recurse_option)
+                    trace("\tyielding recurse_option:%s", recurse_option)
                     yield(recurse_option)
             # If the potential recursive call has no input sig and we're in global scope...
             elif type_context.is_generic(): 
-                logging.debug("\tyielding 'Any' recurse_option:%s" % recurse_option)
+                trace("\tyielding 'Any' recurse_option:%s", recurse_option)
                 yield(recurse_option)        
         
 
@@ -232,41 +355,101 @@ class Type(AF_Type):
     def find_op(name: Op_name, cont: AF_Continuation, type_name: Type_name) -> Tuple[Operation, bool]:
 
         type_def : TypeDefinition = Type.types[type_name] # (type_name,Type.types["Any"])
-        cont.log.debug("Searching for op:'%s' in type: '%s'." % (name,type_name))
+        trace("Searching for op:'%s' in type: '%s'.", name, type_name)
         assert type_def is not None, "No type '%s' found. We have: %s" % (type,Type.types.keys())
         name_found = False
         sigs_found : List[TypeSignature] = []
         if type_def:
-            op_list = type_def.ops_list
-            cont.log.debug("\top_list = %s" % [op for op in op_list])
-            for op in op_list:
-                if op.name == name:
-                    name_found = True
-                    sigs_found.append(op.sig)
-                    # Now try to match the input stack...
-                    try:
-                        if op.check_stack_effect(cont.stack): # TODO - are we doing the right thing with this return types?
-                            cont.log.debug("Found! Returning %s, %s, %s" % (op, op.sig, True))
-                            return op, True
-                    except SigValueTypeMismatchException:
-                        # We found the name but not the right value/type sig. Keep looking.
-                        pass
+            named_ops = type_def.find(name)
+            trace("\tnamed_ops = %s", named_ops)
+            tree = type_def.tree(name)
+            data = cont.stack.view()
+            if tree is not None and len(data) >= tree.depth:
+                op, result = tree.match(data)
+                if result == SIG_MATCH:
+                    trace("Found! Returning %s, %s, %s", op, op.sig, True)
+                    return op, True
+                if result == SIG_UNDERRUN:
+                    cont.log.error("Input stack underrun! Op %s won't fit stack %s." % (op, cont.stack))
+                    raise Exception("Stack Underrun!")
+                name_found = True
+                sigs_found = [op.sig for op in named_ops]
+                named_ops = [] # Nothing else will match.
+            for op in named_ops:
+                name_found = True
+                sigs_found.append(op.sig)
+                # Now try to match the input stack...
+                result = op.match_stack(cont.stack)
+                if result == SIG_MATCH:
+                    trace("Found! Returning %s, %s, %s", op, op.sig, True)
+                    return op, True
+                if result == SIG_UNDERRUN:
+                    cont.log.error("Input stack underrun! Op %s won't fit stack %s." % (op, cont.stack))
+                    raise Exception("Stack Underrun!")
+                # We found the name but not the right value/type sig. Keep looking.
         # Not found.
         if name_found:
             # Is this what we want to do?
             # This will happen if names match but stacks don't.
-            cont.log.debug("Continuation (stack = %s) doesn't match Op '%s' with available signatures: %s." % (cont.stack, name, [s.stack_in for s in sigs_found]))
+            trace("Continuation (stack = %s) doesn't match Op '%s' with available signatures: %s.", cont.stack, name, Lazy(lambda: [s.stack_in for s in sigs_found]))
             raise Exception("Continuation (stack = %s) doesn't match Op '%s' with available signatures: %s." % (cont.stack, name, [s.stack_in for s in sigs_found]))
 
-        cont.log.debug("Not found!")
+        trace("Not found!")
         # Default operation is to treat the symbol as an Atom and put it on the stack.
         return Operation("make_atom", make_atom, sig=TypeSignature([],[StackObject(stype=TAtom)])), False
 
 
+    # Returns how many items from the top of the stack can decide which Operation
+    # Type.op resolves this name to when the given type is on TOS, or -1 if the
+    # answer also depends on stack values and so can't be cached.
+    @staticmethod
+    def dispatch_depth(name: Op_name, tos_name: Optional[Type_name]) -> int:
+        candidates : Op_list = list(Type.types["Any"].find(name))
+        if tos_name is not None:
+            type_def = Type.types.get(tos_name)
+            # Unknown types and type default ('_') words get the slow path.
+            if type_def is None or type_def.find('_'):
+                return -1
+            candidates += type_def.find(name)
+        depth = 0
+        for op in candidates:
+            if op.has_value_patterns():
+                return -1
+            depth = max(depth, op.sig.stack_in.depth())
+        return depth
+
+
     @staticmethod
     def op(name: Op_name, cont: AF_Continuation, type_name: Type_name = "Any") -> Tuple[Operation, bool]:
+        tos_type = cont.stack.tos_type()
+        tos_name = None if tos_type is None else tos_type.name
+        cache = Type.dispatch_cache
+        cache.validate(Type.epoch, Type.types)
+
+        depth = cache.depths.get((name, tos_name))
+        if depth is None:
+            depth = cache.depths[(name, tos_name)] = Type.dispatch_depth(name, tos_name)
+        if depth < 0:
+            cache.fallbacks += 1
+            return Type.resolve_op(name, cont, type_name)
+
+        depth = min(depth, cont.stack.depth())
+        key = (name, tos_name, tuple([t.id for t in cont.stack.types(depth)]) if depth else ())
+        result = cache.entries.get(key)
+        if result is not None:
+            cache.hits += 1
+            return result
+        cache.misses += 1
+        # Anything that raises (no matching signature) is never cached.
+        result = cache.entries[key] = Type.resolve_op(name, cont, type_name)
+        return result
+
+
+    # Uncached lookup behind Type.op.
+    @staticmethod
+    def resolve_op(name: Op_name, cont: AF_Continuation, type_name: Type_name = "Any") -> Tuple[Operation, bool]:
         # TODO : Word lookup is not matching based on values. need to fix this to proceed.
-        cont.log.debug("op(name:'%s', type_name:'%s')." % (name,type_name))
+        trace("op(name:'%s', type_name:'%s').", name, type_name)
         tos = cont.stack.tos()
         op : Operation = Operation("invalid_result!", make_atom)
         sig : TypeSignature = TypeSignature([],[])
@@ -274,43 +457,44 @@ class Type(AF_Type):
 
         if tos is not Stack.Empty:
             # We first look for an atom specialized for the type/value on TOS.
-            cont.log.debug("Stack isn't empty so look for something specialized for Type:%s." % tos.stype.name)
+            trace("Stack isn't empty so look for something specialized for Type:%s.", tos.stype.name)
             op, found = Type.find_op(name, cont, tos.stype.name)
         else:
-            cont.log.debug("Stack is empty.")
+            trace("Stack is empty.")
 
         if not found:
             # If Stack is empty or no specialized atom exists then search the global dictionary.
-            cont.log.debug("Not found thus far calling find_op(name:%s, cont, 'Any')." % name)
+            trace("Not found thus far calling find_op(name:%s, cont, 'Any').", name)
             op, found = Type.find_op(name, cont, "Any")
 
         if tos is not Stack.Empty and not found:
             # There's no such operation by that 'name' in existence
             # so let's find the default op for this type or else from the global dict
             # (as that's the make_atom op returned by default for Type.find_op.)
-            cont.log.debug("Searching for default specialized for Type: %s." % tos.stype.name)
+            trace("Searching for default specialized for Type: %s.", tos.stype.name)
             op, found = Type.find_op('_', cont, tos.stype.name)
             op.name = name
 
-        cont.log.debug("Type.op(name:'%s',cont.symbol:'%s' returning op=%s, sig=%s, found=%s." % (name,cont.symbol,op,sig,found))
+        trace("Type.op(name:'%s',cont.symbol:'%s' returning op=%s, sig=%s, found=%s.", name, cont.symbol, op, sig, found)
         return op, found
 
     # NOTE - we support comparisons between Type and str.
+    # Types are singletons so comparing two of them is comparing their ids.
     def __eq__(self, t: object) -> bool:    
-        if self.is_generic(): return True
-        if isinstance(t, Type): return self.name == t.name
+        if self.generic: return True
+        if type(t) is Type: return self is t
         return self.name == t
 
 
     def __ne__(self, t: object) -> bool:      
-        if self.is_generic(): return False
-        if isinstance(t, Type): return self.name != t.name
+        if self.generic: return False
+        if type(t) is Type: return self is not t
         return self.name != t
 
 
     def __lt__(self, t: object) -> bool:
         # Any Types come last in sorting line. Otherwise lexical sort by name.
-        if self.is_generic(): return False
+        if self.generic: return False
         if isinstance(t, Type): return self.name < t.name
         return self.name < str(t) # Typing requires that string cast. Odd.
 
@@ -334,6 +518,7 @@ INTRO 5.7 : The Atom Type is what gets created any time a new Symbol
             environment as Atoms.
 """
 TAtom = Type("Atom")
+register_codec(TAtom, 1, lambda v: v.encode("utf-8"), lambda b: b.decode("utf-8"))
 
 
 """
@@ -356,7 +541,7 @@ INTRO 5.9 : make_atom is the primitive that takes a token and converts
 """
 # Atom needs to take the symbol name to push on the stack.
 def make_atom(c: AF_Continuation) -> None:
-    c.log.debug("make_atom c.symbol = '%s'" % c.symbol)
+    trace("make_atom c.symbol = '%s'", c.symbol)
     if c.symbol is None:
         c.symbol = Symbol("Unknown", Location())
     text = c.symbol.s_id
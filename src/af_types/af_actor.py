@@ -0,0 +1,193 @@
+"""
+af_actor.py - spawning actors and sending messages between them.
+
+    "ponger" spawn      # -> Actor      Starts a new actor running the word ponger.
+    42 int pong send    # ->            Sends the Int to the Actor pong.
+    receive             # -> Any        Waits for the next message sent to us.
+    Int receive_match   # -> Any        Waits for the next Int sent to us, leaving the rest.
+    0 int receive_match # -> Any        Waits for the next Int 0 sent to us.
+    self                # -> Actor      Who we are (so others can reply).
+    100 int "block" mailbox   # ->      Holds at most 100 messages (see below).
+
+Messages can be anything so compiled words say what they expect with
+`receive int`, `receive actor` and so on. receive_match takes a pattern
+like those of pattern matching words (see compiler.py) - a Type matches
+any message of that Type and anything else only messages equal to it.
+There's no signature saying what Type a literal should be so they're
+given one as they would be anywhere else (`0 int` rather than `0`).
+
+A mailbox holding as many messages as it's allowed either makes whoever
+is sending wait for room ("block"), throws away the oldest message to
+make room ("drop_oldest") or makes the send fail ("fail"). A limit of 0
+is no limit.
+
+See scheduler.py for how actors take turns running.
+"""
+import struct
+
+from . import *
+from .af_int import TInt
+from operation import impure
+from scheduler import scheduler, Actor, DROP_OLDEST, FAIL, POLICIES
+from wire import register_codec
+
+
+TActor = Type("Actor")
+# Sent to other processes as just the pid (see cluster.py).
+PID_WIRE = struct.Struct("<Q")
+register_codec(TActor, 4, lambda a: PID_WIRE.pack(a.pid), lambda b: scheduler.address(PID_WIRE.unpack(b)[0]))
+
+
+def op_actor(c: AF_Continuation) -> None:
+    # Only checks that the Any we've been given really is an Actor.
+    assert c.stack.tos().stype == TActor, "%s isn't an Actor." % c.stack.tos()
+    c.stack.push(StackObject(value=c.stack.pop().value, stype=TActor))
+make_word_context('actor', op_actor, [TAny], [TActor])
+
+
+def spawn_word(name: Op_name, location: Location = None) -> Actor:
+    """
+    Starts a new actor running the word called name.
+    """
+    actor = scheduler.spawn([])
+    # The word is found as it would be on the new actor's (empty) stack.
+    op, found = Type.op(name, actor.cont)
+    if not found:
+        scheduler.exit(actor)
+        raise Exception("No word '%s' to spawn." % name)
+    actor.cont.code = [(op, Symbol(name, location or Location()))]
+    return actor
+
+
+@impure
+def op_spawn(c: AF_Continuation) -> None:
+    name = c.stack.pop().value
+    c.stack.push(StackObject(value=spawn_word(name, c.symbol.location), stype=TActor))
+make_word_context('spawn', op_spawn, [TAtom], [TActor])
+
+
+@impure
+def op_send(c: AF_Continuation) -> None:
+    actor = c.stack.tos().value
+    mailbox = actor.mailbox
+    if mailbox.full() and mailbox.policy != DROP_OLDEST:
+        if mailbox.policy == FAIL:
+            raise Exception("The mailbox of %s is full." % actor)
+        sender = scheduler.actor(c)
+        if sender.scheduled:
+            # Try again once there's room.
+            assert c.executing == 1, "Can't wait for room from inside Python code."
+            scheduler.block(sender, actor)
+            c.ip -= 1
+            return
+        scheduler.run(until = lambda: not mailbox.full())
+        if mailbox.full():
+            raise Exception("Nothing left running that could make room in the mailbox of %s." % actor)
+    transport = scheduler.transport
+    if actor.cont is None and transport is not None and transport.full(actor):
+        sender = scheduler.actor(c)
+        if sender.scheduled:
+            # Try again once more can go to its process.
+            assert c.executing == 1, "Can't wait for room from inside Python code."
+            transport.hold(sender, actor)
+            c.ip -= 1
+            return
+        scheduler.run(until = lambda: not transport.full(actor))
+    c.stack.pop()
+    scheduler.send(actor, c.stack.pop())
+make_word_context('send', op_send, [TAny, TActor], [])
+
+
+@impure
+def op_receive(c: AF_Continuation) -> None:
+    actor = scheduler.actor(c)
+    if not actor.mailbox:
+        if actor.scheduled:
+            # Try again once something's been sent to us.
+            assert c.executing == 1, "Can't wait for messages from inside Python code."
+            scheduler.wait(actor)
+            c.ip -= 1
+            return
+        # Nobody else runs the scheduler for us.
+        scheduler.run(until = lambda: len(actor.mailbox) > 0)
+        if not actor.mailbox:
+            raise Exception("Nothing left running that could send a message.")
+    c.stack.push(actor.mailbox.popleft())
+    if actor.mailbox.senders: scheduler.make_room(actor)
+make_word_context('receive', op_receive, [], [TAny])
+
+
+def pattern(o: StackObject) -> Tuple[Type_name, Any]:
+    """
+    The Type name and value (None for any) of the messages o matches.
+    """
+    if o.stype == TAtom:
+        _type = Type.get_type(o.value)
+        if _type is not None:
+            return _type.name, None
+    return o.stype.name, o.value
+
+
+@impure
+def op_receive_match(c: AF_Continuation) -> None:
+    actor = scheduler.actor(c)
+    name, value = pattern(c.stack.tos())
+    if Type.is_generic_name(name):
+        # Anything will do.
+        c.stack.pop()
+        op_receive(c)
+        return
+    take = lambda: actor.mailbox.take(name, value)
+    message = take()
+    if message is None:
+        if actor.scheduled:
+            # Try again once something else has been sent to us.
+            assert c.executing == 1, "Can't wait for messages from inside Python code."
+            scheduler.wait(actor)
+            c.ip -= 1
+            return
+        found : List[StackObject] = []
+        def matched() -> bool:
+            message = take()
+            if message is not None: found.append(message)
+            return bool(found)
+        scheduler.run(until = matched)
+        if not found:
+            raise Exception("Nothing left running that could send a message matching %s." % c.stack.tos())
+        message = found[0]
+    c.stack.pop()
+    c.stack.push(message)
+    if actor.mailbox.senders: scheduler.make_room(actor)
+make_word_context('receive_match', op_receive_match, [TAny], [TAny])
+
+
+@impure
+def op_mailbox(c: AF_Continuation) -> None:
+    policy = c.stack.pop().value
+    if policy not in POLICIES:
+        raise Exception("A full mailbox can only %s, not '%s'." % (", ".join(POLICIES), policy))
+    capacity = c.stack.pop().value
+    mailbox = scheduler.actor(c).mailbox
+    mailbox.capacity, mailbox.policy = capacity or None, policy
+make_word_context('mailbox', op_mailbox, [TInt, TAtom], [])
+
+
+@impure
+def op_self(c: AF_Continuation) -> None:
+    c.stack.push(StackObject(value=scheduler.actor(c), stype=TActor))
+make_word_context('self', op_self, [], [TActor])
+
+
+@impure
+def op_run_actors(c: AF_Continuation) -> None:
+    # Runs every actor until they've all finished or are waiting for messages.
+    scheduler.run()
+make_word_context('run_actors', op_run_actors)
+
+
+@impure
+def op_actor_stats(c: AF_Continuation) -> None:
+    print("\n%s" % scheduler)
+    if c.prompt:
+        print(c.prompt,end='',flush=True)
+make_word_context('actor_stats', op_actor_stats)
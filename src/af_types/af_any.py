@@ -1,10 +1,16 @@
 from . import *
 from copy import copy
+from optimizer import register_fusion, fused
+from operation import impure
+from codegen import register_template, shuffle
 
 # op_nop from continuation.
 make_word_context('nop', op_nop)
+# Also implements pattern matched words whose outputs are their inputs.
+register_template(op_nop, lambda g, args, word: args)
 
 
+@impure
 def op_print(c: AF_Continuation) -> None:
     op1 = c.stack.pop().value
     print("'%s'" % op1)
@@ -13,6 +19,7 @@ def op_print(c: AF_Continuation) -> None:
 make_word_context('print', op_print, [TAny])
 
 
+@impure
 def op_stack(c: AF_Continuation) -> None:
     if c.stack.depth() == 0:
         print("(data stack empty)")
@@ -42,6 +49,7 @@ def print_words() -> None:
                 print("%s Dictionary : %s" % (type_name,list(set([op.short_name() for op in _ops]))) )
 
 
+@impure
 def op_words(c: AF_Continuation) -> None:                
     print_words()
 
@@ -50,6 +58,7 @@ def op_words(c: AF_Continuation) -> None:
 make_word_context('words', op_words)
 
 
+@impure
 def op_print_types(c: AF_Continuation) -> None:
     print("\nTypes:")
     for type_name in Type.types.keys():
@@ -65,6 +74,14 @@ def op_print_types(c: AF_Continuation) -> None:
 make_word_context('types', op_print_types)                
 
 
+@impure
+def op_dispatch_stats(c: AF_Continuation) -> None:
+    print("\n%s" % Type.dispatch_cache)
+    if c.prompt:
+        print(c.prompt,end='',flush=True)
+make_word_context('dispatch_stats', op_dispatch_stats)
+
+
 #
 #   Should dup, swap, drop and any other generic stack operators 
 #   dynamically determine the actual stack types on the stack and
@@ -76,6 +93,7 @@ def op_dup(c: AF_Continuation) -> None:
     c.stack.push(s)
     #c.stack.push(op1) # This allowed value object instance variables to be tied to each other across StackObjects!
 make_word_context('dup', op_dup, [t("Any")],[TAny, TAny])
+register_template(op_dup, shuffle(0, 0))
 
 
 def op_swap(c: AF_Continuation) -> None:
@@ -84,11 +102,13 @@ def op_swap(c: AF_Continuation) -> None:
     c.stack.push(op1)
     c.stack.push(op2)
 make_word_context('swap', op_swap, [t("_a"), t("_b")],[t("_b"), t("_a")])
+register_template(op_swap, shuffle(1, 0))
 
 
 def op_drop(c: AF_Continuation) -> None:
     op1 = c.stack.pop()
 make_word_context('drop', op_drop, [TAny])
+register_template(op_drop, shuffle())
 
 
 def op_2dup(c: AF_Continuation) -> None:
@@ -101,3 +121,17 @@ def op_2dup(c: AF_Continuation) -> None:
     c.stack.push(s2)
     c.stack.push(s1)
 make_word_context('2dup', op_2dup, [t("_a"), t("_b")],[t("_a"), t("_b"), t("_a"), t("_b")])
+register_template(op_2dup, shuffle(0, 1, 0, 1))
+
+
+#
+#   Superinstructions for common sequences in compiled words.
+#
+def op_nip(c: AF_Continuation) -> None:
+    op1 = c.stack.pop()
+    c.stack.pop()
+    c.stack.push(op1)
+register_template(op_nip, shuffle(1))
+register_fusion('swap drop', [op_swap, op_drop], fused(op_nip), [t("_a"), t("_b")], [t("_b")])
+register_fusion('swap swap', [op_swap, op_swap], fused(op_nop), [t("_a"), t("_b")], [t("_a"), t("_b")])
+register_fusion('dup drop', [op_dup, op_drop], fused(op_nop), [TAny], [TAny])
@@ -3,9 +3,17 @@
 from . import *
 from aftype import StackObject
 from af_types.af_debug import *
+from af_types.af_any import op_2dup
+from operation import rebuildable
+from optimizer import register_fusion, fused
+from tracing import trace, Lazy
+from codegen import Generator, Slot, Template, codegen, register_template, register_value_type
+from wire import register_codec
 
 
 TBool = Type("Bool")
+register_value_type(TBool)
+register_codec(TBool, 3, lambda v: b"\x01" if v else b"\x00", lambda b: b == b"\x01")
 
 #
 #   Boolean algebra handling
@@ -40,6 +48,7 @@ Type.register_ctor('Bool',Operation('bool',op_bool),[StackObject(stype=TBool)])
 ###         is working properly then we shouldn't need this, right?
 make_word_context('bool', op_bool, [TAtom], [TBool])
 make_word_context('bool', op_bool, [TBool], [TBool])
+register_template(op_bool, lambda g, args, word: args if args[0][1] is TBool else None)
 
 
 # TODO : issue #17 wait for created gerneralize type infer
@@ -54,25 +63,34 @@ def optionally_infer_type_from_atom(c: AF_Continuation) -> StackObject:
     # is not, then automatically infer the top item's
     # type from the second item then perform the comparison.
     if sobj1.stype is TAtom and sobj2 is not TAtom:
-        c.log.debug("Trying to infer %s type from %s given the following: %s." % (sobj2.stype, sobj1, [c.stack.contents()]))
+        trace("Trying to infer %s type from %s given the following: %s.", sobj2.stype, sobj1, Lazy(c.stack.contents))
         # Pass along the entire list of types from the stack
         # in case the type's ctor takes multiple parameters.
         
         sobj2 = c.stack.pop()
         c.stack.push(sobj1)
 
-        ctor = Type.find_ctor( (sobj2.stype.name), c.stack.contents() )
+        ctor = Type.find_ctor( (sobj2.stype.name), c.stack.view() )
         assert ctor, "Couldn't find a ctor to infer a new %s type from %s." % (sobj2.stype, sobj1)
         # Call the ctor and put its result on the stack.
         #c.stack.push(sobj1)
         ctor(c)
         sobj1 = c.stack.pop()
         c.stack.push(sobj2)
-        c.log.debug("Converted from %s to %s." % (sobj1,c.stack.tos().stype))
+        trace("Converted from %s to %s.", sobj1, c.stack.tos().stype)
 
     return sobj1
 
 
+def compare_template(fmt: str) -> Template:
+    # Values of the same Type compare as the interpreter does. Anything
+    # else might need inferring from an Atom so is left to it.
+    def template(g: Generator, args: List[Slot], word: Operation) -> Optional[List[Slot]]:
+        if args[0][1] is not args[1][1] or args[0][1] is TAtom: return None
+        return [(g.temp(fmt % (args[0][0], args[1][0])), TBool)]
+    return template
+
+
 def op_equals(c: AF_Continuation) -> None:
     sobj1 = optionally_infer_type_from_atom(c)
     # Now we pop off whatever is the ultimate object that's
@@ -80,6 +98,7 @@ def op_equals(c: AF_Continuation) -> None:
     sobj2 = c.stack.pop()
     c.stack.push(StackObject(value=(sobj1 == sobj2), stype=TBool))
 make_word_context('==', op_equals, [TAny,TAny], [TBool])
+register_template(op_equals, compare_template("%s == %s"))
 
 
 def op_not_equals(c: AF_Continuation) -> None:
@@ -87,14 +106,16 @@ def op_not_equals(c: AF_Continuation) -> None:
     result = c.stack.tos()
     result.value = not result.value
 make_word_context('!=', op_not_equals, [TAny,TAny], [TBool])
+register_template(op_not_equals, compare_template("%s != %s"))
 
 
 def op_less_than(c: AF_Continuation) -> None:
     sobj1 = optionally_infer_type_from_atom(c)
     sobj2 = c.stack.pop()
-    c.log.debug("is %s (%s) < %s (%s)?" % (sobj2.value, type(sobj2.value), sobj1.value, type(sobj1.value)))
+    trace("is %s (%s) < %s (%s)?", sobj2.value, type(sobj2.value), sobj1.value, type(sobj1.value))
     c.stack.push(StackObject(value=(sobj2.value < sobj1.value), stype=TBool))
 make_word_context('<', op_less_than, [TAny,TAny], [TBool])
+register_template(op_less_than, compare_template("%s < %s"))
 
 
 def op_greater_than(c: AF_Continuation) -> None:
@@ -102,6 +123,7 @@ def op_greater_than(c: AF_Continuation) -> None:
     sobj2 = c.stack.pop()
     c.stack.push(StackObject(value=(sobj2.value > sobj1.value), stype=TBool))
 make_word_context('>', op_greater_than, [TAny,TAny], [TBool])
+register_template(op_greater_than, compare_template("%s > %s"))
 
 
 def op_less_than_or_equal_to(c: AF_Continuation) -> None:
@@ -109,6 +131,7 @@ def op_less_than_or_equal_to(c: AF_Continuation) -> None:
     sobj2 = c.stack.pop()
     c.stack.push(StackObject(value=(sobj2.value <= sobj1.value), stype=TBool))
 make_word_context('<=', op_less_than_or_equal_to, [TAny,TAny], [TBool])
+register_template(op_less_than_or_equal_to, compare_template("%s <= %s"))
 
 
 def op_greater_than_or_equal_to(c: AF_Continuation) -> None:
@@ -116,12 +139,15 @@ def op_greater_than_or_equal_to(c: AF_Continuation) -> None:
     sobj2 = c.stack.pop()
     c.stack.push(StackObject(value=(sobj2.value >= sobj1.value), stype=TBool))
 make_word_context('>=', op_greater_than_or_equal_to, [TAny,TAny], [TBool])
+register_template(op_greater_than_or_equal_to, compare_template("%s >= %s"))
 
 
 def op_not(c: AF_Continuation) -> None:
     # Restrict to only workong on Bools!
-    op1 = c.stack.tos().value = not c.stack.tos().value
+    # Push a new object - compiled constants share theirs between executions.
+    c.stack.push(StackObject(value=not c.stack.pop().value, stype=TBool))
 make_word_context('not', op_not, [TBool], [TBool])
+register_template(op_not, lambda g, args, word: [(g.temp("not %s" % args[0][0]), TBool)])
 
 
 def op_assert(c: AF_Continuation) -> None:
@@ -129,9 +155,41 @@ def op_assert(c: AF_Continuation) -> None:
     assert predicate
 make_word_context('assert', op_assert, [TBool], [])
 
+def assert_template(g: Generator, args: List[Slot], word: Operation) -> List[Slot]:
+    g.emit("assert %s" % args[0][0])
+    return []
+register_template(op_assert, assert_template)
+
 
 def op_assert_msg(c: AF_Continuation) -> None:
     msg = c.stack.pop().value
     predicate = c.stack.pop().value
     assert predicate, msg
-make_word_context('assert', op_assert_msg, [TBool, TAtom], [])
\ No newline at end of file
+make_word_context('assert', op_assert_msg, [TBool, TAtom], [])
+
+
+#
+#   Superinstructions for common sequences in compiled words.
+#
+@rebuildable
+def op_curry_2dup_compare(compare: Operation_def) -> Operation_def:
+    # Comparisons never modify their inputs so there's no need to copy them.
+    def op_2dup_compare(c: AF_Continuation) -> None:
+        op1 = c.stack.pop()
+        op2 = c.stack.tos()
+        c.stack.push(op1)
+        c.stack.push(op2)
+        c.stack.push(op1)
+        compare(c)
+    return op_2dup_compare
+
+def op_2dup_compare_template(g: Generator, args: List[Slot], word: Operation, compare: Operation_def) -> Optional[List[Slot]]:
+    result = codegen.templates[compare](g, args, word)
+    return args + result if result is not None else None
+register_template(op_curry_2dup_compare, op_2dup_compare_template)
+
+for name, compare in [('==', op_equals), ('!=', op_not_equals), ('<', op_less_than), ('>', op_greater_than),
+                        ('<=', op_less_than_or_equal_to), ('>=', op_greater_than_or_equal_to)]:
+    register_fusion('2dup %s' % name, [op_2dup, compare], fused(op_curry_2dup_compare(compare)),
+                    [t("_a"), t("_b")], [t("_a"), t("_b"), TBool])
+register_fusion('== not', [op_equals, op_not], fused(op_not_equals), [TAny, TAny], [TBool])
@@ -1,10 +1,12 @@
-from itertools import tee
 from dataclasses import dataclass
-from typing import Iterator, Tuple
+from typing import Sequence, Tuple
 
 from . import *
 from .af_int import *
 from stack import *
+from continuation import StreamCode, PCSave, TPCSave
+from operation import impure
+from tracing import trace
 
 """
 
@@ -24,16 +26,6 @@ loop : Int r:PC -> r:PC | r:None;
 10 countdown 
 """
 
-@dataclass
-class PCSave:
-	pc : Iterator[Tuple[int,Tuple[Operation,Symbol]]]
-	op : Operation
-	symbol : Symbol
-
-	val: Optional[int] = None
-	count: Optional[int] = None
-
-TPCSave = Type("PCSave")
 
 ###
 ### NOTE : We only perform type/stack checking on the dstack for now.
@@ -70,6 +62,7 @@ def op_2rdup(c: AF_Continuation) -> None:
 make_word_context('2rdup', op_2rdup)
 
 
+@impure
 def op_rstack(c: AF_Continuation) -> None:
     if c.rstack.depth() == 0:
         print("(return stack empty)")
@@ -97,10 +90,9 @@ make_word_context('to_dstack', op_mov_to_dstack, [], [TAny])
 
 
 def op_pcsave(c: AF_Continuation) -> None:	
-	c.log.debug("pcsave stack before op:%s sym:%s stack:%s." % (c.op.name, c.symbol.s_id, c.rstack))
-	c.pc, pc = tee(c.pc)
-	c.rstack.push(StackObject(value=PCSave(pc,c.op,c.symbol), stype=TPCSave))
-	c.log.debug("pcsave stack after op:%s sym:%s stack:%s." % (c.op.name, c.symbol.s_id, c.rstack))
+	trace("pcsave stack before op:%s sym:%s stack:%s.", c.op.name, c.symbol.s_id, c.rstack)
+	c.save_pc()
+	trace("pcsave stack after op:%s sym:%s stack:%s.", c.op.name, c.symbol.s_id, c.rstack)
 	#print("op_pcsave : %s" % c.op.name)
 make_word_context('pcsave', op_pcsave)
 
@@ -121,22 +113,17 @@ def op_pcreturn(c: AF_Continuation) -> None:
 		  means we have looping cross-levels and 
 		  that won't work!
 	"""
-	c.log.debug("pcreturn stack before op:%s sym:%s stack:%s." % (c.op.name, c.symbol.s_id, c.rstack))
-	assert c.rstack.tos().stype == TPCSave
+	trace("pcreturn stack before op:%s sym:%s stack:%s.", c.op.name, c.symbol.s_id, c.rstack)
 	# loops = []
 	# # Save any loop objects we encounter...
 	# while c.rstack.depth() and c.rstack.tos().value.val is not None:
 	# 	loops.append(c.rstack.pop())
-	pc = c.rstack.tos().value
-	c.pc, pc.pc = tee(pc.pc)
-	c.op = pc.op
-	c.symbol = pc.symbol
-	op_rdrop(c)
+	c.return_pc()
 	# # Restore the loop objects.
 	# for l in loops:
 	# 	c.rstack.push(l)
 	#print("op_pcreturn : %s" % c.op.name)
-	c.log.debug("pcreturn stack after op:%s sym:%s stack:%s." % (c.op.name, c.symbol.s_id, c.rstack))
+	trace("pcreturn stack after op:%s sym:%s stack:%s.", c.op.name, c.symbol.s_id, c.rstack)
 
 
 def op_start_countdown(c: AF_Continuation) -> None:
@@ -174,9 +161,11 @@ def op_loop(c: AF_Continuation) -> None:
 			c.rstack.push(r)
 		#print("op_loop continues...")
 	else:
-		c.pc, pc.pc = tee(pc.pc)
+		c.code, c.ip = pc.code, pc.ip
 		c.op = pc.op 
 		c.symbol = pc.symbol
+		# Any calls we've jumped out of won't be returned from.
+		c.frames = max(0, c.frames - len(returns))
 		for r in returns[-1::]:
 			print("dropping return for : %s" % r.value.op.name)
 		#print("op_loop loops back to : %s" % c.op.name)
@@ -1,28 +1,29 @@
 from itertools import tee
 from dataclasses import dataclass
 from typing import Iterator, Tuple
-from copy import deepcopy
 from datetime import datetime
 from os import system
 
 from . import *
 from .af_int import *
 from stack import *
-from af_types.af_branch import op_pcsave, op_pcreturn
-from interpret import interpret
+from operation import impure
 from continuation import Continuation
+from image import save_image
+from modules import load_module
 
 
 checkpoints = Stack()
 
+@impure
 def op_checkpoint(c: AF_Continuation) -> None:
-	types = deepcopy(Type.types)
-	ctors = deepcopy(Type.ctors)
+	# Only marks our place in the dictionary journal (see Type.checkpoint).
 	when = datetime.now()
-	checkpoints.push((types,ctors,when))
+	checkpoints.push((Type.checkpoint(),when))
 make_word_context('checkpoint', op_checkpoint, [], [])
 
 
+@impure
 def op_checkpoints(c: AF_Continuation) -> None:
 	if checkpoints.depth() == 0:
 		print("\nNo checkpoints saved.")
@@ -30,7 +31,7 @@ def op_checkpoints(c: AF_Continuation) -> None:
 		points = (checkpoints.contents()[::-1])
 		result = "\nCheckpoints:\n"
 		for count, point in enumerate(points):
-			ts = point[2].isoformat()[0:-7]
+			ts = point[1].isoformat()[0:-7]
 			result += "\t%s\t: %s\n" % (count+1,ts)
 		print(result)
 	if c.prompt:
@@ -38,11 +39,11 @@ def op_checkpoints(c: AF_Continuation) -> None:
 make_word_context('checkpoints', op_checkpoints, [], [])
 
 
+@impure
 def op_restore(c: AF_Continuation) -> None:
 	assert checkpoints.depth(), "No checkpoints saved."
 	checkpoint = checkpoints.pop()
-	Type.types = checkpoint[0]
-	Type.ctors = checkpoint[1]
+	Type.rollback(checkpoint[0])
 
 	## TODO : This doesn't seem to be resetting our stacks.
 	s = Stack()
@@ -54,6 +55,18 @@ def op_restore(c: AF_Continuation) -> None:
 make_word_context('restore', op_restore, [], [])
 
 
+@impure
+def op_save_image(c: AF_Continuation) -> None:
+	# Start again from the saved image with: ./interpret --image <filename>
+	filename = c.stack.pop().value
+	save_image(filename)
+	print("Saved image '%s'." % filename)
+	if c.prompt:
+		print(c.prompt,end='',flush=True)
+make_word_context('save_image', op_save_image, [TAtom], [])
+
+
+@impure
 def op_system(c: AF_Continuation) -> None:
 	cmd = c.stack.pop().value
 	system(cmd)
@@ -62,20 +75,12 @@ def op_system(c: AF_Continuation) -> None:
 make_word_context('system', op_system, [TAtom], [])
 
 
+@impure
 def op_load(c: AF_Continuation) -> None:
+	# Each file is only loaded into the dictionaries once (see modules.py).
 	filename = c.stack.pop().value
-	f = None
-	for file in [filename, filename + '.a4', 'lib/' + filename, 'lib/' + filename + '.a4']:
-		try:
-			f = open(file)
-		except FileNotFoundError:
-			pass
-	if not f:
+	if not load_module(c, filename):
 		print("No file or module called '%s' found." % filename)
-	else:
-		op_pcsave(c)
-		c.execute(interpret(c, f, filename))
-		op_pcreturn(c)
 	if c.prompt:
 		print(c.prompt,end='',flush=True)
 make_word_context('load', op_load, [TAtom], [])
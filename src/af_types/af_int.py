@@ -1,8 +1,19 @@
 #from stack import Stack
 
+import operator
+import struct
+
 from . import *
+from af_types.af_any import op_dup
+from operation import rebuildable
+from optimizer import register_fusion, fused, constant_of, CONSTANT
+from codegen import Generator, Slot, Template, register_template, register_value_type
+from wire import register_codec
 
 TInt = Type("Int")
+register_value_type(TInt)
+INT_WIRE = struct.Struct("<q")
+register_codec(TInt, 2, INT_WIRE.pack, lambda b: INT_WIRE.unpack(b)[0])
 
 #
 #   Integer handling
@@ -11,54 +22,148 @@ TInt = Type("Int")
 # Constructors
 def op_int(c: AF_Continuation) -> None:
     #print("\nop_int c.stack.contents = %s." % c.stack.contents())
-    i = int(c.stack.pop().value)
-    assert i <  999999999999, "int overflow > 999999999999"
-    assert i > -999999999999, "int underflow < -999999999999"
-    c.stack.push(StackObject(value=i, stype=TInt))
+    push_int(c, int(c.stack.pop().value))
 #   Int dictionary
 Type.register_ctor('Int',Operation('int',op_int),[StackObject(stype=TAny)])
 make_word_context('int', op_int, [TAny],[TInt])
+register_template(op_int, lambda g, args, word: args if args[0][1] is TInt else None)
+
+
+# Int values go straight to/from the columns of a ColumnStack (see column_stack.py)
+# without a StackObject being built for them.
+def check_int(i: int) -> None:
+    assert i <  999999999999, "int overflow > 999999999999"
+    assert i > -999999999999, "int underflow < -999999999999"
+
+def push_int(c: AF_Continuation, i: int) -> None:
+    check_int(i)
+    if c.stack.columnar:
+        c.stack.push_int(i, TInt)
+    else:
+        c.stack.push(StackObject(value=i, stype=TInt))
+
+def pop_int(c: AF_Continuation) -> int:
+    if c.stack.columnar:
+        return c.stack.pop_int()
+    return c.stack.pop().value
+
+def tos_int(c: AF_Continuation) -> int:
+    if c.stack.columnar:
+        return c.stack.peek_int()
+    return c.stack.tos().value
+
+
+# Int results in generated code (see codegen.py) are checked just as push_int does.
+def int_result(g: Generator, expr: str) -> List[Slot]:
+    v = g.temp(expr)
+    g.emit("if not -999999999999 < %s < 999999999999: %s(%s)" % (v, g.constant(check_int), v))
+    return [(v, TInt)]
+
+def int_template(fmt: str) -> Template:
+    # fmt is given the expressions for the two Ints, oldest first.
+    return lambda g, args, word: int_result(g, fmt % (args[0][0], args[1][0]))
 
 
 # Operations
 def op_plus(c: AF_Continuation) -> None:
-    op1 = c.stack.pop().value
-    op2 = c.stack.pop().value
+    op1 = pop_int(c)
+    op2 = pop_int(c)
     result = op1+op2
     # Guarantee output is valid and not overflow.
     assert int(result) - op2 == op1, "python math error"
-    c.stack.push(StackObject(value=result, stype=TInt))
-    op_int(c) # We're cheating here cause, for now, op_int is supposed to take a TAtom!
+    push_int(c, int(result))
 make_word_context('+', op_plus, [TInt, TInt],[TInt])
+register_template(op_plus, int_template("%s + %s"))
 
 def op_minus(c: AF_Continuation) -> None:
-    op1 = c.stack.pop().value
-    op2 = c.stack.pop().value
+    op1 = pop_int(c)
+    op2 = pop_int(c)
     result = op2-op1
     # Guarantee output is valid and not overflow.
     assert int(result) + op1 == op2, "python math error"
-    c.stack.push(StackObject(value=result, stype=TInt))
-    op_int(c) # We're cheating here cause, for now, op_int is supposed to take a TAtom!
+    push_int(c, int(result))
 make_word_context('-', op_minus, [TInt, TInt],[TInt])
+register_template(op_minus, int_template("%s - %s"))
 
 def op_multiply(c: AF_Continuation) -> None:
-    op1 = c.stack.pop().value
-    op2 = c.stack.pop().value
+    op1 = pop_int(c)
+    op2 = pop_int(c)
     result = op2*op1
     # Guarantee output is valid and not overflow.
     if op1 != 0: # Protect against divide by zero error on check.
         assert int(result) / op1 == op2, "python math error"
 
-    c.stack.push(StackObject(value=result, stype=TInt))
-    op_int(c) # We're cheating here cause, for now, op_int is supposed to take a TAtom!
+    push_int(c, int(result))
 make_word_context('*', op_multiply, [TInt, TInt],[TInt])
+register_template(op_multiply, int_template("%s * %s"))
 
 def op_divide(c: AF_Continuation) -> None:
-    assert c.stack.tos().value != 0, "int division by zero error."
-    op1 = c.stack.pop().value
-    op2 = c.stack.pop().value
+    assert tos_int(c) != 0, "int division by zero error."
+    op1 = pop_int(c)
+    op2 = pop_int(c)
     result = int(op2/op1)
     remainder = op2 - (result * op1)
-    c.stack.push(StackObject(value=result, stype=TInt))
-    c.stack.push(StackObject(value=remainder, stype=TInt))
+    push_int(c, result)
+    push_int(c, remainder)
 make_word_context('/', op_divide, [TInt, TInt],[TInt, TInt])
+
+def divide_template(g: Generator, args: List[Slot], word: Operation) -> List[Slot]:
+    a, b = args[0][0], args[1][0]
+    g.emit("assert %s != 0, \"int division by zero error.\"" % b)
+    result = int_result(g, "int(%s / %s)" % (a, b))
+    return result + int_result(g, "%s - (%s * %s)" % (a, result[0][0], b))
+register_template(op_divide, divide_template)
+
+
+#
+#   Superinstructions for common sequences in compiled words.
+#
+def op_double(c: AF_Continuation) -> None:
+    push_int(c, pop_int(c) * 2)
+register_template(op_double, lambda g, args, word: int_result(g, "%s * 2" % args[0][0]))
+register_fusion('dup +', [op_dup, op_plus], fused(op_double), [TInt], [TInt])
+
+def op_square(c: AF_Continuation) -> None:
+    i = pop_int(c)
+    push_int(c, i * i)
+register_template(op_square, lambda g, args, word: int_result(g, "%s * %s" % (args[0][0], args[0][0])))
+register_fusion('dup *', [op_dup, op_multiply], fused(op_square), [TInt], [TInt])
+
+
+@rebuildable
+def op_constant_arithmetic(func: Callable[[int, int], int], n: int) -> Operation_def:
+    def constant_op(c: AF_Continuation) -> None:
+        push_int(c, func(pop_int(c), n))
+    return constant_op
+
+OPERATORS = {operator.add : "%s + %s", operator.sub : "%s - %s", operator.mul : "%s * %s"}
+
+def constant_arithmetic_template(g: Generator, args: List[Slot], word: Operation, func: Callable[[int, int], int], n: int) -> List[Slot]:
+    fmt = OPERATORS.get(func, "%s(%%s, %%s)" % g.constant(func))
+    return int_result(g, fmt % (args[0][0], g.constant(n)))
+register_template(op_constant_arithmetic, constant_arithmetic_template)
+
+
+def op_curry_constant(func: Callable[[int, int], int]) -> Callable[[List[Operation]], Operation_def]:
+    # Words are: constant, op.
+    def build(words: List[Operation]) -> Operation_def:
+        return op_constant_arithmetic(func, constant_of(words[0]).value)
+    return build
+register_fusion('N +', [CONSTANT, op_plus], op_curry_constant(operator.add), [TInt], [TInt])
+register_fusion('N -', [CONSTANT, op_minus], op_curry_constant(operator.sub), [TInt], [TInt])
+register_fusion('N *', [CONSTANT, op_multiply], op_curry_constant(operator.mul), [TInt], [TInt])
+
+
+@rebuildable
+def op_dup_minus_constant(n: int) -> Operation_def:
+    def dup_minus_constant(c: AF_Continuation) -> None:
+        push_int(c, tos_int(c) - n)
+    return dup_minus_constant
+register_template(op_dup_minus_constant,
+    lambda g, args, word, n: args + int_result(g, "%s - %s" % (args[0][0], g.constant(n))))
+
+
+def op_curry_dup_minus_constant(words: List[Operation]) -> Operation_def:
+    # Words are: dup, constant, -.
+    return op_dup_minus_constant(constant_of(words[1]).value)
+register_fusion('dup N -', [op_dup, CONSTANT, op_minus], op_curry_dup_minus_constant, [TInt], [TInt, TInt])
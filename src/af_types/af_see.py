@@ -1,6 +1,8 @@
 # Introspection of words
 from . import *
 from continuation import Continuation
+from optimizer import optimizer
+from operation import impure
 
 def see_handler(cont: AF_Continuation) -> None:
     print("Calling see_handler")
@@ -20,6 +22,10 @@ def see_handler(cont: AF_Continuation) -> None:
     if found:
         for i in cont.op.words:
             print(i.name, i.sig)
+        if cont.op in optimizer.originals:
+            print(optimizer.dump(cont.op))
+        if cont.op.folds:
+            print("({} literals folded)".format(cont.op.folds))
     else:
         print("See: Failed to find word {}".format(symbol_id))
 
@@ -28,6 +34,7 @@ def see_handler(cont: AF_Continuation) -> None:
 
 TSee = Type("See",see_handler)
 
+@impure
 def op_see(c: AF_Continuation) -> None:
     s = Stack()
     c.stack.push(StackObject(value=s, stype=TSee))
@@ -8,6 +8,7 @@ from . import *
 from .af_int import *
 from .af_any import op_swap
 from stack import *
+from operation import impure
 
 """
 "data/rawbtctrans.hex" open # -> IStream
@@ -27,12 +28,14 @@ class CBytes:
 	endian : str = 'big'	
 
 
+@impure
 def op_istream(c: AF_Continuation) -> None:
 	io = StringIO(c.stack.pop().value)
 	c.stack.push(StackObject(value=io, stype=TIStream))
 make_word_context('istream', op_istream, [TAtom], [TIStream])
 
 
+@impure
 def op_open(c: AF_Continuation) -> None:
 	filename = c.stack.tos().value	
 	f = open(filename)
@@ -71,6 +74,7 @@ def op_bytes_to_int(c: AF_Continuation) -> None:
 make_word_context('int', op_bytes_to_int, [TBytes], [TInt])
 
 
+@impure
 def op_read_bytes(c: AF_Continuation) -> None:
 	count = c.stack.tos().value.count
 	op_swap(c)
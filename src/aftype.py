@@ -6,20 +6,69 @@ INTRO 4 : This is mainly here to satisfy module dependencies in the python
 """
 
 import logging
-from typing import Callable, List, Optional, Any, Iterator, Tuple
-from dataclasses import dataclass
+import sys
+from typing import Callable, List, Dict, Optional, Any, Iterator, Tuple, Sequence
+from dataclasses import dataclass, FrozenInstanceError
+from functools import total_ordering
 
 from stack import Stack
 
 """
 INTRO 4.1: A Location refers to the position in the source filestream where the 
            Symbol was discovered.
+
+           Every token gets one so they're kept small: the filename is
+           stored once in a table shared by all Locations and each Location
+           only holds its index there plus the line and column packed into
+           a single integer. They're expanded again when asked for.
 """
-@dataclass(frozen = True)
+COLUMN_BITS = 32
+
 class Location:
-    filename : str = "Unknown"
-    linenum : int = 0
-    column : int = 0
+    __slots__ = ("_file", "_pos")
+    _file : int     # Index into filenames.
+    _pos : int      # Line number and column packed together.
+
+    filenames : List[str] = []
+    file_ids : Dict[str, int] = {}
+
+    def __init__(self, filename: str = "Unknown", linenum: int = 0, column: int = 0) -> None:
+        file_id = Location.file_ids.get(filename)
+        if file_id is None:
+            file_id = Location.file_ids[filename] = len(Location.filenames)
+            Location.filenames.append(filename)
+        assert 0 <= column < (1 << COLUMN_BITS), "Column %s out of range." % column
+        object.__setattr__(self, "_file", file_id)
+        object.__setattr__(self, "_pos", (linenum << COLUMN_BITS) | column)
+
+    @property
+    def filename(self) -> str:
+        return Location.filenames[self._file]
+
+    @property
+    def linenum(self) -> int:
+        return self._pos >> COLUMN_BITS
+
+    @property
+    def column(self) -> int:
+        return self._pos & ((1 << COLUMN_BITS) - 1)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise FrozenInstanceError("cannot assign to field '%s'" % name)
+
+    def __eq__(self, other: Any) -> bool:
+        if type(other) is not Location: return NotImplemented
+        return self._file == other._file and self._pos == other._pos
+
+    def __hash__(self) -> int:
+        return hash((self._file, self._pos))
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # File ids are only meaningful to this process.
+        return (Location, (self.filename, self.linenum, self.column))
+
+    def __repr__(self) -> str:
+        return "Location(filename=%r, linenum=%r, column=%r)" % (self.filename, self.linenum, self.column)
 
 """
 INTRO 4.2: A Symbol is the string representation of the token plus its Location
@@ -27,11 +76,17 @@ INTRO 4.2: A Symbol is the string representation of the token plus its Location
            Location data from the Parser to create the Symbol. The Interpreter
            then updates the Symbol in the Continuation and executes it. 
            (See INTRO 2.4 in interpret.py)
+
+           Symbol ids are interned so the dictionary lookups for words
+           (which intern their names too) succeed on identity.
 """
-@dataclass(order = True)
+@total_ordering
 class Symbol:
-    s_id : str = ''
-    location : Location = Location()
+    __slots__ = ("s_id", "location")
+
+    def __init__(self, s_id: str = '', location: Location = Location()) -> None:
+        self.s_id = sys.intern(s_id)
+        self.location = location
     
     @property
     def size(self) -> int:
@@ -42,10 +97,20 @@ class Symbol:
             return symbol.s_id == self.s_id
         return False
 
+    def __lt__(self, symbol) -> bool:
+        if type(symbol) != Symbol: return NotImplemented
+        return self.s_id < symbol.s_id
+
+    __hash__ = None # type: ignore
+
+    def __repr__(self) -> str:
+        return "Symbol(s_id=%r, location=%r)" % (self.s_id, self.location)
+
 
 @dataclass
 class AF_Type:
     name : str
+    id : int        # Index into Type.by_id.
 
     def is_generic(self) -> bool:
         # Any types names "Any" or that start with underscore, '_', refer to 
@@ -56,14 +121,24 @@ class AF_Type:
 
 """
 INTRO 4.3 : Stacks strictly contain StackObjects. Every StackObject
-            consists of the object's value and it's Type.
+            consists of the object's value and it's Type. One is made for
+            every value pushed so they're slotted rather than carrying a
+            __dict__ each.
 
            Continue to af_types/__init__.py for INTRO stage 5.             
 """
-@dataclass
 class StackObject:
-    stype: AF_Type
-    value: Any = None
+    __slots__ = ("stype", "value")
+
+    def __init__(self, stype: AF_Type, value: Any = None) -> None:
+        self.stype = stype
+        self.value : Any = value
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__: return NotImplemented
+        return (self.stype, self.value) == (other.stype, other.value)
+
+    __hash__ = None # type: ignore
 
     def __str__(self):
       if self.value is not None:
@@ -76,7 +151,8 @@ class StackObject:
 
 @dataclass 
 class AF_Continuation:
-    pc : Iterator[Tuple[int,Tuple[Any,Symbol]]] # Any becomes an Operation in Continuation.
+    code : Sequence[Tuple[Any,Symbol]] # Any becomes an Operation in Continuation.
+    ip : int
     stack : Stack
     rstack : Stack
     symbol : Symbol 
@@ -88,8 +164,20 @@ class AF_Continuation:
     debug : bool = False
     cdepth : int = 0        # Depth of calls for debug tab output.
     log : logging.Logger = logging.getLogger()
+    executing : int = 0     # Nested executes running (see Continuation.call).
+    frames : int = 0        # Calls made by the outermost execute still to return from.
+    budget : int = 0        # Reductions left before the outermost execute stops.
 
     ### BIG NASTY HACK FOR TYPING 
     def execute(self, next_word ) -> "AF_Continuation":
       print("NEED THE REAL CONTINUATION")
       raise NotImplemented
+
+    def call(self, code : Sequence[Tuple[Any,Symbol]]) -> None:
+      raise NotImplemented
+
+    def save_pc(self) -> Any:
+      raise NotImplemented
+
+    def return_pc(self) -> None:
+      raise NotImplemented
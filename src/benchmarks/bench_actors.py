@@ -0,0 +1,111 @@
+"""
+bench_actors.py - message passing between actors on one thread.
+
+ping-pong : two actors volley a count back and forth until it runs out.
+ring      : N actors each pass a token on to the next, with the last
+            passing it back to us, for a number of laps.
+
+Both report messages per second. Memory per actor is what spawning lots
+of idle actors (each waiting in receive) costs, as seen by tracemalloc.
+
+    python src/benchmarks/bench_actors.py
+"""
+import time
+import tracemalloc
+from io import StringIO
+from copy import deepcopy
+
+from continuation import Continuation
+from interpret import interpret
+from af_types import Type, StackObject
+from af_types.af_any import *
+from af_types.af_int import *
+from af_types.af_actor import *
+from compiler import *
+from scheduler import scheduler, Actor
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+WORDS = """
+    ponger : -> ;
+        receive int receive actor 2dup send
+        self swap send drop ponger.
+
+    volley : Int Actor ->
+        : 0 Actor ->
+        : Int Actor -> ;
+            swap 1 int - swap 2dup send self swap send drop.
+
+    pinger : -> ;
+        receive int receive actor volley pinger.
+
+    relay : Actor -> Actor ; receive int swap 2dup send swap drop relay.
+    node : -> ; receive actor relay.
+    """
+
+
+def setup() -> Continuation:
+    cont = Continuation()
+    cont.prompt = ""
+    cont.execute(interpret(cont, StringIO(WORDS)))
+    return cont
+
+
+def spawn(cont: Continuation, name: str) -> Actor:
+    cont.execute(interpret(cont, StringIO('"%s" spawn' % name)))
+    return cont.stack.pop().value
+
+
+def ping_pong(cont: Continuation, volleys: int) -> float:
+    sent = scheduler.sent
+    start = time.perf_counter()
+    cont.execute(interpret(cont, StringIO("""
+        "pinger" spawn %s int swap 2dup send swap drop
+        "ponger" spawn swap send
+        run_actors
+        """ % volleys)))
+    return (scheduler.sent - sent) / (time.perf_counter() - start)
+
+
+def ring(cont: Continuation, size: int, laps: int) -> float:
+    nodes = [spawn(cont, "node") for n in range(size)]
+    for node, next_node in zip(nodes, nodes[1:] + [scheduler.actor(cont)]):
+        scheduler.send(node, StackObject(value=next_node, stype=TActor))
+    sent = scheduler.sent
+    start = time.perf_counter()
+    for lap in range(laps):
+        scheduler.send(nodes[0], StackObject(value=lap, stype=TInt))
+        cont.execute(interpret(cont, StringIO("receive int drop")))
+    return (scheduler.sent - sent) / (time.perf_counter() - start)
+
+
+def memory_per_actor(cont: Continuation, count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for n in range(count):
+        spawn(cont, "node")
+    scheduler.run()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+def main() -> None:
+    saved = deepcopy(Type.types), deepcopy(Type.ctors)
+    try:
+        cont = setup()
+        print("ping-pong %10.0f messages/sec" % ping_pong(cont, 20000))
+        scheduler.clear()
+        for size in [10, 1000, 10000]:
+            print("ring %6s %10.0f messages/sec" % (size, ring(cont, size, max(10, 100000 // size))))
+            scheduler.clear()
+        print("memory    %10.0f bytes/actor" % memory_per_actor(cont, 10000))
+        print(scheduler)
+    finally:
+        Type.types, Type.ctors = saved
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+bench_calls.py - cost of calling compiled words.
+
+Times the recursive fib word from samples/fib.a4 and a deep (non tail)
+recursion plus a tail recursive countdown that would each blow Python's
+recursion limit if every call nested another execute().
+
+    python src/benchmarks/bench_calls.py
+"""
+import time
+from io import StringIO
+
+from continuation import Continuation
+from interpret import interpret
+from af_types.af_any import *
+from af_types.af_int import *
+from compiler import *
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+WORDS = """
+fib : Int -> Int
+    : 0 -> 0
+    : 1 -> 1
+    : Int -> Int;
+        dup 1 int - fib swap 2 int - fib +.
+
+sumto : Int -> Int
+    : 0 -> 0
+    : Int -> Int;
+        dup 1 int - sumto +.
+
+down : Int -> Int
+    : 0 -> 0
+    : Int -> Int;
+        1 int - down.
+"""
+
+
+def run(cont: Continuation, code: str) -> Tuple[float, Any]:
+    cont.rstack.reset()
+    start = time.perf_counter()
+    cont.execute(interpret(cont, StringIO(code)))
+    return time.perf_counter() - start, cont.stack.pop().value
+
+
+def main() -> None:
+    cont = Continuation()
+    cont.execute(interpret(cont, StringIO(WORDS)))
+    for code in ["15 int fib", "1000 int sumto", "10000 int down"]:
+        elapsed, result = run(cont, code)
+        print("%16s = %10s in %7.3fs (return stack max depth %s)" % (code, result, elapsed, cont.rstack.max_depth()))
+
+
+if __name__ == "__main__":
+    main()
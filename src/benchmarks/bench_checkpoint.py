@@ -0,0 +1,45 @@
+"""
+bench_checkpoint.py - checkpoint/restore cost versus dictionary size.
+
+Fills the dictionaries with 1k, 10k and 50k words then times taking a
+checkpoint, defining ten more words and rolling back to the checkpoint.
+Deep copying Type.types and Type.ctors, which is how checkpoints used to
+be taken, is timed alongside for comparison.
+
+    python src/benchmarks/bench_checkpoint.py
+"""
+import time
+from copy import deepcopy
+
+from af_types import Type, make_word_context, op_nop
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+def main() -> None:
+    print("%8s %16s %16s %16s" % ("words", "checkpoint us", "rollback us", "deepcopy ms"))
+    total = 0
+    for size in [1000, 10000, 50000]:
+        t = Type("Bench%s" % size)
+        for n in range(size - total):
+            make_word_context("word%s" % n, op_nop, [t], [t])
+        total = size
+
+        start = time.perf_counter()
+        mark = Type.checkpoint()
+        checkpoint_us = (time.perf_counter() - start) * 1e6
+        for n in range(10):
+            make_word_context("extra%s" % n, op_nop, [t], [t])
+        start = time.perf_counter()
+        Type.rollback(mark)
+        rollback_us = (time.perf_counter() - start) * 1e6
+
+        start = time.perf_counter()
+        deepcopy(Type.types), deepcopy(Type.ctors)
+        copy_ms = (time.perf_counter() - start) * 1e3
+        print("%8s %16.1f %16.1f %16.1f" % (size, checkpoint_us, rollback_us, copy_ms))
+
+
+if __name__ == "__main__":
+    main()
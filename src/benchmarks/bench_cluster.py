@@ -0,0 +1,76 @@
+"""
+bench_cluster.py - actors spread over worker processes.
+
+Each worker runs PAIRS pinger/ponger pairs (as in bench_actors.py)
+volleying a count back and forth. cross is the fraction of pairs whose
+ponger lives in the next worker over, so every message between them goes
+through the shared-memory rings. Reports messages per second for 1 up to
+as many workers as there are cores (or the number given).
+
+    python src/benchmarks/bench_cluster.py [workers]
+
+Workers beyond the number of cores can only take turns, so on a machine
+with one core this shows what the rings cost rather than any scaling.
+"""
+import os
+import sys
+import time
+
+from af_types.af_any import *
+from af_types.af_int import *
+from af_types.af_actor import *
+from compiler import *
+from scheduler import scheduler
+from cluster import Cluster
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+WORDS = """
+    ponger : -> ;
+        receive int receive actor 2dup send
+        self swap send drop ponger.
+
+    volley : Int Actor ->
+        : 0 Actor ->
+        : Int Actor -> ;
+            swap 1 int - swap 2dup send self swap send drop.
+
+    pinger : -> ;
+        receive int receive actor volley pinger.
+    """
+
+PAIRS = 8
+VOLLEYS = 2000
+
+
+def run(workers: int, cross: float) -> float:
+    with Cluster(workers, WORDS) as cluster:
+        pairs = []
+        for node in range(workers):
+            for n in range(PAIRS):
+                away = n < round(PAIRS * cross) and workers > 1
+                pairs.append((cluster.spawn("pinger", node),
+                              cluster.spawn("ponger", (node + 1) % workers if away else node)))
+        before = sum(s["messages"] for s in cluster.stats())
+        start = time.perf_counter()
+        for pinger, ponger in pairs:
+            cluster.send(pinger, StackObject(value=VOLLEYS, stype=TInt))
+            cluster.send(pinger, StackObject(value=ponger, stype=TActor))
+        assert cluster.wait_idle(600), "Workers never went idle."
+        elapsed = time.perf_counter() - start
+        return (sum(s["messages"] for s in cluster.stats()[:-1]) - before) / elapsed
+
+
+def main() -> None:
+    most = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+    print("%d cores" % (os.cpu_count() or 1))
+    print("%8s %14s %14s %14s" % ("workers", "cross 0", "cross 0.5", "cross 1"))
+    for workers in range(1, most + 1):
+        rates = [run(workers, cross) for cross in [0, 0.5, 1]]
+        print("%8s %14.0f %14.0f %14.0f" % (workers, *rates))
+
+
+if __name__ == "__main__":
+    main()
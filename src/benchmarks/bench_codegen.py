@@ -0,0 +1,66 @@
+"""
+bench_codegen.py - interpreting words against running their generated Python.
+
+Times `fib` (as in samples/fib.a4) for increasing N with codegen disabled
+and enabled. Generating the source is timed separately, it's only done
+the first time a word runs.
+
+    python src/benchmarks/bench_codegen.py
+"""
+import time
+from typing import Tuple
+from io import StringIO
+from copy import deepcopy
+
+from continuation import Continuation
+from interpret import interpret
+from af_types import Type
+from af_types.af_any import *
+from af_types.af_int import *
+from compiler import *
+from codegen import codegen
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+FIB = """
+    fib : Int -> Int
+        : 0 -> 0
+        : 1 -> 1
+        : Int -> Int;
+            dup 1 int - fib swap 2 int - fib +.
+    """
+
+
+def run(n: int, enabled: bool) -> Tuple[float, float]:
+    """
+    Milliseconds taken generating fib's source (if enabled) and then running it.
+    """
+    saved = deepcopy(Type.types), deepcopy(Type.ctors)
+    try:
+        codegen.enabled = enabled
+        cont = Continuation()
+        cont.execute(interpret(cont, StringIO(FIB)))
+        start = time.perf_counter()
+        if enabled:
+            codegen.native([op for op in Type.types["Int"].find("fib") if op.words][0])
+        generating = time.perf_counter()
+        cont.execute(interpret(cont, StringIO("%s int fib drop" % n)))
+        return (generating - start) * 1e3, (time.perf_counter() - generating) * 1e3
+    finally:
+        Type.types, Type.ctors = saved
+        codegen.enabled = True
+
+
+def main() -> None:
+    print("%8s %16s %16s %16s %10s" % ("n", "interpreted ms", "generating ms", "generated ms", "speedup"))
+    for n in [10, 15, 20]:
+        _, interpreted = run(n, False)
+        generating, generated = run(n, True)
+        print("%8s %16.2f %16.2f %16.2f %9.1fx" % (n, interpreted, generating, generated, interpreted / generated))
+    print(codegen)
+
+
+if __name__ == "__main__":
+    main()
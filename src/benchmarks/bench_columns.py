@@ -0,0 +1,71 @@
+"""
+bench_columns.py - Stack vs ColumnStack as the data stack.
+
+Runs samples/fib.a4's fib word and samples/countdown.a4's loop (without
+the printing) on a Continuation built on each kind of data stack, plus
+a tight Int arithmetic word where the primitives' column fast paths
+matter most.
+
+    python src/benchmarks/bench_columns.py
+"""
+import time
+from io import StringIO
+from copy import deepcopy
+
+from stack import Stack
+from column_stack import ColumnStack
+from continuation import Continuation
+from interpret import interpret
+from af_types import Type
+from af_types.af_any import *
+from af_types.af_int import *
+from af_types.af_branch import *
+from compiler import *
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+WORDS = """
+fib : Int -> Int
+    : 0 -> 0
+    : 1 -> 1
+    : Int -> Int;
+        dup 1 int - fib swap 2 int - fib +.
+
+poly : Int -> Int;
+    dup dup * swap 3 int * + 7 int - .
+
+polys : Int -> Int
+    : 0 -> 0
+    : Int -> Int;
+        dup poly drop 1 int - polys.
+"""
+
+CASES = [("fib", "18 int fib"),
+         ("countdown", "100000 countdown lcount drop loop"),
+         ("arithmetic", "20000 int polys")]
+
+
+def run(stack: Stack, code: str) -> float:
+    saved = deepcopy(Type.types), deepcopy(Type.ctors)
+    try:
+        cont = Continuation(stack)
+        cont.execute(interpret(cont, StringIO(WORDS)))
+        start = time.perf_counter()
+        cont.execute(interpret(cont, StringIO(code)))
+        return time.perf_counter() - start
+    finally:
+        Type.types, Type.ctors = saved
+
+
+def main() -> None:
+    print("%12s %12s %14s %8s" % ("case", "Stack (s)", "ColumnStack (s)", "ratio"))
+    for name, code in CASES:
+        plain = run(Stack(), code)
+        columns = run(ColumnStack(), code)
+        print("%12s %12.3f %14.3f %8.2f" % (name, plain, columns, plain / columns))
+
+
+if __name__ == "__main__":
+    main()
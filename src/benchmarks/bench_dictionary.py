@@ -0,0 +1,49 @@
+"""
+bench_dictionary.py - word lookup & definition cost versus dictionary size.
+
+Fills a Type's dictionary with 10, 1k and 100k words then times
+Type.add_op, Type.find_op for known words and for unknown names (the
+common case for Atoms). A linear scan of ops_list, which is how lookups
+used to work, is timed alongside for comparison.
+
+    python src/benchmarks/bench_dictionary.py
+"""
+import time
+
+from continuation import Continuation
+from af_types import Type, StackObject, make_word_context, op_nop
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+def per_call(func, count: int) -> float:
+    start = time.perf_counter()
+    for n in range(count):
+        func(n)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main() -> None:
+    print("%8s %14s %14s %14s %14s" % ("words", "add_op us", "find hit us", "find miss us", "linear miss us"))
+    for size in [10, 1000, 100000]:
+        t = Type("Bench%s" % size)
+        names = ["word%s" % n for n in range(size)]
+        start = time.perf_counter()
+        for name in names:
+            make_word_context(name, op_nop, [t], [t])
+        add_us = (time.perf_counter() - start) / size * 1e6
+
+        cont = Continuation()
+        cont.stack.push(StackObject(stype=t))
+        ops_list = Type.types[t.name].ops_list
+
+        samples = min(size, 10000)
+        hit_us = per_call(lambda n: Type.find_op(names[n % size], cont, t.name), samples)
+        miss_us = per_call(lambda n: Type.find_op("unknown", cont, t.name), samples)
+        linear_us = per_call(lambda n: [op for op in ops_list if op.name == "unknown"], min(samples, 100))
+        print("%8s %14.2f %14.2f %14.2f %14.2f" % (size, add_us, hit_us, miss_us, linear_us))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+bench_dispatch.py - cost of resolving tokens with and without the dispatch cache.
+
+Times Type.op (cached) against Type.resolve_op (the uncached search) for a
+few common stack shapes, then interprets a token heavy script both ways
+and reports the cache's hit/miss counters.
+
+    python src/benchmarks/bench_dispatch.py
+"""
+import time
+from io import StringIO
+
+from continuation import Continuation
+from interpret import interpret
+from af_types import Type, StackObject
+from af_types.af_any import *
+from af_types.af_int import *
+from af_types.af_bool import *
+from compiler import *
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+SCRIPT = "1 int 2 int + 3 int * dup drop 4 int swap - 5 int < drop\n" * 5000
+
+
+def per_call(func, count: int) -> float:
+    start = time.perf_counter()
+    for n in range(count):
+        func(n)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def run_script(resolver) -> float:
+    saved = Type.op
+    Type.op = resolver
+    try:
+        cont = Continuation()
+        start = time.perf_counter()
+        cont.execute(interpret(cont, StringIO(SCRIPT)))
+        return time.perf_counter() - start
+    finally:
+        Type.op = saved
+
+
+def main() -> None:
+    cont = Continuation()
+    cont.stack.push(StackObject(stype=TInt, value=1))
+    cont.stack.push(StackObject(stype=TInt, value=2))
+
+    print("%12s %14s %14s" % ("word", "uncached us", "cached us"))
+    for name in ["+", "dup", "swap", "unknown"]:
+        slow = per_call(lambda n: Type.resolve_op(name, cont), 10000)
+        fast = per_call(lambda n: Type.op(name, cont), 10000)
+        print("%12s %14.2f %14.2f" % (name, slow, fast))
+
+    cache = Type.dispatch_cache
+    cache.clear()
+    tokens = len(SCRIPT.split())
+    slow = run_script(Type.resolve_op)
+    fast = run_script(Type.op)
+    print("\nscript of %s tokens: uncached %.2fs, cached %.2fs (%.2fx)" % (tokens, slow, fast, slow / fast))
+    print(cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+bench_loop.py - time & peak memory for countdown loops of increasing length.
+
+Runs `N countdown lcount drop loop` (samples/countdown.a4 without the
+printing) at top level and inside a compiled word and reports the cost
+per iteration along with the peak traced memory. Both should stay flat
+as N grows.
+
+    python src/benchmarks/bench_loop.py
+"""
+import time
+import tracemalloc
+from io import StringIO
+
+from continuation import Continuation
+from interpret import interpret
+from af_types.af_any import *
+from af_types.af_int import *
+from af_types.af_branch import *
+from compiler import *
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+def run(code: str) -> Tuple[float, int]:
+    cont = Continuation()
+    tracemalloc.start()
+    start = time.perf_counter()
+    cont.execute(interpret(cont, StringIO(code)))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main() -> None:
+    print("%10s %18s %14s %18s %14s" % ("count", "top level us/iter", "peak KiB", "in word us/iter", "peak KiB"))
+    for count in [1000, 10000, 100000]:
+        top, top_peak = run("%s countdown lcount drop loop" % count)
+        word, word_peak = run("spin : Int -> ; countdown lcount drop loop.\n%s int spin" % count)
+        print("%10s %18.2f %14.1f %18.2f %14.1f" % (count, top / count * 1e6, top_peak / 1024,
+                                                    word / count * 1e6, word_peak / 1024))
+
+
+if __name__ == "__main__":
+    main()
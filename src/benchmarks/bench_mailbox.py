@@ -0,0 +1,89 @@
+"""
+bench_mailbox.py - selective receive from a mailbox full of messages
+nobody wants yet.
+
+QUEUED Ints are sent to us along with RARE messages we do want scattered
+among them. Then each of those is received with receive_match, both by
+Type (`Bool receive_match`), by value (`-1 int receive_match`) and by a
+different value every time (`-1 int receive_match`, `-2 int ...`), and
+reports how long each receive took on average. "scan" is the same work
+done by looking through the mailbox from the start every time, as a
+receive_match without indexes would.
+
+    python src/benchmarks/bench_mailbox.py
+"""
+import time
+from io import StringIO
+from typing import Callable, Optional
+
+from continuation import Continuation
+from interpret import interpret
+from af_types import StackObject
+from af_types.af_any import *
+from af_types.af_int import *
+from af_types.af_bool import *
+from af_types.af_actor import *
+from compiler import *
+from scheduler import scheduler, Mailbox
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+QUEUED = 100000
+RARE = 100
+
+
+def fill(mailbox: Mailbox, rare: Callable[[int], StackObject]) -> None:
+    mailbox.clear()
+    for n in range(QUEUED):
+        mailbox.append(StackObject(value=n, stype=TInt))
+        if n % (QUEUED // RARE) == QUEUED // RARE - 1:
+            mailbox.append(rare(n))
+
+
+def scan(mailbox: Mailbox, name: str, value: Any) -> StackObject:
+    for seq, message in mailbox.messages.items():
+        if message.stype.name == name and (value is None or message.value == value):
+            return mailbox.messages.pop(seq)
+    raise Exception("Not found.")
+
+
+def indexed(cont: Continuation, code: Callable[[int], str]) -> float:
+    source = "".join(code(n) + " drop " for n in range(RARE))
+    start = time.perf_counter()
+    cont.execute(interpret(cont, StringIO(source)))
+    return time.perf_counter() - start
+
+
+def scanned(mailbox: Mailbox, name: str, value: Callable[[int], Optional[int]]) -> float:
+    start = time.perf_counter()
+    for n in range(RARE):
+        scan(mailbox, name, value(n))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    cont = Continuation()
+    cont.prompt = ""
+    mailbox = scheduler.actor(cont).mailbox
+    print("%d queued, %d wanted" % (QUEUED, RARE))
+    print("%16s %14s %14s" % ("pattern", "indexed us", "scan us"))
+    for label, code, name, value, rare in [
+            ("Bool", lambda n: "Bool receive_match", "Bool", lambda n: None,
+                lambda n: StackObject(value=True, stype=TBool)),
+            ("-1 int", lambda n: "-1 int receive_match", "Int", lambda n: -1,
+                lambda n: StackObject(value=-1, stype=TInt)),
+            ("-n int", lambda n: "%s int receive_match" % -(n + 1), "Int", lambda n: -(n + 1),
+                lambda n: StackObject(value=-(n // (QUEUED // RARE) + 1), stype=TInt))]:
+        fill(mailbox, rare)
+        fast = indexed(cont, code)
+        assert len(mailbox) == QUEUED
+        fill(mailbox, rare)
+        slow = scanned(mailbox, name, value)
+        print("%16s %14.1f %14.1f" % (label, fast / RARE * 1e6, slow / RARE * 1e6))
+    mailbox.clear()
+
+
+if __name__ == "__main__":
+    main()
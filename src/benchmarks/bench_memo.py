@@ -0,0 +1,56 @@
+"""
+bench_memo.py - cost of naive recursion with and without declaring it pure.
+
+Times `fib` (as in samples/fib.a4) for increasing N, once as a plain word
+and once declared pure so repeated calls come out of the memo cache.
+
+    python src/benchmarks/bench_memo.py
+"""
+import time
+from io import StringIO
+from copy import deepcopy
+
+from continuation import Continuation
+from interpret import interpret
+from af_types import Type
+from af_types.af_any import *
+from af_types.af_int import *
+from compiler import *
+from memo import memo
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+def fib(pure: bool) -> str:
+    return """
+        fib : Int -> Int %s
+            : 0 -> 0
+            : 1 -> 1
+            : Int -> Int;
+                dup 1 int - fib swap 2 int - fib +.
+        """ % ("pure" if pure else "")
+
+
+def run(n: int, pure: bool) -> float:
+    saved = deepcopy(Type.types), deepcopy(Type.ctors)
+    try:
+        memo.clear()
+        cont = Continuation()
+        cont.execute(interpret(cont, StringIO(fib(pure))))
+        start = time.perf_counter()
+        cont.execute(interpret(cont, StringIO("%s int fib drop" % n)))
+        return (time.perf_counter() - start) * 1e3
+    finally:
+        Type.types, Type.ctors = saved
+
+
+def main() -> None:
+    print("%8s %14s %14s" % ("n", "plain ms", "pure ms"))
+    for n in [10, 15, 20]:
+        print("%8s %14.2f %14.2f" % (n, run(n, False), run(n, True)))
+    print(memo)
+
+
+if __name__ == "__main__":
+    main()
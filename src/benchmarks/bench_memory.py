@@ -0,0 +1,59 @@
+"""
+bench_memory.py - memory held per token and per stack slot.
+
+Builds the Symbol (and its Location) that interpret() makes for every
+token of a large generated script and keeps them all alive, then pushes
+a StackObject per token onto a Stack, reporting the bytes allocated for
+each with tracemalloc.
+
+    python src/benchmarks/bench_memory.py [megabytes]
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from parser import Parser
+from stack import Stack
+from aftype import Symbol, Location, StackObject, AF_Type
+
+from bench_parser import build_script
+
+
+def symbols(filename: str) -> int:
+    p = Parser(filename)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [Symbol(s_id, Location(p.filename, linenum, column)) for s_id, linenum, column in p.tokens()]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return len(held), used
+
+
+def stack_objects(count: int) -> int:
+    stype = AF_Type("Int")
+    s = Stack()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for n in range(count):
+        s.push(StackObject(stype = stype, value = n))
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+
+def main(megabytes: float = 1.0) -> None:
+    with tempfile.NamedTemporaryFile("w", suffix=".a4", delete=False) as f:
+        f.write(build_script(megabytes))
+        filename = f.name
+    try:
+        count, used = symbols(filename)
+        print("%9d tokens : %6.1f bytes per Symbol + Location" % (count, used / count))
+        used = stack_objects(count)
+        print("%9d pushes : %6.1f bytes per StackObject on a Stack" % (count, used / count))
+    finally:
+        os.remove(filename)
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
@@ -0,0 +1,52 @@
+"""
+bench_parser.py - tokenizer throughput in tokens/sec.
+
+Compares Parser.tokens() against the original character at a time
+tokenizer, Parser.char_tokens(), over a large generated script.
+
+    python src/benchmarks/bench_parser.py [megabytes]
+"""
+import glob
+import os
+import sys
+import tempfile
+import time
+
+from parser import Parser
+
+
+def build_script(megabytes: float) -> str:
+    sources = sorted(glob.glob("samples/**/*.a4", recursive=True) + glob.glob("lib/*.a4"))
+    sample = "\n".join(open(s).read() for s in sources)
+    copies = max(1, int(megabytes * 1024 * 1024 / len(sample)))
+    return sample * copies
+
+
+def time_tokenizer(filename: str, method: str) -> float:
+    p = Parser(filename)
+    start = time.perf_counter()
+    count = sum(1 for t in getattr(p, method)())
+    elapsed = time.perf_counter() - start
+    p.reset()
+    return count, elapsed
+
+
+def main(megabytes: float = 4.0) -> None:
+    with tempfile.NamedTemporaryFile("w", suffix=".a4", delete=False) as f:
+        f.write(build_script(megabytes))
+        filename = f.name
+    try:
+        size = os.path.getsize(filename) / (1024 * 1024)
+        print("Tokenizing %.1f MB script." % size)
+        results = {}
+        for method in ["char_tokens", "tokens"]:
+            count, elapsed = time_tokenizer(filename, method)
+            results[method] = count / elapsed
+            print("%12s : %9d tokens in %6.3fs = %12.0f tokens/sec" % (method, count, elapsed, count / elapsed))
+        print("Speedup : %.1fx" % (results["tokens"] / results["char_tokens"]))
+    finally:
+        os.remove(filename)
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 4.0)
@@ -0,0 +1,77 @@
+"""
+bench_patterns.py - cost of picking between value matched overloads.
+
+Defines an opcode table word with N literal cases (`op : Int -> Int : 0 -> 100
+: 1 -> 101 ...` plus a generic fallback) and times calling it from the top
+level and from inside a compiled word, once with the decision trees and
+once searching the overloads linearly as before.
+
+    python src/benchmarks/bench_patterns.py
+"""
+import time
+from io import StringIO
+from copy import deepcopy
+
+from continuation import Continuation
+from interpret import interpret
+from af_types import Type, TypeDefinition
+from af_types.af_any import *
+from af_types.af_int import *
+from compiler import *
+import dispatch
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+CALLS = 2000
+
+
+def table(cases: int) -> str:
+    code = "op : Int -> Int\n"
+    code += "".join("    : %s -> %s\n" % (n, n + 100) for n in range(cases))
+    code += "    : Int -> Int;\n        drop 0 int.\n"
+    code += "call_op : Int -> Int; op.\n"
+    return code
+
+
+def run(cases: int, word: str) -> float:
+    saved = deepcopy(Type.types), deepcopy(Type.ctors)
+    try:
+        cont = Continuation()
+        cont.execute(interpret(cont, StringIO(table(cases))))
+        code = "".join("%s int %s drop\n" % (n % (cases + 1), word) for n in range(CALLS))
+        start = time.perf_counter()
+        cont.execute(interpret(cont, StringIO(code)))
+        return (time.perf_counter() - start) / CALLS * 1e6
+    finally:
+        Type.types, Type.ctors = saved
+
+
+class LinearTree(dispatch.DecisionTree):
+    # Forces every lookup down the original linear search.
+    depth = 1 << 30
+    def __init__(self, ops, effects = True) -> None:
+        self.size = len(ops)
+
+
+def main() -> None:
+    print("%8s %18s %18s %18s %18s" % ("cases", "top linear us", "top tree us", "word linear us", "word tree us"))
+    for cases in [4, 16, 64, 256]:
+        results = []
+        for word in ["op", "call_op"]:
+            saved_tree, saved_compiler_tree = TypeDefinition.tree, dispatch.DecisionTree
+            TypeDefinition.tree = lambda self, name: None
+            import compiler
+            compiler.DecisionTree = LinearTree
+            try:
+                linear = run(cases, word)
+            finally:
+                TypeDefinition.tree = saved_tree
+                compiler.DecisionTree = saved_compiler_tree
+            results += [linear, run(cases, word)]
+        print("%8s %18.1f %18.1f %18.1f %18.1f" % tuple([cases] + results))
+
+
+if __name__ == "__main__":
+    main()
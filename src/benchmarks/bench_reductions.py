@@ -0,0 +1,63 @@
+"""
+bench_reductions.py - what counting reductions costs Continuation.execute.
+
+Runs samples/countdown.a4 (with its printing sent to a buffer) and the
+same loop inside a compiled word, once with no budget (never preempted),
+once with a budget so large it never runs out and once suspending and
+resuming every 100 and every 10 reductions as the scheduler would.
+
+    python src/benchmarks/bench_reductions.py
+"""
+import os
+import time
+from io import StringIO
+from contextlib import redirect_stdout
+
+from continuation import Continuation
+from interpret import interpret
+from af_types.af_any import *
+from af_types.af_int import *
+from af_types.af_branch import *
+from compiler import *
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "..", "samples", "countdown.a4")
+WORD = "spin : Int -> ; countdown lcount drop loop.\n"
+
+
+def run(code: str, reductions: Optional[int], repeat: int = 3) -> Tuple[float, int]:
+    best, resumes = None, 0
+    for n in range(repeat):
+        cont = Continuation()
+        cont.prompt = ""
+        with redirect_stdout(StringIO()):
+            start = time.perf_counter()
+            cont.execute(interpret(cont, StringIO(code)), reductions)
+            resumes = 0
+            while cont.suspended:
+                resumes += 1
+                cont.resume(reductions)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, resumes
+
+
+def main() -> None:
+    with open(SAMPLE) as f:
+        sample = f.read()
+    # Defined up front so every run only times the loop.
+    cont = Continuation()
+    cont.execute(interpret(cont, StringIO(WORD)))
+
+    print("%16s %14s %10s %14s %10s" % ("budget", "countdown.a4 ms", "resumes", "in word ms", "resumes"))
+    for label, reductions in [("none", None), ("1000000000", 10 ** 9), ("100", 100), ("10", 10)]:
+        top, top_resumes = run(sample, reductions)
+        word, word_resumes = run("100000 int spin", reductions)
+        print("%16s %14.1f %10s %14.1f %10s" % (label, top * 1e3, top_resumes, word * 1e3, word_resumes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+bench_stack.py - cost of Stack push/pop under each telemetry mode.
+
+Pushes and pops in a sawtooth so the depth history wraps its ring buffer
+many times over, then runs samples/countdown.a4 style loops under each
+mode for a whole interpreter comparison.
+
+    python src/benchmarks/bench_stack.py
+"""
+import time
+from io import StringIO
+
+from stack import Stack, TELEMETRY_OFF, TELEMETRY_SAMPLED, TELEMETRY_FULL
+from continuation import Continuation
+from interpret import interpret
+from af_types.af_any import *
+from af_types.af_int import *
+from af_types.af_branch import *
+from compiler import *
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+OPERATIONS = 1000000
+MODES = [TELEMETRY_OFF, TELEMETRY_SAMPLED, TELEMETRY_FULL]
+
+
+def push_pop(mode: str) -> float:
+    s = Stack(telemetry = mode)
+    start = time.perf_counter()
+    for n in range(OPERATIONS // 200):
+        for i in range(100):
+            s.push(i)
+        for i in range(100):
+            s.pop()
+    return (time.perf_counter() - start) / OPERATIONS * 1e9
+
+
+def countdown(mode: str) -> float:
+    saved = Stack.TELEMETRY
+    Stack.TELEMETRY = mode
+    try:
+        cont = Continuation()
+        start = time.perf_counter()
+        cont.execute(interpret(cont, StringIO("100000 countdown lcount drop loop")))
+        return time.perf_counter() - start
+    finally:
+        Stack.TELEMETRY = saved
+
+
+def main() -> None:
+    print("%10s %16s %16s" % ("mode", "ns per op", "countdown (s)"))
+    for mode in MODES:
+        print("%10s %16.1f %16.3f" % (mode, push_pop(mode), countdown(mode)))
+
+
+if __name__ == "__main__":
+    main()
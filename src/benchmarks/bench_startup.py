@@ -0,0 +1,54 @@
+"""
+bench_startup.py - interpreter startup, cold versus from a saved image.
+
+A session that loads lib/btc, lib/one2four, samples/fib and samples/func
+and then runs `10 int fib` is timed from a cold start (loading each
+library from source) and from an image saved after the loads. Both are
+run as fresh interpreter processes, so Python's own startup and imports
+are included.
+
+    python src/benchmarks/bench_startup.py [runs]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+LIBRARIES = ["btc", "one2four", "samples/fib", "samples/func"]
+RUN = "10 int fib\n"
+
+
+def interpreter(*args: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "src/repl.py"] + list(args), check = True,
+                    stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, stdin = subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def script(directory: str, name: str, code: str) -> str:
+    filename = os.path.join(directory, name)
+    with open(filename, "w") as f:
+        f.write(code)
+    return filename
+
+
+def main(runs: int = 5) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        loads = "".join("%s load\n" % lib for lib in LIBRARIES)
+        image = os.path.join(directory, "session_image")
+        interpreter(script(directory, "save.a4", loads + "%s save_image\n" % image))
+        cold = script(directory, "cold.a4", loads + RUN)
+        warm = script(directory, "warm.a4", RUN)
+
+        cold_time = min(interpreter(cold) for n in range(runs))
+        image_time = min(interpreter("--image", image, warm) for n in range(runs))
+        print("image size  : %9d bytes" % os.path.getsize(image))
+        print("cold start  : %9.3fs" % cold_time)
+        print("image start : %9.3fs" % image_time)
+        print("speedup     : %9.2fx" % (cold_time / image_time))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
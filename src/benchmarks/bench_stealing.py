@@ -0,0 +1,72 @@
+"""
+bench_stealing.py - skewed spawning with and without work stealing.
+
+One actor on worker 0 spawns a burst of JOBS actors that each count down
+from WORK, so without stealing they all run (and queue) on worker 0. For
+1 up to as many workers as there are cores (or the number given) reports
+how long they took, how the slices run were spread over the workers
+(busiest / mean - 1.0 is perfectly even) and how many steals moved how
+many actors.
+
+    python src/benchmarks/bench_stealing.py [workers]
+
+Workers beyond the number of cores only take turns, so on a machine with
+one core this shows the load being spread rather than the time saved.
+"""
+import os
+import sys
+import time
+from typing import Tuple
+
+from af_types.af_any import *
+from af_types.af_int import *
+from af_types.af_actor import *
+from compiler import *
+from cluster import Cluster
+
+import logging
+logging.getLogger().setLevel(logging.WARNING)
+
+
+WORDS = """
+    burn : Int ->
+        : 0 ->
+        : Int -> ; 1 int - burn.
+
+    job : -> ; %s int burn.
+
+    fan : Int ->
+        : 0 ->
+        : Int -> ; "job" spawn drop 1 int - fan.
+
+    starter : -> ; receive int fan.
+    """
+
+JOBS = 64
+WORK = 3000
+
+
+def run(workers: int, steal: bool) -> Tuple[float, float, int, int]:
+    with Cluster(workers, WORDS % WORK, steal = steal) as cluster:
+        starter = cluster.spawn("starter", 0)
+        start = time.perf_counter()
+        cluster.send(starter, StackObject(value=JOBS, stype=TInt))
+        assert cluster.wait_idle(600), "Workers never went idle."
+        elapsed = time.perf_counter() - start
+        stats = cluster.stats()[:-1]
+        slices = [s["slices"] for s in stats]
+        return (elapsed, max(slices) * len(slices) / sum(slices),
+                sum(s["steals"] for s in stats), sum(s["stolen"] for s in stats))
+
+
+def main() -> None:
+    most = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+    print("%d cores, %d jobs of %d" % (os.cpu_count() or 1, JOBS, WORK))
+    print("%8s %8s %10s %10s %8s %8s" % ("workers", "steal", "seconds", "imbalance", "steals", "stolen"))
+    for workers in range(1, most + 1):
+        for steal in [False, True]:
+            print("%8s %8s %10.2f %10.2f %8s %8s" % (workers, steal, *run(workers, steal)))
+
+
+if __name__ == "__main__":
+    main()
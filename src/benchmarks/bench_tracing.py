@@ -0,0 +1,72 @@
+"""
+bench_tracing.py - what debug tracing costs per word with it off and on.
+
+Calls a pattern matched word from inside a compiled word (whose trace
+messages include the whole stack) with increasingly deep stacks
+underneath. With tracing off the time per call should stay flat however
+deep the stack; with it on (written to a buffer rather than the console)
+it grows with the depth as each message formats the stack. Generated code
+is turned off so the words are interpreted.
+
+    python src/benchmarks/bench_tracing.py
+"""
+import io
+import time
+import logging
+from io import StringIO
+from copy import deepcopy
+
+from continuation import Continuation
+from interpret import interpret
+from af_types import Type, StackObject
+from af_types.af_any import *
+from af_types.af_int import *
+from compiler import *
+import tracing
+from codegen import codegen
+
+
+CALLS = 1000
+
+WORDS = """
+    op : Int -> Int
+        : 0 -> 1
+        : Int -> Int; drop 0 int.
+    call_op : Int -> Int; op.
+    """
+
+
+def run(depth: int, traced: bool) -> float:
+    saved = deepcopy(Type.types), deepcopy(Type.ctors)
+    root = logging.getLogger()
+    handlers, level = root.handlers, root.level
+    try:
+        cont = Continuation()
+        cont.execute(interpret(cont, StringIO(WORDS)))
+        for n in range(depth):
+            cont.stack.push(StackObject(stype=TInt, value=n))
+        code = "".join("%s int call_op drop\n" % (n % 2) for n in range(CALLS))
+        if traced:
+            root.handlers = [logging.StreamHandler(io.StringIO())]
+            root.setLevel(logging.DEBUG)
+        tracing.sync()
+        start = time.perf_counter()
+        cont.execute(interpret(cont, StringIO(code)))
+        return (time.perf_counter() - start) / CALLS * 1e6
+    finally:
+        root.handlers = handlers
+        root.setLevel(level)
+        tracing.sync()
+        Type.types, Type.ctors = saved
+
+
+def main() -> None:
+    codegen.enabled = False
+    logging.getLogger().setLevel(logging.WARNING)
+    print("%8s %16s %16s" % ("depth", "off us/call", "on us/call"))
+    for depth in [0, 100, 1000]:
+        print("%8s %16.1f %16.1f" % (depth, run(depth, False), run(depth, True)))
+
+
+if __name__ == "__main__":
+    main()
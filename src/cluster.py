@@ -0,0 +1,480 @@
+"""
+cluster.py - actors spread over several worker processes.
+
+A Cluster starts a number of worker processes, each with a Scheduler of
+its own running whatever actors have been spawned there, while whoever
+started them (the REPL, a test or a benchmark) becomes one more node that
+can spawn, send and receive like any other:
+
+    with Cluster(4, source = words) as cluster:
+        pong = cluster.spawn("ponger")
+        ...
+        cluster.wait_idle()
+
+Every pair of processes has a ring buffer in one block of shared memory
+for each direction between them so a message is encoded (see wire.py),
+copied into the ring and picked up when the other side next polls - no
+pipes, locks or pickling. A ring that's full keeps its messages back in
+the sender until there's room and once PENDING are held back for a
+process actors sending to it wait until some have gone. The start of the block is a table of
+counters each process publishes about itself (messages sent and received
+across processes, whether it's idle) which is how wait_idle knows nothing
+is left in flight.
+
+Workers with nothing to run steal from the busiest of the others: they
+ask it for actors and it sends back half of those waiting in its run
+queue (see migrate.py for how they travel). Each keeps note of the
+actors it has given away so anything sent to them afterwards is passed
+on to wherever they went. The stats table has each worker's run queue
+depth, how many slices it has run and how many times it has stolen
+along with how many actors that brought it.
+"""
+import time
+import importlib
+import struct
+import traceback
+import multiprocessing
+from io import StringIO
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Deque, List, Optional, Dict, Any, Sequence
+
+from aftype import StackObject
+from scheduler import scheduler, Scheduler, Actor
+import wire
+import migrate
+
+
+# Counters each process publishes in its row of the stats table.
+STATS = ["sent", "received", "idle", "stop", "messages", "depth", "slices", "steals", "stolen"]
+SENT, RECEIVED, IDLE, STOP, MESSAGES, DEPTH, SLICES, STEALS, STOLEN = range(len(STATS))
+FIELDS = len(STATS)
+
+# Control messages (wire.CONTROL) between schedulers.
+STEAL, ACTOR, GIVEN = range(3)
+COUNT = struct.Struct("<I")
+STEAL_BACKOFF = 0.001           # Seconds before asking again when nobody had anything to give.
+PENDING = 1024                  # Messages held back for a process before its senders wait.
+PAUSE, MAX_PAUSE = 0.00005, 0.004   # Seconds between polls when idle, doubling while nothing turns up.
+CONTROL_EVERY = 1024            # Slices a busy worker runs between looking for commands.
+
+COUNTERS = 16                   # A Ring's read and written counters.
+LENGTH = struct.Struct("<I")    # Each message's length before it in a Ring.
+SKIP = 0xFFFFFFFF               # Nothing more before the Ring wraps.
+
+TYPES = ["af_types.af_any", "af_types.af_int", "af_types.af_bool", "af_types.af_debug", "af_types.af_see",
+         "af_types.af_branch", "af_types.af_environment", "af_types.af_stream", "af_types.af_actor", "compiler"]
+
+
+class Ring:
+    """
+    One way, one writer, one reader queue of messages in shared memory.
+    The read and written counters only ever go up (positions are them
+    modulo size) and each side only ever changes its own.
+
+    Messages aren't split across the end so one that doesn't fit before
+    it goes at the start. Anything up to half the size (with its length)
+    then always fits once the reader has caught up, wherever that is.
+    """
+
+    def __init__(self, buf: memoryview, offset: int, size: int) -> None:
+        self.size = size
+        self.largest = size // 2 - LENGTH.size     # Biggest message put takes.
+        self.counters = buf[offset : offset + COUNTERS].cast("Q")
+        self.data = buf[offset + COUNTERS : offset + COUNTERS + size]
+
+
+    def put(self, message: bytes) -> bool:
+        """
+        False if there's no room for message yet.
+        """
+        assert len(message) <= self.largest, "Message too big for the ring."
+        needed = LENGTH.size + len(message)
+        read, written = self.counters[0], self.counters[1]
+        at = written % self.size
+        left = self.size - at
+        # Messages aren't split across the end so skip what's left of it.
+        skip = left if left < needed else 0
+        if written + skip + needed - read > self.size:
+            return False
+        if skip:
+            if left >= LENGTH.size: LENGTH.pack_into(self.data, at, SKIP)
+            written += skip
+            at = 0
+        LENGTH.pack_into(self.data, at, len(message))
+        self.data[at + LENGTH.size : at + needed] = message
+        # Only now can the reader see it.
+        self.counters[1] = written + needed
+        return True
+
+
+    def get_all(self) -> List[bytes]:
+        read, written = self.counters[0], self.counters[1]
+        messages = []
+        while read < written:
+            at = read % self.size
+            left = self.size - at
+            length = LENGTH.unpack_from(self.data, at)[0] if left >= LENGTH.size else SKIP
+            if length == SKIP:
+                read += left
+                continue
+            messages.append(bytes(self.data[at + LENGTH.size : at + LENGTH.size + length]))
+            read += LENGTH.size + length
+        self.counters[0] = read
+        return messages
+
+
+    def close(self) -> None:
+        self.counters.release()
+        self.data.release()
+
+
+def layout(endpoints: int, ring_size: int) -> int:
+    """
+    Bytes of shared memory for endpoints processes.
+    """
+    return endpoints * FIELDS * 8 + endpoints * endpoints * (COUNTERS + ring_size)
+
+
+class Transport:
+    """
+    Carries messages between node and the other processes for its Scheduler.
+    """
+
+    def __init__(self, node: int, nodes: int, buf: memoryview, ring_size: int, peers: Sequence[int] = (),
+                    sched: Scheduler = scheduler) -> None:
+        self.node = node
+        self.nodes = nodes
+        self.ring_size = ring_size
+        self.scheduler = sched
+        self.peers = [n for n in peers if n != node]    # Who we can steal actors from.
+        self.moved : Dict[int, int] = {}                # Pids of actors we've given away -> where to.
+        self.asking : Optional[int] = None              # Who we've asked for actors.
+        self.next_steal = 0.0
+        self.steals = 0
+        self.stolen = 0
+        table = endpoints = nodes
+        self.stats = buf[: table * FIELDS * 8].cast("q")
+        def ring(src: int, dst: int) -> Ring:
+            return Ring(buf, table * FIELDS * 8 + (src * endpoints + dst) * (COUNTERS + ring_size), ring_size)
+        self.outbound = [ring(node, dst) for dst in range(nodes)]
+        self.inbound = [ring(src, node) for src in range(nodes)]
+        self.pending : List[Deque[bytes]] = [deque() for n in range(nodes)]
+        self.held : List[Deque[Actor]] = [deque() for n in range(nodes)]   # Waiting for pending to go down.
+        self.sent = 0
+        self.received = 0
+        self.pause = PAUSE
+
+
+    def publish(self, field: int, value: int) -> None:
+        self.stats[self.node * FIELDS + field] = value
+
+
+    def put(self, dst: int, data: bytes) -> None:
+        if len(data) > self.outbound[dst].largest:
+            # It would never fit and everything after it would wait behind it.
+            raise ValueError("A message of %s bytes is too big for rings of %s." % (len(data), self.ring_size))
+        pending = self.pending[dst]
+        if pending or not self.outbound[dst].put(data):
+            pending.append(data)
+        self.sent += 1
+        self.publish(IDLE, 0)
+        self.publish(SENT, self.sent)
+
+
+    def destination(self, actor: Actor) -> int:
+        return self.moved.get(actor.pid, actor.pid % self.nodes)
+
+
+    def full(self, actor: Actor) -> bool:
+        """
+        Whether sending to actor has to wait for messages held back to go.
+        """
+        return len(self.pending[self.destination(actor)]) >= PENDING
+
+
+    def hold(self, sender: Actor, actor: Actor) -> None:
+        """
+        Called when the running actor finds sending to actor is full. The
+        send is tried again once the ring has taken some of what's pending.
+        """
+        assert sender is self.scheduler.running and sender.cont is not None
+        self.held[self.destination(actor)].append(sender)
+        sender.waiting = True
+        sender.cont.suspend()
+        self.scheduler.blocked += 1
+
+
+    def send(self, actor: Actor, message: StackObject) -> None:
+        dst = self.destination(actor)
+        if dst == self.node:
+            # Started here and finished since.
+            self.scheduler.deliver(actor, message)
+            return
+        self.put(dst, wire.encode(actor.pid, message))
+
+
+    def control(self, dst: int, kind: int, payload: bytes = b"") -> None:
+        self.put(dst, wire.HEADER.pack(self.node, wire.CONTROL) + bytes([kind]) + payload)
+
+
+    def poll(self) -> None:
+        """
+        Sends what the rings had no room for before and delivers whatever
+        has arrived for our actors.
+        """
+        sched = self.scheduler
+        for dst, pending in enumerate(self.pending):
+            ring = self.outbound[dst]
+            while pending and ring.put(pending[0]):
+                pending.popleft()
+            held = self.held[dst]
+            while held and len(pending) < PENDING:
+                sender = held.popleft()
+                # It may have finished already.
+                if sender.waiting and sender.pid in sched.actors:
+                    sender.waiting = False
+                    sched.ready.append(sender)
+        address = sched.address
+        deliver = sched.deliver
+        moved = self.moved
+        for ring in self.inbound:
+            messages = ring.get_all()
+            if not messages: continue
+            # Not idle before what we've just been given counts as received.
+            self.publish(IDLE, 0)
+            self.pause = PAUSE
+            for data in messages:
+                pid, tag = wire.HEADER.unpack_from(data)
+                if tag == wire.CONTROL:
+                    self.handle(pid, data[wire.HEADER.size], data[wire.HEADER.size + 1:])
+                elif pid in moved:
+                    # Gone somewhere else since this was sent.
+                    self.put(moved[pid], data)
+                else:
+                    deliver(address(pid), wire.decode(data)[1])
+            self.received += len(messages)
+            self.publish(RECEIVED, self.received)
+        if sched.ready: self.pause = PAUSE
+        self.publish(MESSAGES, sched.sent)
+        self.publish(DEPTH, len(sched.ready))
+        self.publish(SLICES, sched.switches)
+
+
+    def handle(self, src: int, kind: int, payload: bytes) -> None:
+        if kind == STEAL:
+            self.give(src)
+        elif kind == ACTOR:
+            actor = self.scheduler.adopt(migrate.loads(payload))
+            self.moved.pop(actor.pid, None)
+            self.stolen += 1
+            self.publish(STOLEN, self.stolen)
+        elif kind == GIVEN:
+            self.asking = None
+            if COUNT.unpack(payload)[0]:
+                self.steals += 1
+                self.publish(STEALS, self.steals)
+            else:
+                self.next_steal = time.monotonic() + STEAL_BACKOFF
+
+
+    def give(self, thief: int) -> None:
+        """
+        Sends thief half the actors in our run queue, newest first.
+        """
+        ready = self.scheduler.ready
+        kept : List[Actor] = []
+        given = 0
+        for n in range(len(ready) // 2):
+            actor = ready.pop()
+            try:
+                data = migrate.dumps(actor)
+            except Exception:
+                data = None
+            if data is None or wire.HEADER.size + 1 + len(data) > self.outbound[thief].largest:
+                kept.append(actor)
+                continue
+            self.scheduler.release(actor)
+            self.moved[actor.pid] = thief
+            self.control(thief, ACTOR, data)
+            given += 1
+        ready.extend(reversed(kept))
+        self.control(thief, GIVEN, COUNT.pack(given))
+
+
+    def steal(self) -> None:
+        """
+        Asks the worker with the most actors waiting to run for some of them.
+        """
+        if self.asking is not None or not self.peers or time.monotonic() < self.next_steal: return
+        depth, victim = max((self.stats[n * FIELDS + DEPTH], n) for n in self.peers)
+        if depth < 2: return
+        self.asking = victim
+        self.control(victim, STEAL)
+
+
+    def idle(self) -> bool:
+        return not any(self.pending) and not self.scheduler.ready
+
+
+    def wait(self) -> None:
+        """
+        Nothing to run until something arrives (or we find some elsewhere).
+        """
+        if not self.scheduler.ready: self.steal()
+        if self.idle(): self.publish(IDLE, 1)
+        time.sleep(self.pause)
+        self.pause = min(self.pause * 2, MAX_PAUSE)
+
+
+    def stopping(self) -> bool:
+        return self.stats[self.node * FIELDS + STOP] != 0
+
+
+    def close(self) -> None:
+        for ring in self.outbound + self.inbound:
+            ring.close()
+        self.stats.release()
+
+
+def _worker(node: int, endpoints: int, shm_name: str, ring_size: int, steal: bool, source: str,
+                control: Any, replies: Any) -> None:
+    # Every Type (and codec) there is, as in repl.py.
+    for module in TYPES:
+        importlib.import_module(module)
+    from continuation import Continuation
+    from interpret import interpret
+    from af_types.af_actor import spawn_word
+
+    shm = shared_memory.SharedMemory(name = shm_name)
+    # The last endpoint is whoever started the cluster, which isn't stolen from.
+    transport = Transport(node, endpoints, shm.buf, ring_size, range(endpoints - 1) if steal else ())
+    try:
+        scheduler.configure(node, endpoints, transport)
+        cont = Continuation()
+        cont.prompt = ""
+        cont.execute(interpret(cont, StringIO(source)))
+        replies.put(("ready", node))
+        while not transport.stopping():
+            try:
+                # Commands once there's nothing left to run (or every so often if there always is).
+                scheduler.run(until = lambda: transport.stopping() or
+                    ((not scheduler.ready or scheduler.switches % CONTROL_EVERY == 0) and not control.empty()))
+                while not control.empty():
+                    command, word = control.get()
+                    if command == "spawn":
+                        replies.put(("spawned", spawn_word(word).pid))
+            except Exception:
+                traceback.print_exc()
+    finally:
+        scheduler.transport = None
+        transport.close()
+        shm.close()
+
+
+class Cluster:
+
+    def __init__(self, nodes: int, source: str = "", ring_size: int = 1 << 16, steal: bool = True) -> None:
+        self.nodes = nodes                  # Worker processes. We're node number nodes.
+        self.endpoints = nodes + 1
+        self.source = source                # Words every worker defines before starting.
+        self.ring_size = ring_size
+        self.steal = steal                  # Whether idle workers take actors from busy ones.
+        self.context = multiprocessing.get_context("spawn")
+        self.workers : List[Any] = []
+        self.controls : List[Any] = []
+        self.replies = self.context.Queue()
+        self.shm : Optional[shared_memory.SharedMemory] = None
+        self.transport : Optional[Transport] = None
+        self.next_node = 0
+
+
+    def start(self) -> "Cluster":
+        assert not scheduler.actors, "Can't join a cluster with actors already running here."
+        self.shm = shared_memory.SharedMemory(create = True, size = layout(self.endpoints, self.ring_size))
+        self.shm.buf[:] = bytes(self.shm.size)
+        for node in range(self.nodes):
+            control = self.context.Queue()
+            worker = self.context.Process(target = _worker, daemon = True,
+                args = (node, self.endpoints, self.shm.name, self.ring_size, self.steal, self.source, control, self.replies))
+            worker.start()
+            self.controls.append(control)
+            self.workers.append(worker)
+        for node in range(self.nodes):
+            assert self.replies.get(timeout = 60)[0] == "ready"
+        self.transport = Transport(self.nodes, self.endpoints, self.shm.buf, self.ring_size)
+        scheduler.configure(self.nodes, self.endpoints, self.transport)
+        return self
+
+
+    def spawn(self, word: str, node: Optional[int] = None) -> Actor:
+        """
+        Starts an actor running word on node (or each worker in turn).
+        """
+        if node is None:
+            node, self.next_node = self.next_node, (self.next_node + 1) % self.nodes
+        self.controls[node].put(("spawn", word))
+        kind, pid = self.replies.get(timeout = 60)
+        return scheduler.address(pid)
+
+
+    def send(self, actor: Actor, message: StackObject) -> None:
+        scheduler.send(actor, message)
+
+
+    def wait_idle(self, timeout: float = 60.0) -> bool:
+        """
+        Waits until no worker has anything left to run or in flight.
+        """
+        transport = self.transport
+        assert transport is not None, "The cluster hasn't been started."
+        deadline = time.monotonic() + timeout
+        last = None
+        while time.monotonic() < deadline:
+            transport.poll()
+            scheduler.run()
+            transport.wait()
+            stats = self.stats()
+            done = all(s["idle"] for s in stats[:-1]) and transport.idle() and \
+                sum(s["sent"] for s in stats) == sum(s["received"] for s in stats)
+            # The same twice running so nobody was caught in the middle of something.
+            if done and stats == last: return True
+            last = stats if done else None
+        return False
+
+
+    def stats(self) -> List[Dict[str, int]]:
+        """
+        What each process (workers then us) has published.
+        """
+        assert self.transport is not None, "The cluster hasn't been started."
+        table = self.transport.stats
+        return [{name: table[n * FIELDS + field] for field, name in enumerate(STATS) if field != STOP}
+                for n in range(self.endpoints)]
+
+
+    def stop(self) -> None:
+        if self.shm is None: return
+        assert self.transport is not None
+        for node in range(self.nodes):
+            self.transport.stats[node * FIELDS + STOP] = 1
+        for worker in self.workers:
+            worker.join(10)
+            if worker.is_alive(): worker.terminate()
+        scheduler.clear()
+        scheduler.transport = None
+        scheduler.configure(0, 1)
+        self.transport.close()
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        for queue in self.controls + [self.replies]:
+            queue.close()
+
+
+    def __enter__(self) -> "Cluster":
+        return self.start()
+
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
@@ -0,0 +1,405 @@
+"""
+codegen.py - compiling words to Python.
+
+Interpreting a compiled word costs a trip around Continuation.execute, a
+Python call and a few Stack pushes and pops for every word in it. Words
+made entirely of primitives that have registered a Template here (along
+with folded constants, calls to other such words and pattern matched
+calls between them) are instead turned into Python source for a function
+per word, each taking its inputs as arguments and returning its outputs.
+Stack slots become local variables, calls between words become plain
+Python calls and pattern matching becomes an if/elif chain on the values
+of the inputs - their types are all known when the source is generated.
+
+Templates are given the Generator and the Slots (Python expression, Type)
+the primitive would find on the stack and return the Slots it leaves
+there, or None if they can't handle those Types. Templates for closures
+built by @rebuildable factories are registered for the factory and also
+get the arguments it was called with. Type modules register them for
+their primitives much as they do Fusions (see optimizer.py).
+Generated code passes values around freely so it's only used for Types
+registered with register_value_type, whose values are immutable. Anything
+else - Atom literals, words with generic signatures, primitives without
+Templates - leaves the word to the interpreter.
+
+Generated code can't be suspended part way so every generated call
+spends one of the running Continuation's reductions (see
+Continuation.resume). When they run out before it's done the word is
+left to the interpreter, which can be.
+
+Generated pure words check and fill the memo cache just as interpreted
+ones do. Generated code is cached per word until the dictionaries
+change. Set codegen.enabled to False to interpret everything or
+codegen.verify to True to run both and compare what they leave on the
+stack.
+"""
+import logging
+from typing import Dict, List, Tuple, Callable, Any, Optional, Sequence, Set
+from weakref import WeakKeyDictionary
+
+from aftype import AF_Type, AF_Continuation, StackObject
+from operation import Operation, Operation_def
+from af_types import Type
+from continuation import NO_LIMIT
+from memo import memo
+from tracing import trace
+
+
+# A value on the stack while generating code - the Python expression that
+# computes it and its Type.
+Slot = Tuple[str, AF_Type]
+# Templates take (Generator, List[Slot], Operation) and then the arguments
+# of the @rebuildable recipe that built the primitive, if any.
+Template = Callable[..., Optional[List[Slot]]]
+
+
+class Unsupported(Exception): pass
+
+
+class NativeMismatch(Exception): pass
+
+
+class OutOfReductions(Exception): pass
+
+
+def shuffle(*positions: int) -> Template:
+    """
+    Template for stack words that just rearrange their inputs (positions count from the oldest).
+    """
+    return lambda g, args, word: [args[p] for p in positions]
+
+
+class Generator:
+    """
+    Builds the source for a word and every word it calls.
+    """
+
+    def __init__(self, codegen: "Codegen") -> None:
+        self.codegen = codegen
+        self.namespace : Dict[str, Any] = {}
+        self.functions : Dict[int, str] = {}    # id(Operation) -> function name.
+        self.pending : List[Tuple[str, Operation]] = []
+        self.source : List[str] = []
+        self.lines : List[str] = []
+        self.indent : int = 1
+        self.temps : int = 0
+
+    def emit(self, line: str) -> None:
+        self.lines.append("    " * self.indent + line)
+
+    def temp(self, expr: str) -> str:
+        name = "v%s" % self.temps
+        self.temps += 1
+        self.emit("%s = %s" % (name, expr))
+        return name
+
+    def constant(self, value: Any) -> str:
+        """
+        An expression for value - a literal if possible, otherwise a name bound to it.
+        """
+        if type(value) in (int, bool, str, float, type(None)):
+            return repr(value)
+        for name, bound in self.namespace.items():
+            if bound is value: return name
+        name = "k%s" % len(self.namespace)
+        self.namespace[name] = value
+        return name
+
+    def function(self, op: Operation) -> str:
+        name = self.functions.get(id(op))
+        if name is None:
+            name = self.functions[id(op)] = "w%s_%s" % (len(self.functions), "".join(ch if ch.isalnum() else "_" for ch in op.name))
+            self.pending.append((name, op))
+        return name
+
+    def generate(self, op: Operation) -> str:
+        entry = self.function(op)
+        while self.pending:
+            self.word(*self.pending.pop())
+        inputs = ", ".join("a%s" % n for n in range(op.sig.stack_in.depth()))
+        outputs = op.sig.stack_out.depth()
+        self.namespace["fuel"] = NO_LIMIT
+        self.source.append("def entry(%s):" % inputs)
+        if outputs == 0:
+            self.source += ["    %s(%s)" % (entry, inputs), "    return ()"]
+        elif outputs == 1:
+            self.source.append("    return (%s(%s),)" % (entry, inputs))
+        else:
+            self.source.append("    return %s(%s)" % (entry, inputs))
+        return "\n".join(self.source) + "\n"
+
+    def word(self, name: str, op: Operation) -> None:
+        sig = [o.stype for o in op.sig.stack_in.contents()]
+        expected = [o.stype for o in op.sig.stack_out.contents()]
+        if any(t.name not in self.codegen.value_types for t in sig + expected):
+            raise Unsupported("'%s' takes or leaves something other than values." % op.name)
+
+        self.lines, self.indent, self.temps = [], 1, 0
+        self.emit("global fuel")
+        self.emit("fuel -= 1")
+        self.emit("if fuel < 0: raise %s" % self.constant(OutOfReductions))
+        stack : List[Slot] = [("a%s" % n, t) for n, t in enumerate(sig)]
+        if op.sig.pure:
+            self.recall(op, stack, len(expected))
+        for w in op.words:
+            stack = self.call(w, stack)
+        if [t.name for _, t in stack] != [t.name for t in expected]:
+            raise Unsupported("'%s' leaves %s rather than %s." % (op.name, [t.name for _, t in stack], [t.name for t in expected]))
+        if op.sig.pure:
+            self.emit("if key is not None: %s.save(key, (%s))" % (self.constant(memo),
+                "".join("%s(stype=%s, value=%s), " % (self.constant(StackObject), self.constant(t), e) for e, t in stack)))
+
+        if len(stack) == 1:
+            self.emit("return %s" % stack[0][0])
+        elif stack:
+            self.emit("return (%s)" % ", ".join(e for e, _ in stack))
+        self.source.append("def %s(%s):" % (name, ", ".join("a%s" % n for n in range(len(sig)))))
+        self.source += self.lines or ["    pass"]
+        self.source.append("")
+
+    def recall(self, op: Operation, inputs: List[Slot], outputs: int) -> None:
+        # Returns early with results from the memo cache (see memo.py).
+        self.emit("key = %s.make_key(%s, (%s))" % (self.constant(memo), self.constant(op),
+                    "".join("(%s, %s), " % (t.id, e) for e, t in inputs)))
+        self.emit("found = %s.lookup(key) if key is not None else None" % self.constant(memo))
+        self.emit("if found is not None:")
+        if outputs == 0:
+            self.emit("    return")
+        elif outputs == 1:
+            self.emit("    return found[0].value")
+        else:
+            self.emit("    return tuple(o.value for o in found)")
+
+    def call(self, word: Operation, stack: List[Slot]) -> List[Slot]:
+        depth = word.sig.stack_in.depth()
+        if depth > len(stack):
+            raise Unsupported("'%s' would underflow." % word.name)
+        result = self.apply(word, stack[len(stack) - depth:])
+        for _, stype in result:
+            if stype.name not in self.codegen.value_types:
+                raise Unsupported("'%s' leaves a %s." % (word.name, stype.name))
+        return stack[:len(stack) - depth] + result
+
+    def apply(self, word: Operation, args: List[Slot]) -> List[Slot]:
+        for (_, stype), o in zip(args, word.sig.stack_in.contents()):
+            if not o.stype.is_generic() and o.stype.name != stype.name:
+                raise Unsupported("'%s' can't take a %s." % (word.name, stype.name))
+
+        if word.words:
+            if word.the_op not in self.codegen.compiled:
+                raise Unsupported("'%s' isn't an ordinary compiled word." % word.name)
+            call = "%s(%s)" % (self.function(word), ", ".join(e for e, _ in args))
+            outputs = [o.stype for o in word.sig.stack_out.contents()]
+            if not outputs:
+                self.emit(call)
+                return []
+            if len(outputs) == 1:
+                return [(self.temp(call), outputs[0])]
+            names = ["v%s" % (self.temps + n) for n in range(len(outputs))]
+            self.temps += len(outputs)
+            self.emit("%s = %s" % (", ".join(names), call))
+            return list(zip(names, outputs))
+
+        candidates = getattr(word.the_op, "words", None)
+        if candidates is not None:
+            return self.dispatch(word, candidates, args)
+
+        template = self.codegen.template(word)
+        result = template(self, args, word) if template is not None else None
+        if result is None:
+            raise Unsupported("No template for '%s' taking %s." % (word.name, [t.name for _, t in args]))
+        return result
+
+    def dispatch(self, word: Operation, candidates: Sequence[Operation], args: List[Slot]) -> List[Slot]:
+        """
+        Inlines a pattern matched call as tests on the input values, in the
+        same order the interpreter tries them.
+        """
+        results : Optional[List[Slot]] = None
+        opened = False
+        for candidate in candidates:
+            tests = []
+            matches = True
+            for (expr, stype), o in zip(args, candidate.sig.stack_in.contents()):
+                if not o.stype.is_generic() and o.stype.name != stype.name:
+                    matches = False
+                    break
+                if o.value is not None:
+                    tests.append("%s == %s" % (expr, self.constant(o.value)))
+            if not matches: continue
+            if not tests and not opened:
+                # Always the first to match.
+                return self.apply(candidate, args)
+
+            self.emit(("elif %s:" if opened else "if %s:") % " and ".join(tests) if tests else "else:")
+            opened = True
+            self.indent += 1
+            slots = self.apply(candidate, args)
+            if results is None:
+                results = [("v%s" % (self.temps + n), t) for n, (_, t) in enumerate(slots)]
+                self.temps += len(slots)
+            if [t.name for _, t in slots] != [t.name for _, t in results]:
+                raise Unsupported("Overloads of '%s' leave different types." % word.name)
+            for (name, _), (expr, _) in zip(results, slots):
+                self.emit("%s = %s" % (name, expr))
+            if not results: self.emit("pass")
+            self.indent -= 1
+            if not tests: return results
+
+        if results is None:
+            raise Unsupported("Nothing can match '%s'." % word.name)
+        self.emit("else:")
+        self.emit("    raise Exception('No matches found!')")
+        return results
+
+
+class Codegen:
+
+    def __init__(self) -> None:
+        self.enabled : bool = True
+        self.verify : bool = False
+        # Implementations of compiled words (see compiler.py).
+        self.compiled : List[Operation_def] = []
+        # Primitive implementations, or the @rebuildable factories that built them, -> Template.
+        self.templates : Dict[Any, Template] = {}
+        # Names of Types with immutable values.
+        self.value_types : Set[str] = set()
+        self.epoch : Optional[int] = None
+        self.dictionary : Any = None
+        # Operation -> its generated entry function or None if it can't be generated.
+        self.natives : "WeakKeyDictionary[Operation, Optional[Callable[..., Tuple[Any, ...]]]]" = WeakKeyDictionary()
+        self.generated : int = 0
+        self.unsupported : int = 0
+        self.calls : int = 0
+        self.fallbacks : int = 0
+        self.checks : int = 0
+
+
+    def register(self, op_def: Any, template: Template) -> None:
+        self.templates[op_def] = template
+
+
+    def template(self, word: Operation) -> Optional[Template]:
+        constant = getattr(word.the_op, "constant", None)
+        if constant is not None and not word.words and word.sig.stack_in.depth() == 0:
+            value, stype = constant.value, constant.stype
+            return lambda g, args, word: [(g.constant(value), stype)]
+        template = self.templates.get(word.the_op)
+        if template is None:
+            recipe = getattr(word.the_op, "recipe", None)
+            if recipe is not None and recipe[0] in self.templates:
+                build, recipe_args = recipe
+                return lambda g, args, word: self.templates[build](g, args, word, *recipe_args)
+        return template
+
+
+    def native(self, op: Operation) -> Optional[Callable[..., Tuple[Any, ...]]]:
+        """
+        The generated entry function for op or None if it must be interpreted.
+        """
+        if Type.epoch != self.epoch or Type.types is not self.dictionary:
+            self.natives.clear()
+            self.epoch = Type.epoch
+            self.dictionary = Type.types
+        try:
+            return self.natives[op]
+        except KeyError:
+            pass
+
+        native = None
+        g = Generator(self)
+        try:
+            source = g.generate(op)
+            exec(compile(source, "<codegen %s>" % op.name, "exec"), g.namespace)
+            native = g.namespace["entry"]
+            native.source = source # type: ignore
+            self.generated += 1
+            trace("Generated code for '%s':\n%s", op.name, source)
+        except Unsupported as ex:
+            self.unsupported += 1
+            trace("Interpreting '%s' : %s", op.name, ex)
+        self.natives[op] = native
+        return native
+
+
+    def execute(self, c: AF_Continuation, op: Operation) -> bool:
+        """
+        Runs op's generated code against c's stack. Returns False, leaving
+        the stack alone, if op must be interpreted.
+        """
+        if not self.enabled or c.debug: return False
+        native = self.native(op)
+        if native is None: return False
+
+        depth = op.sig.stack_in.depth()
+        inputs = c.stack.contents(depth) if depth else []
+        # Only the outermost execute stops when its budget runs out.
+        fuel = max(c.budget, 0) if c.executing == 1 else NO_LIMIT
+        namespace = native.__globals__ # type: ignore
+        namespace["fuel"] = fuel
+        try:
+            results = native(*[o.value for o in inputs])
+        except OutOfReductions:
+            # Nothing has touched the stack yet so let the interpreter run it
+            # a piece at a time. Words it calls still get to run generated.
+            c.budget -= fuel
+            self.fallbacks += 1
+            return False
+        except RecursionError:
+            # Nothing has touched the stack yet so just let the interpreter have
+            # it - and every other call until the dictionaries change.
+            self.fallbacks += 1
+            self.natives[op] = None
+            return False
+        c.budget -= fuel - namespace["fuel"]
+        self.calls += 1
+        outputs = [StackObject(stype=o.stype, value=v) for o, v in zip(op.sig.stack_out.contents(), results)]
+
+        if self.verify:
+            return self.check(c, op, outputs)
+        for n in range(depth):
+            c.stack.pop()
+        for o in outputs:
+            c.stack.push(o)
+        return True
+
+
+    def check(self, c: AF_Continuation, op: Operation, outputs: List[StackObject]) -> bool:
+        """
+        Interprets op as well and compares the results. When op is being
+        called from a running Continuation the comparison happens once its
+        code returns and we return False for the caller to call it.
+        """
+        def compare(c: AF_Continuation) -> None:
+            self.checks += 1
+            found = c.stack.contents(len(outputs)) if outputs else []
+            if [(o.stype.name, o.value) for o in found] != [(o.stype.name, o.value) for o in outputs]:
+                raise NativeMismatch("Generated code for '%s' left %s but the interpreter left %s." % (op.name, outputs, found))
+
+        if c.executing:
+            c.call([(Operation("codegen check", compare), c.symbol)])
+            return False
+        c.call(op.code())
+        compare(c)
+        return True
+
+
+    def source(self, op: Operation) -> Optional[str]:
+        native = self.native(op)
+        return getattr(native, "source", None)
+
+
+    def __str__(self) -> str:
+        return "Codegen(enabled=%s, verify=%s, generated=%s, unsupported=%s, calls=%s, fallbacks=%s, checks=%s)" % \
+            (self.enabled, self.verify, self.generated, self.unsupported, self.calls, self.fallbacks, self.checks)
+
+
+codegen = Codegen()
+
+
+def register_template(op_def: Any, template: Template) -> None:
+    codegen.register(op_def, template)
+
+
+def register_value_type(stype: AF_Type) -> None:
+    codegen.value_types.add(stype.name)
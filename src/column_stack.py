@@ -0,0 +1,168 @@
+"""
+column_stack.py - a data Stack held as parallel columns rather than a list of StackObjects.
+
+Every slot has an entry in three columns:
+
+    _types      - the slot's Type.
+    _ints       - an array('q') holding the value of slots whose value is a
+                  plain int that fits in 64 bits (0 for any other slot).
+    _objects    - the StackObject itself for every other slot (None for
+                  int slots).
+
+Int slots are never boxed while they sit on the stack - a StackObject is
+only built for them when Python code asks for one through pop(), tos(),
+contents() or a view. That also means that, unlike every other slot, an
+int slot hands back a new StackObject each time so changing one in place
+changes nothing on the stack.
+
+Primitives that know they're dealing with ints (see af_int.py) can check
+Stack.columnar and use pop_int/push_int to work on the columns directly.
+"""
+from typing import Sequence, Any, List, Optional, Union
+from array import array
+
+from stack import Stack, KStack
+from aftype import AF_Type, StackObject
+
+
+INT_MIN = -(1 << 63)
+INT_MAX = (1 << 63) - 1
+
+
+class ColumnView(Sequence):
+    """
+    Read only, live view of a ColumnStack (oldest first) as returned by view().
+    Materializes StackObjects only for the positions actually read.
+    """
+
+    def __init__(self, stack: "ColumnStack") -> None:
+        self._stack = stack
+
+    def __len__(self) -> int:
+        return len(self._stack._types)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self._stack._slot(i) for i in range(*index.indices(len(self)))]
+        if index < 0: index += len(self)
+        if not 0 <= index < len(self): raise IndexError("ColumnView index out of range")
+        return self._stack._slot(index)
+
+
+class ColumnStack(Stack):
+
+    columnar = True
+
+    def __init__(self, in_seq: Sequence[Any] = None, telemetry: str = None):
+        self._types : List[AF_Type] = []
+        self._ints : array = array('q')
+        self._objects : List[Optional[StackObject]] = []
+        super(ColumnStack, self).__init__(in_seq, telemetry)
+
+    def _slot(self, index: int) -> StackObject:
+        obj = self._objects[index]
+        if obj is None:
+            return StackObject(stype = self._types[index], value = self._ints[index])
+        return obj
+
+    def push(self, item):
+        """
+        Adds item to top of stack and updates the stack_history.
+        """
+        self._push_count += 1
+        if self._record is not None: self._record(self)
+
+        value = item.value
+        self._types.append(item.stype)
+        if type(value) is int and INT_MIN <= value <= INT_MAX:
+            self._ints.append(value)
+            self._objects.append(None)
+        else:
+            self._ints.append(0)
+            self._objects.append(item)
+        return KStack.NonEmpty
+
+    def pop(self):
+        if not self._types:
+            return KStack.Empty
+        result = self._slot(-1)
+        self._drop()
+        return result
+
+    def _drop(self) -> None:
+        self._types.pop()
+        self._ints.pop()
+        self._objects.pop()
+        self._pop_count += 1
+        if self._record is not None: self._record(self)
+
+    def tos(self):
+        if not self._types:
+            return KStack.Empty
+        return self._slot(-1)
+
+    def tos_type(self) -> Optional[AF_Type]:
+        return self._types[-1] if self._types else None
+
+    def types(self, last: int) -> List[AF_Type]:
+        return self._types[-last:] if last > 0 else []
+
+    def pop_int(self) -> int:
+        """
+        Pops the value of an Int slot without building a StackObject for it.
+        """
+        obj = self._objects[-1]
+        value = self._ints[-1] if obj is None else obj.value
+        self._drop()
+        return value
+
+    def peek_int(self) -> int:
+        """
+        The value of the Int slot on top of stack.
+        """
+        obj = self._objects[-1]
+        return self._ints[-1] if obj is None else obj.value
+
+    def push_int(self, value: int, stype: AF_Type) -> None:
+        """
+        Pushes an int value of the given Type without building a StackObject for it.
+        """
+        if not INT_MIN <= value <= INT_MAX:
+            self.push(StackObject(stype = stype, value = value))
+            return
+        self._push_count += 1
+        if self._record is not None: self._record(self)
+        self._types.append(stype)
+        self._ints.append(value)
+        self._objects.append(None)
+
+    def contents(self, last: int = 0):
+        """
+        Returns the contents of the stack. Leftmost is oldest. Rightmost is top of stack.
+        If last is not 0 then return the last 'n items off the stack.
+        """
+        if last == 0:
+            return [self._slot(i) for i in range(len(self._types))]
+        if last > self.depth():
+            raise Exception("ERROR: Stack underflow. Request for last %i items from a stack with only a depth of %i!" % (last, self.depth()))
+        return [self._slot(i) for i in range(len(self._types) - last, len(self._types))]
+
+    def view(self) -> Sequence[Any]:
+        """
+        Returns a live view of the stack (oldest first). Callers must treat it as read only.
+        """
+        return ColumnView(self)
+
+    def copy(self):
+        result = ColumnStack(telemetry = self.telemetry)
+        result._types = self._types.copy()
+        result._ints = array('q', self._ints)
+        result._objects = self._objects.copy()
+        result._sample_rate = self._sample_rate
+        result._depth_history_count = self._depth_history_count.copy()
+        result._depth_history = array('l', self._depth_history)
+        result._history_next = self._history_next
+        result._push_count = self._push_count
+        result._pop_count = self._pop_count
+        result._max_depth = self._max_depth
+        return result
@@ -11,7 +11,13 @@ from copy import deepcopy
 from af_types import *
 from af_types.af_any import op_swap, op_stack
 from af_types.af_branch import op_pcsave, op_pcreturn
-from operation import Operation_def, TypeSignature
+from operation import Operation_def, TypeSignature, rebuildable, impure
+from optimizer import optimizer
+from dispatch import DecisionTree
+from memo import memo, impure_calls
+from codegen import codegen, register_template
+from tracing import trace, Lazy
+from af_types.af_int import TInt
 
 def sig_type_handler(c: AF_Continuation) -> None:
     compile_type_sig_handler(c)
@@ -61,6 +67,18 @@ make_word_context('->',op_switch_to_output_sig,[TWordDefinition,TInputTypeSignat
                         [TWordDefinition,TOutputTypeSignature])
 
 
+def op_declare_pure(c: AF_Continuation) -> None:
+    """
+    WordDefinition(Op_name), OutputTypeSignature(TypeSignature)
+        -> WordDefinition(Op_name), OutputTypeSignature(TypeSignature).
+
+    Declares the word being defined pure so its results can be cached (see memo.py).
+    """
+    c.stack.tos().value.pure = True
+make_word_context('pure', op_declare_pure, [TWordDefinition, TOutputTypeSignature],
+                    [TWordDefinition, TOutputTypeSignature])
+
+
 def op_start_code_compile(c: AF_Continuation) -> None:
     """
     WordDefinition(Op_name), OutputTypeSignature(TypeSignature)
@@ -104,6 +122,7 @@ def op_switch_to_pattern_matching(c: AF_Continuation) -> None:
     the TypeSignature from the OutputTypeSignature.
     """    
     sig = TypeSignature([],[])
+    sig.pure = c.stack.tos().value.pure
     c.stack.push(StackObject(value=sig, stype=TInputPatternMatch))
 make_word_context(':',op_switch_to_pattern_matching, [TWordDefinition, TOutputTypeSignature],
                     [TWordDefinition, TOutputTypeSignature, TInputPatternMatch])                
@@ -119,7 +138,7 @@ def op_switch_to_pattern_compilation(c: AF_Continuation) -> None:
 
     Constructs a new Operation declaration from STUFF
     """
-    c.log.debug("op_switch_to_pattern_compilation started.")
+    trace("op_switch_to_pattern_compilation started.")
     out_pattern : StackObject = c.stack.pop() # WD, OTS, OPM -> WD, OTS
 
     # Confirm our OutputTypePatternMatch output pattern matches the OutputTypeSignature's output sig.
@@ -147,9 +166,20 @@ def op_finish_word_compilation(c: AF_Continuation) -> None:
     TODO: MUST have this confirm Operation's TypeSignature matches
           the behavior of this Operation before storing it as a new word.
     """
-    c.log.debug("finishing word compilation!")
+    trace("finishing word compilation!")
     op : Operation = c.stack.pop().value
     s_in : Stack = op.sig.stack_in
+    if op.folds:
+        trace("Folded %s literal(s) in '%s'.", op.folds, op.name)
+    if op.sig.pure:
+        impure = impure_calls(op)
+        if impure:
+            msg = "Pure word '%s' can't call %s." % (op.name, ", ".join("'%s'" % w.name for w in impure))
+            c.log.error(msg)
+            raise Exception(msg)
+        op.the_op = op_execute_pure_word
+    if optimizer.optimize(op):
+        trace("Optimized '%s':\n%s", op.name, Lazy(lambda: optimizer.dump(op)))
 
     Type.add_op(op, s_in)
     c.stack.pop()
@@ -183,7 +213,7 @@ def _indent(c: AF_Continuation) -> str:
 
 # For executing COMPILE TIME words only!
 def compilation_word_handler(c: AF_Continuation) -> bool:
-    c.log.debug("compilation_word_handler")
+    trace("compilation_word_handler")
     # Lookup ONLY words for my specific type.
     assert c.symbol
     name = c.symbol.s_id
@@ -199,16 +229,16 @@ def compilation_word_handler(c: AF_Continuation) -> bool:
 
 
 def compile_type_sig_handler(c: AF_Continuation) -> None:
-    c.log.debug("\n\nstarting compile_type_sig_handler")
+    trace("\n\nstarting compile_type_sig_handler")
     handled = compilation_word_handler(c)
     out = "compile_type_sig_handler for type_name='%s' : received for symbol: %s "
     if handled: out += "HANDLED by compilation_word_handler."
-    c.log.debug(out % (c.stack.tos().stype.name, c.symbol))
+    trace(out, c.stack.tos().stype.name, c.symbol)
     if handled: return
     assert c.symbol
 
     # Is this word actually a type?
-    c.log.debug("Looking up a type called '%s'." % c.symbol.s_id)
+    trace("Looking up a type called '%s'.", c.symbol.s_id)
     _type = Type.get_type(c.symbol.s_id)
     assert _type, "%s isn't an existing type : %s" % (_type, Type.types.keys())
     if c.stack.tos().stype == TInputTypeSignature:
@@ -230,12 +260,12 @@ def compile_word_handler(c: AF_Continuation) -> None:
     TODO: Confirm Type Signatures in & out of found words to enforce type safety. (Done?)
     TODO: Retain Symbol information in the Operation to faciliate debugging, tracing, and code coverage.
     """
-    c.log.debug("compile_word_handler starting")
+    trace("compile_word_handler starting")
     handled = compilation_word_handler(c)
     if handled: return
 
     assert c.symbol
-    c.log.debug("looking up symbol.s_id = %s" % c.symbol.s_id)
+    trace("looking up symbol.s_id = %s", c.symbol.s_id)
     op_name : Op_name = c.symbol.s_id
     found : bool = False
 
@@ -259,7 +289,7 @@ def compile_word_handler(c: AF_Continuation) -> None:
     all_named_words = [w for w in Type.find_named_ops_for_scope(op_name, context_type, maybe_recursive_op)]
     if not context_type.is_generic():
         all_named_words += [w for w in Type.find_named_ops_for_scope(op_name, TAny)]
-    c.log.debug("All candidate words: %s." % all_named_words)
+    trace("All candidate words: %s.", all_named_words)
 
     def match_type_context(candidate: Operation, context: Stack) -> bool:
         # Walk backward down the stack.
@@ -272,7 +302,7 @@ def compile_word_handler(c: AF_Continuation) -> None:
         return True        
 
     type_matched_words = [w for w in all_named_words if match_type_context(w, tos_output_sig)]
-    c.log.debug("All type sig matching words: %s." % type_matched_words)
+    trace("All type sig matching words: %s.", type_matched_words)
 
     def match_some_value_context(candidate: Operation, context: Stack) -> int:        
         count = 0
@@ -283,7 +313,7 @@ def compile_word_handler(c: AF_Continuation) -> None:
                 if test.value == pattern.value: return True
         return count == 0
     value_some_matched_words = [w for w in type_matched_words if match_some_value_context(w, tos_output_sig)]   
-    c.log.debug("The some value matching words: %s." % value_some_matched_words)           
+    trace("The some value matching words: %s.", value_some_matched_words)
 
     def match_all_value_context(candidate: Operation, context: Stack) -> int:        
         for count, (test, pattern) in enumerate(zip_longest(candidate.sig.stack_in.contents()[::-1], context.contents()[::-1])):            
@@ -293,15 +323,16 @@ def compile_word_handler(c: AF_Continuation) -> None:
             if pattern.value is None: return False  
         return True      
     value_exact_matched_words = [w for w in value_some_matched_words if match_all_value_context(w, tos_output_sig)]
-    c.log.debug("The exact value matching words: %s." % value_exact_matched_words)
+    trace("The exact value matching words: %s.", value_exact_matched_words)
 
     #[type_matched_words.remove(word) for word in value_some_matched_words]
     #[value_some_matched_words.remove(word) for word in value_exact_matched_words]
 
     if value_exact_matched_words:
         assert len(value_exact_matched_words) == 1, "ERROR : more than one exact match! Not possible!"
+        if fold_literal(c, value_exact_matched_words[0]): return
         c.stack.tos().value.add_word(value_exact_matched_words[0])
-        c.log.debug("Compiled exact match for '%s' => %s." % (op_name, value_exact_matched_words[0]))
+        trace("Compiled exact match for '%s' => %s.", op_name, value_exact_matched_words[0])
         return
 
     # if value_some_matched_words or type_matched_words:
@@ -310,8 +341,9 @@ def compile_word_handler(c: AF_Continuation) -> None:
     #     candidate_words = value_some_matched_words + type_matched_words
     if type_matched_words:
         if len(type_matched_words)==1:
+            if fold_literal(c, type_matched_words[0]): return
             c.stack.tos().value.add_word(type_matched_words[0])
-            c.log.debug("Compiled exact match for '%s' => %s." % (op_name, type_matched_words[0]))
+            trace("Compiled exact match for '%s' => %s.", op_name, type_matched_words[0])
             return
 
         # Need to do some runtime pattern matching...
@@ -319,24 +351,100 @@ def compile_word_handler(c: AF_Continuation) -> None:
 
         c.stack.tos().value.add_word(Operation(op_name, matching_op, sig= matching_sig))
 
-        c.log.debug("Compiled pattern matching op for '%s' => %s." % (op_name, type_matched_words))
+        trace("Compiled pattern matching op for '%s' => %s.", op_name, type_matched_words)
         return
 
-    c.log.debug("FAILED TO FIND WORD TO COMPILE '%s'" % c.symbol.s_id )
+    trace("FAILED TO FIND WORD TO COMPILE '%s'", c.symbol.s_id)
 
-    c.log.debug("Compile as literal")
+    trace("Compile as literal")
         
-    def curry_make_atom(s, func = make_atom ):
-        def compiled_make_atom( c: AF_Continuation ):
-            c.symbol.s_id = s
-            return func(c)
-        return compiled_make_atom
-    op_implementation = curry_make_atom(op_name, make_atom)                
+    op_implementation = op_curry_make_atom(op_name)
     new_op = Operation(op_name, op_implementation, sig=TypeSignature([],[StackObject(stype=TAtom)]), symbol=c.symbol)
-    c.log.debug("New anonymous function: %s" % new_op)
+    trace("New anonymous function: %s", new_op)
     c.stack.tos().value.add_word( new_op )
 
-    c.log.debug("compile_word_handler ending")
+    trace("compile_word_handler ending")
+
+
+@rebuildable
+def op_curry_make_atom(s: str) -> Operation_def:
+    def compiled_make_atom( c: AF_Continuation ):
+        c.symbol.s_id = s
+        return make_atom(c)
+    compiled_make_atom.is_literal = True # type: ignore
+    return compiled_make_atom
+
+
+@rebuildable
+def op_push_constant(value: "StackObject") -> Operation_def:
+    def push_constant(c: AF_Continuation) -> None:
+        c.stack.push(value)
+    push_constant.is_literal = True # type: ignore
+    push_constant.constant = value # type: ignore
+    return push_constant
+
+
+def is_literal(op: Operation) -> bool:
+    """
+    True for compiled words that push a single, fixed value - literal Atoms
+    and the constants fold_literal builds from them.
+    """
+    return getattr(op.the_op, "is_literal", False) and not op.words \
+            and op.sig.stack_in.depth() == 0 and op.sig.stack_out.depth() == 1
+
+
+def is_foldable(op: Operation) -> bool:
+    """
+    True for words that turn one object into another without any other
+    side effects. For now that's any word implemented by a registered ctor
+    (int, bool, etc) which consumes exactly one input.
+    """
+    if op.words or op.sig.stack_in.depth() != 1 or op.sig.stack_out.depth() != 1:
+        return False
+    return any(ctor.the_op is op.the_op for op_map in Type.ctors.values() for _, ctor in op_map)
+
+
+def fold_literal(c: AF_Continuation, word: Operation) -> bool:
+    """
+    Expects the same stack as compile_word_handler.
+
+    If the word being compiled is foldable and the last compiled word is a
+    literal, run both now and replace the literal with a word that pushes
+    the prebuilt result. That result is shared by every execution so words
+    must never modify a StackObject in place.
+
+    Returns False, leaving the word to be compiled normally, if that isn't
+    possible or the ctor rejects the literal.
+    """
+    op : Operation = c.stack.tos().value
+    if not op.words or not is_literal(op.words[-1]) or not is_foldable(word):
+        return False
+    literal = op.words[-1]
+
+    stack, symbol, current = c.stack, c.symbol, c.op
+    c.stack = Stack()
+    try:
+        c.symbol = Symbol(literal.symbol.s_id, literal.symbol.location)
+        c.op = literal
+        literal(c)
+        c.symbol = Symbol(word.symbol.s_id, word.symbol.location)
+        c.op = word
+        word(c)
+        if c.stack.depth() != 1: return False
+        value = c.stack.pop()
+    except Exception as ex:
+        trace("Not folding '%s %s' : %s", literal.name, word.name, ex)
+        return False
+    finally:
+        c.stack, c.symbol, c.op = stack, symbol, current
+
+    name = "%s %s" % (literal.name, word.name)
+    op.words[-1] = Operation(name, op_push_constant(value),
+                             sig=TypeSignature([],[StackObject(stype=value.stype)]), symbol=literal.symbol)
+    op.words_changed()
+    op.folds += 1
+    trace("Folded '%s' into constant %s.", name, value)
+    return True
 
 
 def compile_pattern_handler(c: AF_Continuation) -> None:
@@ -351,7 +459,7 @@ def compile_pattern_handler(c: AF_Continuation) -> None:
 
     Allows for entry of Types and Typed Values which match the pattern of the OutputTypeSignature.
     """
-    c.log.debug("compile_pattern_handler starting")
+    trace("compile_pattern_handler starting")
     assert c.symbol
     if compilation_word_handler(c): return
 
@@ -371,7 +479,7 @@ def compile_pattern_handler(c: AF_Continuation) -> None:
         sig_declaration = op_sig.stack_out
         current_sig = c.stack.tos().value.stack_out
 
-    c.log.debug("'%s' match requested for sig_declaration: %s already having matched: %s." % (c.symbol, sig_declaration, current_sig))
+    trace("'%s' match requested for sig_declaration: %s already having matched: %s.", c.symbol, sig_declaration, current_sig)
         
     remaining_matches : int = sig_declaration.depth()-current_sig.depth()
     if remaining_matches < 1 : raise Exception("Too many entries now.")
@@ -412,7 +520,7 @@ def op_switch_to_output_pattern_sig(c: AF_Continuation) -> None:
     """
     # Pull the TypeSignature input sequence from the InputTypeSignature
     # down one position in the stack and then bring InputPatternMatch back up top.
-    c.log.debug("op_switch_to_output_pattern_sig starting")
+    trace("op_switch_to_output_pattern_sig starting")
     op_swap(c)
     input_sig : Stack = c.stack.tos().value.stack_in
     op_swap(c)
@@ -427,6 +535,16 @@ make_word_context('->', op_switch_to_output_pattern_sig, [TWordDefinition, TOutp
                         [TWordDefinition, TOutputTypeSignature, TOutputPatternMatch])        
 
 
+@rebuildable
+def op_curry_pop_and_push(pop_count: int, push_content: Sequence["StackObject"]) -> Operation_def:
+    def pop_and_push(c: AF_Continuation) -> None:
+        [c.stack.pop() for x in range(pop_count)]
+        [c.stack.push(x) for x in push_content]
+    return pop_and_push
+register_template(op_curry_pop_and_push,
+    lambda g, args, word, pops, outputs: args[:len(args) - pops] + [(g.constant(o.value), o.stype) for o in outputs])
+
+
 def compile_matched_pattern_to_word(c: AF_Continuation) -> None:
     """
     Stack pattern looks like this:
@@ -436,7 +554,7 @@ def compile_matched_pattern_to_word(c: AF_Continuation) -> None:
     Takes the current OutputPatternMatch object and tries to turn it
     into a new Operation word for our dictionary.        
     """
-    c.log.debug("compile_matched_pattern_to_word starting")
+    trace("compile_matched_pattern_to_word starting")
     op_swap(c)
     output_type_sig : TypeSignature = c.stack.tos().value
     op_swap(c)
@@ -463,9 +581,10 @@ def compile_matched_pattern_to_word(c: AF_Continuation) -> None:
     first_position : Optional[int] = None
     output_vals : List["StackObject"] = []
     for pos, (a,b) in enumerate(zip_longest(in_sig.contents(), out_sig.contents())):
-        if a.value != b.value and first_position is None: 
+        # Patterns can have more inputs than outputs (or fewer) so either may be missing.
+        if (a is None or b is None or a.value != b.value) and first_position is None: 
             first_position = pos
-        if first_position is not None and b.value is not None:
+        if first_position is not None and b is not None and b.value is not None:
             output_vals.append(b)
 
     if first_position is None:
@@ -475,12 +594,6 @@ def compile_matched_pattern_to_word(c: AF_Continuation) -> None:
         # Create an op that consumes an appropriate number of items from the stack 
         # and then pushes our content delta onto the stack.
         pops = in_sig.depth() - first_position
-        def op_curry_pop_and_push(pop_count: int, push_content: Sequence["StackObject"]) -> Operation_def:
-            def pop_and_push(c: AF_Continuation) -> None:
-                [c.stack.pop() for x in range(pop_count)]
-                [c.stack.push(x) for x in push_content]
-            return pop_and_push
-
         op = op_curry_pop_and_push(pops, output_vals)
 
     # Create our new word! (Will grab the name later.)
@@ -512,7 +625,7 @@ def compile_and_complete_pattern_to_word(c: AF_Continuation) -> None:
     Takes the current OutputPatternMatch object and tries to turn it
     into a new Operation word for our dictionary. Then clears the entire WordDefinition.
     """
-    c.log.debug("compile_and_complete_pattern_to_word starting")
+    trace("compile_and_complete_pattern_to_word starting")
     compile_matched_pattern_to_word(c)
     c.stack.pop()
     c.stack.pop()
@@ -520,9 +633,31 @@ def compile_and_complete_pattern_to_word(c: AF_Continuation) -> None:
 make_word_context('.', compile_and_complete_pattern_to_word, [TWordDefinition, TOutputTypeSignature, TOutputPatternMatch], [])            
 
 
-def match_and_execute_compiled_word(c: AF_Continuation, words: List[Operation]) -> Tuple[Callable[["AF_Continuation"],None], TypeSignature]:
-    def op_curry_match_and_execute(c: AF_Continuation) -> None:
-        c.log.debug("Attempting to pattern match with words = %s and this stack: %s." % (words,c.stack))
+@rebuildable
+def op_curry_match_and_execute(words: List[Operation]) -> Operation_def:
+    # Built on first use - loading an image calls us before words are complete.
+    tree : Optional[DecisionTree] = None
+
+    def match_and_execute(c: AF_Continuation) -> None:
+        # Lazy arguments - formatting every overload costs more than picking one.
+        trace("Attempting to pattern match with words = %s and this stack: %s.", words, c.stack)
+
+        # Rebuild if more words have been appended since.
+        nonlocal tree
+        if tree is None or tree.size != len(words):
+            tree = DecisionTree(words, effects = False)
+
+        data = c.stack.view()
+        if len(data) >= tree.depth:
+            word, result = tree.match(data)
+            if word is None:
+                c.log.error("No matches found!")
+                raise Exception("No matches found!")
+            trace("Matched! Call the operator.")
+            c.op = word
+            c.symbol = word.symbol
+            word(c)
+            return
 
         word_sig : Sequence["StackObject"]
         #op : Optional[Operation]
@@ -532,23 +667,23 @@ def match_and_execute_compiled_word(c: AF_Continuation, words: List[Operation])
             # Copy as many items off the stack as our pattern to match against.
             stack_frame = c.stack.contents(word.sig.stack_in.depth())
             word_sig = word.sig.stack_in.contents()
-            c.log.debug("Matching stack: %s against word sig: %s." % (stack_frame, word_sig))
+            trace("Matching stack: %s against word sig: %s.", stack_frame, word_sig)
             pat : StackObject
             test : StackObject
             for w,s in zip(word_sig,stack_frame):
                 # If our pattern has a value then the test value must match it.
                 if w.value is not None:
                     if w.value != s.value: 
-                        c.log.debug("Value mismatch: %s != %s." % (w.value, s.value))
+                        trace("Value mismatch: %s != %s.", w.value, s.value)
                         matches = False
                         break
                 if w.stype != s.stype: 
-                        c.log.debug("Type mismatch: %s != %s." % (w.stype, s.stype))
+                        trace("Type mismatch: %s != %s.", w.stype, s.stype)
                         matches = False
                         break
             # Everything matches - this is our op. Call it.
             if matches: 
-                c.log.debug("Matched! Call the operator.")                
+                trace("Matched! Call the operator.")
                 c.op = word
                 c.symbol = word.symbol
                 word(c)
@@ -559,7 +694,12 @@ def match_and_execute_compiled_word(c: AF_Continuation, words: List[Operation])
             c.log.error("No matches found!")
             raise Exception("No matches found!")
 
-    match_op = op_curry_match_and_execute
+    match_and_execute.words = words # type: ignore
+    return match_and_execute
+
+
+def match_and_execute_compiled_word(c: AF_Continuation, words: List[Operation]) -> Tuple[Callable[["AF_Continuation"],None], TypeSignature]:
+    match_op = op_curry_match_and_execute(words)
 
     # Now figure out what the TypeSignature properly is for this Operation.
     #
@@ -569,8 +709,8 @@ def match_and_execute_compiled_word(c: AF_Continuation, words: List[Operation])
     in_sigs = [deepcopy(op.sig.stack_in) for op in words]
     out_sigs = [deepcopy(op.sig.stack_out) for op in words]
 
-    c.log.debug("Input sigs for our matched compiled words is: %s." % in_sigs)
-    c.log.debug("Output sigs for our matched compiled words is: %s." % out_sigs)
+    trace("Input sigs for our matched compiled words is: %s.", in_sigs)
+    trace("Output sigs for our matched compiled words is: %s.", out_sigs)
 
     assert all(in_sigs[0].depth()==s.depth() for s in in_sigs), "Error - input Signatures are not of uniform length!"
     assert all(out_sigs[0].depth()==s.depth() for s in out_sigs), "Error - output Signatures are not of uniform length!"    
@@ -595,13 +735,73 @@ def match_and_execute_compiled_word(c: AF_Continuation, words: List[Operation])
         outputs.insert(0,most_general(out_sigs))
 
     sig = TypeSignature(inputs,outputs)    
-    c.log.debug("Returning matching operator with TypeSignature: %s." % (sig))
+    trace("Returning matching operator with TypeSignature: %s.", sig)
     return match_op, sig
 
 
 def op_execute_compiled_word(c: AF_Continuation) -> None:
-    c.log.debug("EXECUTE op_execute_compiled_word : '%s'." % c.symbol.s_id)
-    op_pcsave(c)
-    
-    c.execute(((word, word.symbol) for word in c.op.words))
-    op_pcreturn(c)
+    trace("EXECUTE op_execute_compiled_word : '%s'.", c.symbol.s_id)
+    if codegen.execute(c, c.op): return
+    c.call(c.op.code())
+
+
+def op_execute_pure_word(c: AF_Continuation) -> None:
+    # Generated code does its own memo lookups.
+    if codegen.execute(c, c.op): return
+    op = c.op
+    key = memo.key(op, c.stack)
+    if key is None:
+        c.call(op.code())
+        return
+    outputs = memo.lookup(key)
+    if outputs is not None:
+        for n in range(op.sig.stack_in.depth()):
+            c.stack.pop()
+        for o in outputs:
+            c.stack.push(o)
+        return
+
+    if not c.executing:
+        c.call(op.code())
+        memo.store(key, c.stack, op.sig.stack_out.depth())
+        return
+    # Save the results once the word's code returns to a one word code array after it.
+    c.call([(Operation("memo store", op_curry_memo_store(key, op.sig.stack_out.depth())), c.symbol)])
+    c.call(op.code())
+
+
+codegen.compiled += [op_execute_compiled_word, op_execute_pure_word]
+
+
+def op_curry_memo_store(key: Any, depth: int) -> Operation_def:
+    def memo_store(c: AF_Continuation) -> None:
+        memo.store(key, c.stack, depth)
+    return memo_store
+
+
+@impure
+def op_memo_stats(c: AF_Continuation) -> None:
+    print("\n%s" % memo)
+    if c.prompt:
+        print(c.prompt,end='',flush=True)
+make_word_context('memo_stats', op_memo_stats)
+
+
+@impure
+def op_memo_clear(c: AF_Continuation) -> None:
+    memo.clear()
+make_word_context('memo_clear', op_memo_clear)
+
+
+@impure
+def op_memo_size(c: AF_Continuation) -> None:
+    memo.resize(c.stack.pop().value)
+make_word_context('memo_size', op_memo_size, [TInt], [])
+
+
+@impure
+def op_codegen_stats(c: AF_Continuation) -> None:
+    print("\n%s" % codegen)
+    if c.prompt:
+        print(c.prompt,end='',flush=True)
+make_word_context('codegen_stats', op_codegen_stats)
@@ -6,17 +6,21 @@ INTRO 3 : The Continuation contains all state of the system except for the
           may be moved into the Continuation as well.)
 """
 
-from typing import Optional, Iterator, Tuple
-
-from dataclasses import dataclass
+from typing import Optional, Iterator, Tuple, Sequence, List, Union, Dict, TYPE_CHECKING, overload
+from weakref import WeakSet
 
 from stack import Stack, KStack
-from af_types import AF_Continuation, Symbol, TAny, Tuple
+from af_types import AF_Continuation, Symbol, TAny, Tuple, Type, StackObject
 from operation import Operation, op_nop
+from tracing import trace
+import tracing
 
 import logging
 import sys
 
+if TYPE_CHECKING:
+    from scheduler import Actor
+
 ROOT_LOGGING_DEFAULT = logging.WARNING # logging.DEBUG # 
 LOGGING_DEFAULT = logging.DEBUG
 
@@ -29,6 +33,95 @@ FORMAT = "[%(filename)s:%(lineno)s - %(funcName)20s() ] %(message)s"
 formatter = logging.Formatter(FORMAT)
 ch.setFormatter(formatter)
 root_log.addHandler(ch)
+tracing.sync()
+
+
+# Continuations run code arrays - indexable sequences of (Operation, Symbol)
+# pairs - with an integer instruction pointer so that positions can be saved
+# and jumped back to in constant time (see PCSave).
+Code = Sequence[Tuple[Operation, Symbol]]
+
+
+class StreamCode(Sequence[Tuple[Operation, Symbol]]):
+    """
+    Compiled words provide their code arrays directly. Input from the
+    interpreter arrives as a generator so StreamCode buffers it into an
+    array as it is read. Only positions somebody still holds on to
+    (registered with pin) are kept around. Its length is how much has
+    been read so far.
+    """
+
+    TRIM_SIZE = 1024
+
+    def __init__(self, source: Iterator[Tuple[Operation, Symbol]]) -> None:
+        self.source = source
+        self.buffer : List[Tuple[Operation, Symbol]] = []
+        self.offset : int = 0       # Index of buffer[0] in the stream.
+        self.saves : WeakSet = WeakSet()
+
+    def pin(self, saved) -> None:
+        """
+        Keeps the position held by saved (anything with an ip) readable
+        for as long as saved is alive.
+        """
+        self.saves.add(saved)
+
+    def __len__(self) -> int:
+        return self.offset + len(self.buffer)
+
+    @overload
+    def __getitem__(self, ip: int) -> Tuple[Operation, Symbol]: ...
+    @overload
+    def __getitem__(self, ip: slice) -> Sequence[Tuple[Operation, Symbol]]: ...
+
+    def __getitem__(self, ip: Union[int, slice]) -> Union[Tuple[Operation, Symbol], Sequence[Tuple[Operation, Symbol]]]:
+        if type(ip) is slice: raise TypeError("Input streams can't be sliced.")
+        pos = ip - self.offset
+        if 0 <= pos < len(self.buffer):
+            return self.buffer[pos]
+        # Not an IndexError - execute would take that for running out of code.
+        assert pos >= 0, "Position %s of the input stream has been trimmed." % ip
+        # Reading a new item means nobody is going back before ip unless they've been pinned.
+        if len(self.buffer) >= StreamCode.TRIM_SIZE:
+            keep = min([ip, self.offset + len(self.buffer)] + [saved.ip for saved in self.saves])
+            del self.buffer[:keep - self.offset]
+            self.offset = keep
+            pos = ip - self.offset
+        while pos >= len(self.buffer):
+            try:
+                self.buffer.append(next(self.source))
+            except StopIteration:
+                raise IndexError("End of input stream.")
+        return self.buffer[pos]
+
+
+# A PCSave records a return (or loop) position on the return stack as the
+# code array being executed plus the index of the next instruction in it.
+# Loops also track their counts. One is made per call so they're slotted
+# (with __weakref__ so StreamCode can pin them).
+class PCSave:
+    __slots__ = ("code", "ip", "op", "symbol", "val", "count", "__weakref__")
+
+    def __init__(self, code: Code, ip: int, op: Operation, symbol: Symbol,
+                    val: Optional[int] = None, count: Optional[int] = None) -> None:
+        self.code = code
+        self.ip = ip
+        self.op = op
+        self.symbol = symbol
+        self.val = val
+        self.count = count
+
+    def __repr__(self) -> str:
+        return "PCSave(ip=%r, op=%r, symbol=%r, val=%r, count=%r)" % (self.ip, self.op, self.symbol, self.val, self.count)
+
+TPCSave = Type("PCSave")
+
+# Reductions budget for running without preemption.
+NO_LIMIT = sys.maxsize
+
+# What a Continuation's op is before it has run anything. Shared as there
+# can be a great many Continuations (one per actor - see scheduler.py).
+NOP = Operation("nop", op_nop)
 
 
 class Continuation(AF_Continuation):
@@ -39,11 +132,17 @@ class Continuation(AF_Continuation):
                  operate on the Symbol.
     """
     def __init__(self, stack : Stack = None, rstack : Stack = None, symbol : Symbol = None):
-        self.pc : Iterator[Tuple[int,Tuple[Operation,Symbol]]]
+        self.code : Code = []
+        self.ip : int = 0
+        self.frames : int = 0       # Call frames pushed by call() that have yet to return.
+        self.executing : int = 0    # Depth of nested execute() calls.
         self.stack = stack or Stack()
         self.rstack = rstack or Stack()
         self.symbol = symbol or Symbol() 
-        self.op : Operation = Operation("nop",op_nop)
+        self.op : Operation = NOP
+        self.actor : Optional["Actor"] = None   # The Actor we run for, if any (see scheduler.py).
+        self.budget : int = NO_LIMIT        # Reductions left before execute stops (see resume).
+        self.suspended : bool = False       # Stopped with code left to run.
 
 
         """
@@ -63,25 +162,60 @@ class Continuation(AF_Continuation):
                 by which it will executed. If the stack is empty it will
                 default to the global 'Any' type word dictionary.
     """
-    def execute(self, next_word : Iterator[Tuple[Operation,Symbol]] ) -> AF_Continuation:
+    def execute(self, next_word : Union[Code, Iterator[Tuple[Operation,Symbol]]], reductions : Optional[int] = None) -> AF_Continuation:
 
         #print("ENTERING INTO EXECUTE.")
-        try:
-            self.pc = enumerate(iter(next_word))
-            while self.pc:
+        self.code = next_word if isinstance(next_word, (list, tuple)) else StreamCode(iter(next_word))
+        self.ip = 0
+        return self.resume(reductions)
+
+
+    def resume(self, reductions : Optional[int] = None) -> AF_Continuation:
+        """
+        Carries on running from where we are. Given a number of reductions
+        (instructions) the outermost execute stops once it has run that
+        many and sets suspended. Everything needed to carry on is already
+        held here (code, ip and frames on the return stack) so resuming
+        picks up from the very next instruction. That way one long running
+        word can't keep everything else waiting (see scheduler.py).
 
-                pos, (op, symbol) = next(self.pc)
+        Nested executes (run by Python that needs an answer right away)
+        can't be stopped part way so they count against the budget but
+        always finish.
+        """
+        outermost = not self.executing
+        if outermost:
+            self.budget = NO_LIMIT if reductions is None else reductions
+        # Only the outermost execute can be suspended with frames still to return from.
+        base = self.frames if not outermost else 0
+        suspended = False
+        self.executing += 1
+        try:
+            while True:
+                if self.budget <= 0 and self.executing == 1:
+                    suspended = True
+                    break
+                try:
+                    op, symbol = self.code[self.ip]
+                except IndexError:
+                    # Out of code - return from any calls made since we started.
+                    if self.frames > base:
+                        self.frames -= 1
+                        self.return_pc()
+                        continue
+                    break
+                self.ip += 1
+                self.budget -= 1
                 self.op = op
                 self.symbol = symbol
-                self.log.debug("EXECUTING WORD #%s: Op=%s, Symbol=%s." % (pos+1,self.op.name,self.symbol))
-                #print("EXECUTING WORD #%s: Op=%s, Symbol=%s." % (pos+1,self.op.name,self.symbol))
+                if tracing.enabled:
+                    self.log.debug("EXECUTING WORD #%s: Op=%s, Symbol=%s.", self.ip, self.op.name, self.symbol)
+                #print("EXECUTING WORD #%s: Op=%s, Symbol=%s." % (self.ip,self.op.name,self.symbol))
 
                 # Assume that we're an empty stack and will use the TAny op_handler.
-                type_context = TAny
-                tos = self.stack.tos()
-                if tos != KStack.Empty:
-                    # Make the tos type's op_handler our context instead.
-                    type_context = tos.stype
+                type_context = self.stack.tos_type()
+                if type_context is None:
+                    type_context = TAny
 
 
                 """
@@ -94,13 +228,70 @@ class Continuation(AF_Continuation):
                 handler = type_context.handler()
                 #return handler(self)
                 handler(self)
-        except StopIteration:
-            pass
-        self.log.debug("RETURNING FROM EXECUTE: %s" % self.op.name)
+        finally:
+            if not suspended: self.frames = base
+            self.executing -= 1
+        if outermost: self.suspended = suspended
+        trace("RETURNING FROM EXECUTE: %s", self.op.name)
         #print("RETURNING FROM EXECUTE: %s" % self.op.name)
         return self
 
 
+    def suspend(self) -> None:
+        """
+        Stops the outermost execute before the next instruction as if its
+        reductions had run out.
+        """
+        self.budget = 0
+
+
+    def save_pc(self) -> PCSave:
+        """
+        Pushes our current position onto the return stack.
+        """
+        pc = PCSave(self.code, self.ip, self.op, self.symbol)
+        if isinstance(self.code, StreamCode): self.code.pin(pc)
+        self.rstack.push(StackObject(value=pc, stype=TPCSave))
+        return pc
+
+
+    def return_pc(self) -> None:
+        """
+        Pops a position pushed by save_pc off the return stack and continues from there.
+        """
+        assert self.rstack.tos().stype == TPCSave
+        pc = self.rstack.pop().value
+        self.code, self.ip = pc.code, pc.ip
+        self.op = pc.op
+        self.symbol = pc.symbol
+
+
+    """
+    INTRO 3.5 : Calling a compiled word doesn't recurse into another execute.
+                Instead our position is pushed onto the return stack as a
+                frame and execution jumps to the start of the word's code.
+                When a code array runs out, execute pops the frame and
+                carries on from where the call was made.
+
+                A call that is the last instruction of a code array has
+                nothing to come back to so it just replaces the current
+                code (tail call elimination).
+    """
+    def call(self, code : Code) -> None:
+        if not self.executing:
+            # Called from outside the interpreter so run it to completion here.
+            self.save_pc()
+            self.execute(code)
+            self.return_pc()
+            return
+        if type(self.code) is list and self.ip >= len(self.code):
+            self.code, self.ip = code, 0
+            return
+        self.save_pc()
+        self.frames += 1
+        self.code, self.ip = code, 0
+
+
     def __str__(self) -> str:
         result = "Cont:\n\tsym=%s\n\t op=%s" % (self.symbol, self.op)
         if self.debug:
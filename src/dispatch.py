@@ -0,0 +1,245 @@
+"""
+dispatch.py - caches for resolving word names into Operations.
+
+INTRO 5.9 : Resolving a token with Type.op means searching the dictionary of
+            the type on top of the stack, then the global (Any) dictionary,
+            and checking each candidate's input signature against the stack.
+            Most of the time the same word runs over and over again against
+            the same stack shape, so the result of that search is cached
+            here keyed on the word name plus the types of however many
+            stack items could possibly change the outcome.
+
+            Words whose overloads match on stack values (rather than just
+            types) can't be keyed this way and always take the slow path.
+
+            The cache is flushed whenever the dictionary epoch changes
+            (new words, checkpoint restores) or Type.types is replaced
+            outright.
+
+            Those value matched overloads (fib : 0 -> 0 : 1 -> 1 ...) are
+            instead compiled into a DecisionTree per name so that picking
+            one doesn't mean trying each in turn.
+"""
+from typing import Dict, List, Tuple, Any, Optional, Sequence
+
+from operation import SignatureMatcher, TypeSignature, SIG_MATCH, SIG_MISMATCH, SIG_UNDERRUN
+
+
+class DispatchCache:
+
+    def __init__(self) -> None:
+        self.hits : int = 0
+        self.misses : int = 0
+        self.fallbacks : int = 0
+        self.invalidations : int = 0
+        self.epoch : Optional[int] = None
+        self.dictionary : Any = None
+        # (name, tos type name) -> number of stack items that decide the lookup or -1 if uncacheable.
+        self.depths : Dict[Tuple[str, Optional[str]], int] = {}
+        # (name, tos type name, top-N type ids) -> (Operation, found)
+        self.entries : Dict[Tuple, Tuple[Any, bool]] = {}
+
+
+    def validate(self, epoch: int, dictionary: Any) -> None:
+        """
+        Flushes everything if the dictionary has changed since we last looked.
+        """
+        if epoch != self.epoch or dictionary is not self.dictionary:
+            if self.entries or self.depths:
+                self.invalidations += 1
+            self.depths.clear()
+            self.entries.clear()
+            self.epoch = epoch
+            self.dictionary = dictionary
+
+
+    def clear(self) -> None:
+        self.depths.clear()
+        self.entries.clear()
+        self.hits = self.misses = self.fallbacks = self.invalidations = 0
+
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits" : self.hits, "misses" : self.misses, "fallbacks" : self.fallbacks,
+                "invalidations" : self.invalidations, "entries" : len(self.entries)}
+
+
+    def __str__(self) -> str:
+        return "DispatchCache(hits=%s, misses=%s, fallbacks=%s, invalidations=%s, entries=%s)" \
+            % (self.hits, self.misses, self.fallbacks, self.invalidations, len(self.entries))
+
+
+# (matcher or None to walk a composite word's stack effect, Operation)
+Entry = Tuple[Optional[SignatureMatcher], Any]
+# (matcher, ctor) - ctors always have inputs to match.
+CtorEntry = Tuple[SignatureMatcher, Any]
+
+
+class DecisionTree:
+    """
+    Finds the first of a group of overloads (in dictionary order) that will
+    run against a stack. Overloads are split on the constant value they
+    expect at the most selective stack position and then on the type they
+    expect on top of the stack. Overloads that don't care go into every
+    branch and are all that's left if nothing more specific applies.
+
+    Only valid for stacks at least `depth` deep - below that the order in
+    which overloads report underruns matters and callers search linearly.
+
+    With effects set composite words are matched by walking their words'
+    stack effects (as Operation.match_stack does) rather than by their
+    signatures, which also means they can't be split on value or type.
+    """
+
+    def __init__(self, ops: Sequence[Any], effects: bool = True) -> None:
+        entries : List[Entry] = [(None if effects and op.words else op.sig.matcher(), op) for op in ops]
+        self.size : int = len(entries)
+        self.depth : int = max([op.sig.stack_in.depth() for op in ops] + [0])
+        self.position : Optional[int] = None
+        self.buckets : Dict[Any, Tuple[Dict[str, List[Entry]], List[Entry]]] = {}
+
+        try:
+            self.position = self._most_selective(entries)
+            if self.position is not None:
+                for value in {self._value(e, self.position) for e in entries} - {None}:
+                    self.buckets[value] = self._type_switch([e for e in entries if self._value(e, self.position) in (None, value)])
+        except TypeError:
+            # Unhashable constants - just switch on type.
+            self.position = None
+            self.buckets = {}
+        self.default = self._type_switch([e for e in entries if self.position is None or self._value(e, self.position) is None])
+
+
+    @staticmethod
+    def _value(entry: Entry, position: int) -> Any:
+        matcher = entry[0]
+        if matcher is None or matcher.values is None or position >= matcher.depth:
+            return None
+        return matcher.values[position]
+
+
+    def _most_selective(self, entries: List[Entry]) -> Optional[int]:
+        # The stack position (0 is TOS) most overloads have a constant for, then with the most distinct constants.
+        best, best_score = None, (0, 0)
+        for position in range(self.depth):
+            values = [v for v in (self._value(e, position) for e in entries) if v is not None]
+            score = (len(values), len(set(values)))
+            if score > best_score:
+                best, best_score = position, score
+        return best
+
+
+    @staticmethod
+    def _type_switch(entries: List[Entry]) -> Tuple[Dict[str, List[Entry]], List[Entry]]:
+        def tos_name(entry: Entry) -> Optional[str]:
+            matcher = entry[0]
+            if matcher is None or matcher.depth == 0: return None
+            return matcher.type_names[0]
+        names = {name for name in (tos_name(e) for e in entries) if name is not None}
+        switch = {name : [e for e in entries if tos_name(e) in (None, name)] for name in names}
+        return switch, [e for e in entries if tos_name(e) is None]
+
+
+    def candidates(self, data: Sequence[Any]) -> List[Entry]:
+        switch, generic = self.default
+        if self.position is not None:
+            try:
+                switch, generic = self.buckets.get(data[-1 - self.position].value, self.default)
+            except TypeError:
+                pass # Unhashable stack values can't equal any of our constants.
+        if not data: return generic
+        return switch.get(data[-1].stype.name, generic)
+
+
+    def match(self, data: Sequence[Any]) -> Tuple[Optional[Any], int]:
+        """
+        Returns the first overload to match data (oldest first, as from
+        Stack.view) and SIG_MATCH, else (None, SIG_MISMATCH). A composite
+        word whose stack effect underruns data stops the search with
+        (op, SIG_UNDERRUN) just as a linear search would.
+        """
+        assert len(data) >= self.depth
+        for matcher, op in self.candidates(data):
+            if matcher is None:
+                result = op.stack_effect(data, 0, [])
+                if result == SIG_UNDERRUN: return op, result
+                if result >= 0: return op, SIG_MATCH
+            elif matcher.match(data) == SIG_MATCH:
+                return op, SIG_MATCH
+        return None, SIG_MISMATCH
+
+
+class CtorIndex:
+    """
+    Type.ctors arranged for Type.find_ctor. Each ctor's input signature is
+    compiled into a SignatureMatcher once and the ctors for a type are
+    bucketed by the type they expect on top of the stack, keeping their
+    registration order. When every ctor in a bucket takes a single input
+    without a value pattern the answer only depends on the type on top of
+    the stack, so it's remembered per (target type, source type).
+
+    Flushed whenever a ctor is registered or Type.ctors is replaced.
+    """
+
+    def __init__(self) -> None:
+        self.hits : int = 0
+        self.misses : int = 0
+        self.ctors : Any = None
+        # Type name -> [(matcher, ctor)] in registration order.
+        self.compiled : Dict[str, List[CtorEntry]] = {}
+        # (type name, tos type name or None if generic) -> [(matcher, ctor)]
+        self.buckets : Dict[Tuple[str, Optional[str]], List[CtorEntry]] = {}
+        # (type name, tos type name) -> ctor
+        self.resolved : Dict[Tuple[str, Optional[str]], Any] = {}
+
+
+    def validate(self, ctors: Any) -> None:
+        if ctors is not self.ctors:
+            self.clear()
+            self.ctors = ctors
+
+
+    def clear(self) -> None:
+        self.compiled.clear()
+        self.buckets.clear()
+        self.resolved.clear()
+
+
+    def bucket(self, name: str, tos_name: Optional[str]) -> List[CtorEntry]:
+        key = (name, tos_name)
+        entries = self.buckets.get(key)
+        if entries is None:
+            compiled = self.compiled.get(name)
+            if compiled is None:
+                # Ctors without inputs have never been matched by find_ctor.
+                compiled = self.compiled[name] = [(SignatureMatcher.from_sig(TypeSignature(input_sig, [])), op)
+                                                    for input_sig, op in self.ctors.get(name, []) if input_sig]
+            entries = self.buckets[key] = [e for e in compiled if tos_name is None or e[0].type_names[0] in (None, tos_name)]
+        return entries
+
+
+    def find(self, name: str, data: Sequence[Any]) -> Optional[Any]:
+        """
+        The first ctor for type name whose inputs match the top of data (oldest first).
+        """
+        if not data: return None
+        tos = data[-1].stype
+        key = (name, None if tos.is_generic() else tos.name)
+        ctor = self.resolved.get(key)
+        if ctor is not None:
+            self.hits += 1
+            return ctor
+        self.misses += 1
+
+        entries = self.bucket(*key)
+        if entries and all(matcher.depth == 1 and matcher.values is None for matcher, _ in entries):
+            ctor = self.resolved[key] = entries[0][1]
+            return ctor
+        for matcher, ctor in entries:
+            if matcher.match(data) == SIG_MATCH:
+                return ctor
+        return None
+
+
+    def __str__(self) -> str:
+        return "CtorIndex(hits=%s, misses=%s, resolved=%s)" % (self.hits, self.misses, len(self.resolved))
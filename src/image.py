@@ -0,0 +1,61 @@
+"""
+image.py - saving the dictionaries to disk and starting up again from them.
+
+An image holds Type.types and Type.ctors - every word, including those
+compiled from loaded libraries along with their code arrays and folded
+literals. Primitives are written as references to their module and name
+(as pickle always does for module level functions) and closures made by
+@rebuildable factories as the factory call that made them. Anything else
+(lambdas, other closures) makes save_image fail rather than write an
+image that can't be loaded.
+
+Loading still imports the modules the primitives live in. The image then
+replaces the dictionaries those imports registered.
+"""
+import pickle
+from types import FunctionType
+from typing import Any, BinaryIO
+
+from af_types import Type
+
+
+IMAGE_VERSION = 1
+
+
+class ImagePickler(pickle.Pickler):
+
+    def reducer_override(self, obj: Any) -> Any:
+        if type(obj) is FunctionType:
+            recipe = getattr(obj, "recipe", None)
+            if recipe is not None:
+                return recipe
+            if "<locals>" in obj.__qualname__ or obj.__name__ == "<lambda>":
+                raise pickle.PicklingError("Can't save '%s' in an image. Build it with a @rebuildable factory." % obj.__qualname__)
+        return NotImplemented
+
+
+def write_image(handle: BinaryIO) -> None:
+    ImagePickler(handle, pickle.HIGHEST_PROTOCOL).dump((IMAGE_VERSION, Type.types, Type.ctors))
+
+
+def read_image(handle: BinaryIO) -> None:
+    version, types, ctors = pickle.load(handle)
+    if version != IMAGE_VERSION:
+        raise Exception("Image version %s isn't supported (expected %s)." % (version, IMAGE_VERSION))
+    Type.types = types
+    Type.ctors = ctors
+    # Nothing in the journal applies to the new dictionaries.
+    Type.journal.clear()
+    Type.marks.clear()
+    Type.ctor_index.clear()
+    Type.dictionary_changed()
+
+
+def save_image(filename: str) -> None:
+    with open(filename, "wb") as f:
+        write_image(f)
+
+
+def load_image(filename: str) -> None:
+    with open(filename, "rb") as f:
+        read_image(f)
@@ -11,6 +11,7 @@ import logging
 from continuation import Continuation 
 from parser import Parser
 from af_types import Symbol, Location
+from tracing import trace
 
 from compiler import *
 """
@@ -52,7 +53,7 @@ def interpret(cont: AF_Continuation, input_stream: TextIO, filename: Optional[st
 
         symbol = Symbol( s_id, Location(p.filename,linenum,column) ) 
         op, found = Type.op(symbol.s_id, cont)
-        cont.log.debug("INTERPRET looking up symbol: %s, found op:%s, found=%s." % (symbol, op,found))
+        trace("INTERPRET looking up symbol: %s, found op:%s, found=%s.", symbol, op, found)
 
         yield (op, symbol)
 
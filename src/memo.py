@@ -0,0 +1,119 @@
+"""
+memo.py - caching the results of pure words.
+
+A word declared pure (`fib : Int -> Int pure ...`) promises its outputs
+depend only on its inputs. The compiler refuses to finish one that calls
+any primitive marked @impure (printing, the environment, streams) either
+directly or through the words it calls. Calls to pure words look up the
+word along with the types and values of its inputs here first. If they've
+been seen before the inputs are replaced by the saved outputs without
+running the word at all, otherwise the word runs and its outputs are
+saved on the way out.
+
+Results are shared by every call that finds them so, as with folded
+constants, words must never modify a StackObject in place. The cache is
+bounded to max_size entries, dropping the least recently used first.
+"""
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Any, Optional, Hashable
+
+from aftype import StackObject
+from operation import Operation
+from stack import Stack
+
+
+Key = Tuple[Operation, Tuple[Hashable, ...]]
+
+
+class Memo:
+
+    def __init__(self, max_size: int = 4096) -> None:
+        self.enabled : bool = True
+        self.max_size : int = max_size
+        self.entries : "OrderedDict[Key, Tuple[StackObject, ...]]" = OrderedDict()
+        self.hits : int = 0
+        self.misses : int = 0
+        self.evictions : int = 0
+        self.skipped : int = 0  # Calls with inputs that can't be used as keys (unhashable values).
+
+
+    def key(self, op: Operation, stack: Stack) -> Optional[Key]:
+        """
+        The key for calling op against the stack or None if it can't be cached.
+        """
+        if not self.enabled or self.max_size <= 0: return None
+        depth = op.sig.stack_in.depth()
+        return self.make_key(op, tuple((o.stype.id, o.value) for o in stack.contents(depth)) if depth else ())
+
+
+    def make_key(self, op: Operation, inputs: Tuple[Tuple[int, Any], ...]) -> Optional[Key]:
+        """
+        The key for calling op with inputs - (Type id, value) pairs, oldest first.
+        """
+        if not self.enabled or self.max_size <= 0: return None
+        try:
+            hash(inputs)
+        except TypeError:
+            self.skipped += 1
+            return None
+        return (op, inputs)
+
+
+    def lookup(self, key: Key) -> Optional[Tuple[StackObject, ...]]:
+        outputs = self.entries.get(key)
+        if outputs is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return outputs
+
+
+    def store(self, key: Key, stack: Stack, depth: int) -> None:
+        """
+        Saves the top depth items of the stack as the outputs for key.
+        """
+        self.save(key, tuple(stack.contents(depth)) if depth else ())
+
+
+    def save(self, key: Key, outputs: Tuple[StackObject, ...]) -> None:
+        self.entries[key] = outputs
+        self.entries.move_to_end(key)
+        self.trim()
+
+
+    def trim(self) -> None:
+        while len(self.entries) > max(self.max_size, 0):
+            self.entries.popitem(last = False)
+            self.evictions += 1
+
+
+    def resize(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.trim()
+
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+    def __str__(self) -> str:
+        return "Memo(enabled=%s, size=%s/%s, hits=%s, misses=%s, evictions=%s, skipped=%s)" % \
+            (self.enabled, len(self.entries), self.max_size, self.hits, self.misses, self.evictions, self.skipped)
+
+
+memo = Memo()
+
+
+def impure_calls(op: Operation, _seen: Optional[set] = None) -> List[Operation]:
+    """
+    Every word reachable from op (through its words and the overloads of any
+    pattern matched calls) whose implementation is marked @impure.
+    """
+    seen = _seen if _seen is not None else set()
+    seen.add(id(op))
+    found = [op] if getattr(op.the_op, "impure", False) else []
+    for word in list(op.words) + list(getattr(op.the_op, "words", [])):
+        if id(word) not in seen:
+            found += impure_calls(word, seen)
+    return found
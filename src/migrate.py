@@ -0,0 +1,98 @@
+"""
+migrate.py - actors as bytes for moving them to another process.
+
+An actor that's ready to run is all in its Continuation - the data and
+return stacks, the code array it's part way through and where it's up to
+in it - plus its mailbox. That's written with the same pickler images use
+(see image.py) except that words in the dictionaries, their code arrays
+and other actors are written as references rather than copies:
+
+    ("word", "Any", 12, "pinger")   the 12th word in Any's dictionary
+    ("code", "Any", 12, "pinger")   the code array that word runs
+    ("actor", 7)                    the Actor with pid 7
+
+Every process in a cluster defines the same words in the same order (see
+cluster.py) so these point at its own copies of them. Actors part way
+through something that can't be pickled (a memo store say) stay put.
+"""
+import io
+import pickle
+from typing import Any, Dict, Optional, Tuple
+
+from af_types import Type, StackObject
+from continuation import Continuation
+from scheduler import scheduler, Scheduler, Actor
+from image import ImagePickler
+
+
+Reference = Tuple[Any, ...]
+
+# What the dictionaries hold by id, rebuilt whenever they change.
+_references : Dict[int, Reference] = {}
+_references_epoch : Optional[int] = None
+
+
+def references() -> Dict[int, Reference]:
+    global _references, _references_epoch
+    if _references_epoch != Type.epoch:
+        _references = {}
+        for type_name, t_def in Type.types.items():
+            for index, op in enumerate(t_def.ops_list):
+                _references[id(op)] = ("word", type_name, index, op.name)
+                if op.words:
+                    _references[id(op.code())] = ("code", type_name, index, op.name)
+        _references_epoch = Type.epoch
+    return _references
+
+
+class ActorPickler(ImagePickler):
+
+    def __init__(self, handle: io.BytesIO) -> None:
+        super().__init__(handle, pickle.HIGHEST_PROTOCOL)
+        self.references = references()
+
+    def persistent_id(self, obj: Any) -> Optional[Reference]:
+        if type(obj) is Actor:
+            return ("actor", obj.pid)
+        return self.references.get(id(obj))
+
+
+class ActorUnpickler(pickle.Unpickler):
+
+    def persistent_load(self, ref: Reference) -> Any:
+        if ref[0] == "actor":
+            return scheduler.address(ref[1])
+        kind, type_name, index, name = ref
+        op = Type.types[type_name].ops_list[index]
+        if op.name != name:
+            raise pickle.UnpicklingError("Expected '%s' but found '%s' - are the dictionaries the same?" % (name, op.name))
+        return op if kind == "word" else op.code()
+
+
+def dumps(actor: Actor) -> bytes:
+    """
+    Everything needed to carry on running actor somewhere else.
+    """
+    cont = actor.cont
+    assert cont is not None, "%s isn't running here." % actor
+    handle = io.BytesIO()
+    mailbox = actor.mailbox
+    ActorPickler(handle).dump((actor.pid, list(mailbox), mailbox.capacity, mailbox.policy,
+                               cont.stack.contents(), cont.rstack.contents(),
+                               cont.code, cont.ip, cont.frames, cont.op, cont.symbol))
+    return handle.getvalue()
+
+
+def loads(data: bytes) -> Actor:
+    """
+    The Actor dumps wrote, ready for Scheduler.adopt.
+    """
+    pid, mailbox, capacity, policy, stack, rstack, code, ip, frames, op, symbol = ActorUnpickler(io.BytesIO(data)).load()
+    cont = Scheduler.continuation(code)
+    for item in stack: cont.stack.push(item)
+    for item in rstack: cont.rstack.push(item)
+    cont.ip, cont.frames, cont.op, cont.symbol = ip, frames, op, symbol
+    actor = Actor(pid, cont)
+    for message in mailbox: actor.mailbox.append(message)
+    actor.mailbox.capacity, actor.mailbox.policy = capacity, policy
+    return actor
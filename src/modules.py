@@ -0,0 +1,245 @@
+"""
+modules.py - the module system behind the `load` word.
+
+The dictionaries remember which files have been loaded into them (see
+Type.loaded) so loading one again does nothing - vocabularies shared by
+several libraries only get defined once. Rolling back to a checkpoint
+taken before a file was loaded (or replacing the dictionaries) means it
+will be loaded again.
+
+The first time a file is compiled we also note what it added to the
+dictionaries (types, words and ctors) and save that in __a4cache__/ next
+to it, named for the file and a hash of its path and contents. Later loads
+of the same unchanged file, from any process, install those definitions
+straight from the cache without parsing or compiling anything. Words that
+were already in the dictionaries when the module was compiled are saved
+as references to where they were found; if they aren't found there again
+the cache is ignored and the file compiled from source.
+
+Only modules that do nothing but define words (and load other modules)
+are cached. Anything else at the top level of a file - printing, leaving
+results on the stack - can only happen by running it.
+"""
+import hashlib
+import logging
+import os
+import pickle
+from functools import partial
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple, Set, Optional, Iterator, Any
+
+from af_types import Type, Type_name, TAtom, StackObject, AF_Continuation, make_atom
+from operation import Operation
+from af_types.af_branch import op_pcsave, op_pcreturn
+from image import ImagePickler
+from interpret import interpret
+from tracing import trace
+
+
+CACHE_DIR = "__a4cache__"
+CACHE_VERSION = 1
+
+# Set to False to always compile from source.
+use_cache : bool = True
+
+
+class StaleModule(Exception): pass
+
+
+@dataclass
+class Module:
+    types : List[Type_name]
+    ops : List[Operation]
+    ctors : List[Tuple[Type_name, List[StackObject], Operation]]
+
+
+@dataclass
+class _Frame:
+    # A module being compiled from source.
+    requires : List[str] = field(default_factory = list)
+    # What the modules it loads define.
+    nested : Set[int] = field(default_factory = set)     # ids of Operations.
+    nested_types : Set[Type_name] = field(default_factory = set)
+    pure : bool = True
+
+
+_frames : List[_Frame] = []
+
+
+def find_module(filename: str) -> Optional[str]:
+    for file in [filename, filename + '.a4', 'lib/' + filename, 'lib/' + filename + '.a4']:
+        if os.path.isfile(file):
+            return os.path.realpath(file)
+    return None
+
+
+def cache_file(path: str, source: bytes) -> str:
+    digest = hashlib.sha256(path.encode() + b"\0" + source).hexdigest()[:16]
+    return os.path.join(os.path.dirname(path), CACHE_DIR, "%s.%s.a4c" % (os.path.basename(path), digest))
+
+
+def loaded() -> List[str]:
+    """
+    Paths of the files loaded into the dictionaries we have now.
+    """
+    return [path for path, types in Type.loaded.items() if types is Type.types]
+
+
+def load_module(c: AF_Continuation, filename: str) -> bool:
+    """
+    Loads filename (as found by find_module) into the dictionaries unless
+    it's there already. Returns False if there's no such file.
+    """
+    path = find_module(filename)
+    if path is None: return False
+    if _frames: _frames[-1].requires.append(path)
+
+    if Type.loaded.get(path) is Type.types:
+        trace("Module '%s' is already loaded.", path)
+        return True
+
+    with open(path, "rb") as f:
+        source = f.read()
+    cache = cache_file(path, source)
+
+    # Marked as loaded up front so modules that load each other don't recurse forever.
+    Type.loaded[path] = Type.types
+    Type.record(partial(Type.loaded.pop, path, None))
+    try:
+        module = _read_cache(c, cache) if use_cache else None
+        if module is not None:
+            _install(module)
+        else:
+            module = _compile(c, path, cache)
+    except:
+        Type.loaded.pop(path, None)
+        raise
+    if _frames:
+        _frames[-1].nested.update(_ids(module))
+        _frames[-1].nested_types.update(module.types)
+    return True
+
+
+def _ids(module: Module) -> Set[int]:
+    return {id(op) for op in module.ops} | {id(op) for _, _, op in module.ctors}
+
+
+def _snapshot() -> Tuple[Dict[Type_name, int], Dict[Type_name, int]]:
+    return {name : len(t_def.ops_list) for name, t_def in Type.types.items()}, \
+            {name : len(ctors) for name, ctors in Type.ctors.items()}
+
+
+def _added(before: Tuple[Dict[Type_name, int], Dict[Type_name, int]]) -> Module:
+    ops, ctors = before
+    return Module(types = [name for name in Type.types if name not in ops],
+                  ops = [op for name, t_def in Type.types.items() for op in t_def.ops_list[ops.get(name, 0):]],
+                  ctors = [(name, list(input_sig), op) for name, op_map in Type.ctors.items()
+                            for input_sig, op in op_map[ctors.get(name, 0):]])
+
+
+def _watch(c: AF_Continuation, code: Iterator[Tuple[Operation, Any]], frame: _Frame) -> Iterator[Tuple[Operation, Any]]:
+    # Marks the module impure if anything at its top level isn't a word definition or a load.
+    base = c.stack.depth()
+    for op, symbol in code:
+        depth = c.stack.depth()
+        if depth == base and op.the_op is not make_atom:
+            frame.pure = False
+        elif depth == base + 1 and c.stack.tos().stype == TAtom and symbol.s_id not in (":", "load"):
+            frame.pure = False
+        yield op, symbol
+    if c.stack.depth() != base:
+        frame.pure = False
+
+
+def _compile(c: AF_Continuation, path: str, cache: str) -> Module:
+    before = _snapshot()
+    frame = _Frame()
+    _frames.append(frame)
+    try:
+        with open(path) as f:
+            op_pcsave(c)
+            c.execute(_watch(c, interpret(c, f, path), frame))
+            op_pcreturn(c)
+    finally:
+        _frames.pop()
+
+    added = _added(before)
+    module = Module(types = [name for name in added.types if name not in frame.nested_types],
+                    ops = [op for op in added.ops if id(op) not in frame.nested],
+                    ctors = [ctor for ctor in added.ctors if id(ctor[2]) not in frame.nested])
+    if frame.pure and use_cache:
+        _write_cache(cache, frame.requires, module)
+    # Our parent mustn't save what the modules we loaded defined either.
+    module.types += frame.nested_types
+    module.ops += [op for op in added.ops if id(op) in frame.nested]
+    module.ctors += [ctor for ctor in added.ctors if id(ctor[2]) in frame.nested]
+    return module
+
+
+def _install(module: Module) -> None:
+    for name in module.types:
+        Type(name)
+    for op in module.ops:
+        Type.add_op(op, op.sig.stack_in)
+    for name, input_sig, op in module.ctors:
+        Type.register_ctor(name, op, input_sig)
+
+
+class ModulePickler(ImagePickler):
+
+    def __init__(self, handle: Any, exclude: Set[int]) -> None:
+        super(ModulePickler, self).__init__(handle, pickle.HIGHEST_PROTOCOL)
+        # Operations already in the dictionaries are saved as where they're found.
+        self.known : Dict[int, Tuple[Type_name, int, str]] = {}
+        for name, t_def in Type.types.items():
+            for index, op in enumerate(t_def.ops_list):
+                if id(op) not in exclude:
+                    self.known[id(op)] = (name, index, op.name)
+
+    def persistent_id(self, obj: Any) -> Any:
+        if type(obj) is Operation:
+            return self.known.get(id(obj))
+        return None
+
+
+class ModuleUnpickler(pickle.Unpickler):
+
+    def persistent_load(self, pid: Any) -> Operation:
+        type_name, index, name = pid
+        t_def = Type.types.get(type_name)
+        if t_def is None or index >= len(t_def.ops_list) or t_def.ops_list[index].name != name:
+            raise StaleModule("'%s' isn't at %s in the %s dictionary any more." % (name, index, type_name))
+        return t_def.ops_list[index]
+
+
+def _write_cache(cache: str, requires: List[str], module: Module) -> None:
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok = True)
+        # Anything cached for older versions of this file is no use now.
+        prefix = os.path.basename(cache).rsplit(".", 2)[0] + "."
+        for old in os.listdir(os.path.dirname(cache)):
+            if old.startswith(prefix) and old.endswith(".a4c"):
+                os.remove(os.path.join(os.path.dirname(cache), old))
+        temp = "%s.%s.tmp" % (cache, os.getpid())
+        with open(temp, "wb") as f:
+            pickle.dump((CACHE_VERSION, requires), f, pickle.HIGHEST_PROTOCOL)
+            ModulePickler(f, _ids(module)).dump(module)
+        os.replace(temp, cache)
+    except (OSError, pickle.PicklingError) as ex:
+        trace("Couldn't cache module in '%s' : %s.", cache, ex)
+
+
+def _read_cache(c: AF_Continuation, cache: str) -> Optional[Module]:
+    try:
+        with open(cache, "rb") as f:
+            version, requires = pickle.load(f)
+            if version != CACHE_VERSION: return None
+            # Whatever the module loaded has to be there before its own words can refer to it.
+            for required in requires:
+                load_module(c, required)
+            return ModuleUnpickler(f).load()
+    except FileNotFoundError:
+        return None
+    except (StaleModule, OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as ex:
+        trace("Ignoring cached module '%s' : %s.", cache, ex)
+        return None
@@ -9,15 +9,110 @@ INTRO 6 : Named words which implement the behavior of ActorForth. New words
 
 import logging
 from typing import Dict, List, Tuple, Callable, Any, Optional, Sequence
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from itertools import zip_longest
+from functools import wraps
 
 from aftype import AF_Type, AF_Continuation, StackObject, Symbol
 
 from stack import Stack
+from tracing import trace
 
 class SigValueTypeMismatchException(Exception): pass
 
+
+# Results of matching an Operation against a stack. Stack effects return the
+# (non-negative) count of consumed stack items instead of SIG_MATCH.
+SIG_MATCH = 0
+SIG_MISMATCH = -1
+SIG_UNDERRUN = -2
+
+
+"""
+INTRO 6.1 : A SignatureMatcher is the compiled form of a TypeSignature used
+            to decide whether an Operation can run against a stack. Inputs
+            are held top of stack first as type names (None for generic
+            types), optional values to match and the names of any generic
+            type variables so that outputs can be specialized.
+
+            It checks a stack's live contents in place (see Stack.view)
+            and reports mismatches as results rather than raising.
+"""
+@dataclass(frozen = True)
+class SignatureMatcher:
+    depth : int
+    type_names : Tuple[Optional[str], ...]
+    values : Optional[Tuple[Any, ...]]
+    generics : Tuple[Optional[str], ...]
+    inputs : Tuple["StackObject", ...] = field(repr = False)
+    outputs : Tuple["StackObject", ...] = field(repr = False)
+
+    @staticmethod
+    def from_sig(sig: "TypeSignature") -> "SignatureMatcher":
+        inputs = tuple(reversed(sig.stack_in.contents()))
+        values = tuple(o.value for o in inputs)
+        return SignatureMatcher(depth = len(inputs),
+                                type_names = tuple(None if o.stype.is_generic() else o.stype.name for o in inputs),
+                                values = values if any(v is not None for v in values) else None,
+                                generics = tuple(o.stype.name if o.stype.is_generic() else None for o in inputs),
+                                inputs = inputs,
+                                outputs = tuple(sig.stack_out.contents()))
+
+
+    def match(self, data: Sequence["StackObject"]) -> int:
+        """
+        Checks the top of data (oldest first, as from Stack.view) against our inputs.
+        """
+        if self.depth > len(data): return SIG_UNDERRUN
+        values = self.values
+        for i, name in enumerate(self.type_names):
+            test = data[-1 - i]
+            if values is not None and values[i] is not None and values[i] != test.value:
+                return SIG_MISMATCH
+            if name is not None and name != test.stype.name:
+                return SIG_MISMATCH
+        return SIG_MATCH
+
+
+    def effect(self, base: Sequence["StackObject"], consumed: int, pushed: List["StackObject"]) -> int:
+        """
+        Applies our stack effect to a virtual stack made of the first
+        len(base) - consumed items of base with pushed on top. base is never
+        modified; pushed is updated in place. Returns the new consumed count
+        or SIG_MISMATCH/SIG_UNDERRUN.
+        """
+        pushed_depth = len(pushed)
+        base_depth = len(base) - consumed
+        if self.depth > pushed_depth + base_depth: return SIG_UNDERRUN
+
+        values = self.values
+        bindings : Dict[str, "StackObject"] = {}
+        for i in range(self.depth):
+            test = pushed[pushed_depth - 1 - i] if i < pushed_depth else base[base_depth - 1 - (i - pushed_depth)]
+            if values is not None and values[i] is not None and values[i] != test.value:
+                return SIG_MISMATCH
+            name = self.type_names[i]
+            if name is not None and name != test.stype.name:
+                return SIG_MISMATCH
+            # Upgrade Generic types if present.
+            generic = self.generics[i]
+            if generic is not None:
+                bindings[generic] = test
+            if test.stype.is_generic():
+                bindings[test.stype.name] = self.inputs[i]
+
+        if self.depth <= pushed_depth:
+            del pushed[pushed_depth - self.depth:]
+        else:
+            consumed += self.depth - pushed_depth
+            pushed.clear()
+
+        # Tack on the output stack effect, specializing any generics.
+        for o in self.outputs:
+            pushed.append(bindings.get(o.stype.name, o))
+        return consumed
+
+
 class TypeSignature:
 
     def __init__(self, in_seq: Sequence["StackObject"] = None, out_seq: Sequence["StackObject"] = None ):
@@ -26,6 +121,20 @@ class TypeSignature:
 
         self.stack_in : Stack = Stack(in_seq)
         self.stack_out : Stack = Stack(out_seq)
+        self._matcher : Optional[SignatureMatcher] = None
+        self._matcher_key : Tuple[int, int] = (-1, -1)
+        # Declared pure - outputs depend only on inputs so results can be cached (see memo.py).
+        self.pure : bool = False
+
+
+    # Signatures are built up in place while compiling so the matcher gets
+    # rebuilt whenever either stack has been pushed or popped since.
+    def matcher(self) -> SignatureMatcher:
+        key = (self.stack_in.total_operations(), self.stack_out.total_operations())
+        if self._matcher is None or key != self._matcher_key:
+            self._matcher = SignatureMatcher.from_sig(self)
+            self._matcher_key = key
+        return self._matcher
 
 
     # Produces a mapped type sequence that accounts for "Any" types.
@@ -39,8 +148,8 @@ class TypeSignature:
         m_s  : StackObject
         for in_s, m_s in zip(self.stack_in.contents()[::-1],sig[::-1]):
             # Upgrade Generic types to whatever they're being paired with.
-            logging.debug("in_s type is '%s' : %s." % (type(in_s), in_s) )
-            logging.debug("m_s type is '%s' : %s." % (type(m_s),m_s) )
+            trace("in_s type is '%s' : %s.", type(in_s), in_s)
+            trace("m_s type is '%s' : %s.", type(m_s), m_s)
 
             match_type : AF_Type = m_s.stype
             if match_type.is_generic():
@@ -58,13 +167,13 @@ class TypeSignature:
 
     # Used by the runtime interpreter to check for mathing types for words.
     def match_in(self, stack: Stack) -> bool:
-        logging.debug("match_in in_s=%s, matching against stack=%s" % (self.stack_in, stack))
+        trace("match_in in_s=%s, matching against stack=%s", self.stack_in, stack)
         try:
             result = self.map_from_input_sig(stack.contents())
-            logging.debug("match_in returns True.")
+            trace("match_in returns True.")
             return True
         except AssertionError:
-            logging.debug("match_in returns False.")
+            trace("match_in returns False.")
             return False
 
 
@@ -132,6 +241,31 @@ class TypeSignature:
 Op_name = str
 Operation_def = Callable[["AF_Continuation"],None]
 
+
+def rebuildable(factory: Callable[..., Operation_def]) -> Callable[..., Operation_def]:
+    """
+    For module level functions that build Operation_defs as closures
+    (constants, curried patterns and so on). Whatever they build remembers
+    the call that made it as its recipe so it can be saved in a dictionary
+    image (see image.py) as that call rather than as a closure.
+    """
+    @wraps(factory)
+    def build(*args: Any) -> Operation_def:
+        op = factory(*args)
+        op.recipe = (build, args) # type: ignore
+        return op
+    return build
+
+
+def impure(op: Operation_def) -> Operation_def:
+    """
+    Marks a primitive that does more than turn its inputs into its outputs
+    (printing, reading, changing the environment) so that pure words can't
+    call it (see memo.py).
+    """
+    op.impure = True # type: ignore
+    return op
+
 class Operation:
 
     def __init__(self, name: Op_name, op: Operation_def, words: List["Operation"] = None, sig: TypeSignature = None, symbol: Symbol = None) -> None:
@@ -140,12 +274,29 @@ class Operation:
         self.words : List["Operation"] = words or []
         self.sig : TypeSignature = sig or TypeSignature([],[])
         self.symbol : Symbol = symbol or Symbol()
+        self._code : List[Tuple["Operation", Symbol]] = []  # Built from words by code().
+        self.folds : int = 0 # Literals folded into constants when compiled.
 
     def add_word(self, op: "Operation") -> bool:
         # Should check for valid stack type signature.
         self.words.append(op)
+        self.words_changed()
         return True
 
+    def words_changed(self) -> None:
+        """
+        Called whenever words is changed so code() rebuilds its code array.
+        """
+        self._code = []
+
+    def code(self) -> List[Tuple["Operation", Symbol]]:
+        """
+        Returns the code array for a composite word as executed by Continuation.execute.
+        """
+        if not self._code:
+            self._code = [(word, word.symbol) for word in self.words]
+        return self._code
+
     def __call__(self, cont: "AF_Continuation") -> None:
         self.the_op(cont)
 
@@ -172,96 +323,78 @@ class Operation:
     def short_name(self) -> str:
         return self.name
 
+    def has_value_patterns(self, _seen: Optional[set] = None) -> bool:
+        """
+        True if matching this Operation against a stack depends on the values
+        there rather than just their types. Composite words are checked
+        through their implementation words too.
+        """
+        if any(o.value is not None for o in self.sig.stack_in.contents()):
+            return True
+        seen = _seen if _seen is not None else set()
+        seen.add(id(self))
+        return any(w.has_value_patterns(seen) for w in self.words if id(w) not in seen)
+
+    def stack_effect(self, base: Sequence["StackObject"], consumed: int, pushed: List["StackObject"], force_composite : bool = False,
+                        _active: Optional[set] = None) -> int:
+        """
+        Walks our stack effect over a virtual stack - see SignatureMatcher.effect.
+        Composite words apply each of their words in turn. Recursive calls
+        just apply our signature.
+        """
+        if self.sig.stack_in.depth() > len(base) - consumed + len(pushed):
+            return SIG_UNDERRUN
+
+        active = _active if _active is not None else set()
+        if (len(self.words) == 0 and not force_composite) or id(self) in active:
+            return self.sig.matcher().effect(base, consumed, pushed)
+
+        active.add(id(self))
+        for word in self.words:
+            consumed = word.stack_effect(base, consumed, pushed, _active = active)
+            if consumed < 0: break
+        active.discard(id(self))
+        return consumed
+
+    def match_stack(self, stack: Stack) -> int:
+        """
+        Returns SIG_MATCH if this Operation can run against the stack as it stands.
+        """
+        data = stack.view()
+        if len(self.words) == 0:
+            return self.sig.matcher().match(data)
+        result = self.stack_effect(data, 0, [])
+        return result if result < 0 else SIG_MATCH
+
     def check_stack_effect(self, context : Optional[ Stack ] = None, force_composite : bool = False) -> Tuple[ Stack, bool ]:
         """
         force_composite is used for compiling new composite words that may not yet have a word 
         in their word list so would otherwise appear as primitive words and return the final 
         stack effect rather than the starting one which is appropriate when compiling.
         """
-        logging.debug("op: %s with context = %s." % (self, context) )
-        start_stack : Stack
-        match_stack : Stack
+        trace("op: %s with context = %s.", self, context)
 
-        # The start_stack is what we're trying to match with.
+        # The start stack is what we're trying to match with.
         if context is None:
-            start_stack = self.sig.stack_in.copy()
-            logging.debug("Use our default input stack signature instead: %s." % start_stack)
+            base = self.sig.stack_in.view()
+            trace("Use our default input stack signature instead: %s.", self.sig.stack_in)
         else: 
-            start_stack = context.copy()
+            base = context.view()
 
-        # We're matching the start_stack against our input stack.
-        match_stack = self.sig.stack_in.copy()
-        matches : bool = True
+        pushed : List[StackObject] = []
+        consumed = self.stack_effect(base, 0, pushed, force_composite)
 
-        if len(self.sig.stack_in) > len(start_stack):
-            logging.error("Input stack underrun! Match target len=%s:%s > match candidate len%s:%s" % (len(self.sig.stack_in), self.sig.stack_in, len(start_stack), start_stack) )
+        if consumed == SIG_UNDERRUN:
+            logging.error("Input stack underrun! Match target len=%s:%s > match candidate len%s" % (len(self.sig.stack_in), self.sig.stack_in, len(base)) )
             raise Exception("Stack Underrun!")
-
-        generic_map : Dict["AF_Type", "StackObject"] = {}
-
-        if len(self.words) == 0 and not force_composite:
-            logging.debug("This is a primitive operation. Just consume, adjust for stack effect.")
-            for i in range(len(match_stack)):
-                match = match_stack.pop()
-                test = start_stack.pop()
-                logging.debug("Testing match:%s against test:%s." % (match, test))
-
-                # Fixup any Generic mappings.
-                o : StackObject 
-                for o in [match, test]:
-                    if o.stype.is_generic() and generic_map.get(o.stype):
-                        o = generic_map[o.stype]
-
-                # Upgrade Generic types if present.
-                for (m,t) in [(match, test), (test,match)]:
-                    if m.stype.is_generic():
-                        logging.debug("Upgrading %s to test: %s." % (m,t))
-                        generic_map[m.stype] = t
-                        m = t
-
-                # Check against value if match has a value!
-                if match.value is not None:
-                    matches = (match.value == test.value)
-                if not matches: 
-                    msg = "match.value(%s) != test.value(%s)!" % (match.value, test.value)
-                    logging.debug(msg)
-                    raise SigValueTypeMismatchException("Value mis-match! %s" % msg)
-
-                # Check if the types match.
-                matches = (match.stype == test.stype)
-                if not matches: 
-                    msg = "match.stype(%s) != test.stype(%s)!" % (match.stype, test.stype)                
-                    logging.debug(msg)
-                    raise SigValueTypeMismatchException("Type mis-match! %s" % msg)
-            
-            # Tack on the output stack effect that we're claiming. 
-                      
-            for o in self.sig.stack_out.contents():
-                # See if we have a generic we need to specialize.
-                # NOTE - we may need to loop over this until .get returns nothing
-                #        in case there's more than one level of mapping. 
-                #        If so beware of infinite loops!
-                if generic_map.get(o.stype):
-                    logging.debug("Specializing %s to %s." % (o,generic_map[o.stype]))
-                    o = generic_map[o.stype]
-                logging.debug("adding output:%s" % o)
-                start_stack.push(o)
-
-            logging.debug("Returning following stack effect for primitive word: %s, matches = %s." % (start_stack, matches))
-            return start_stack, matches
-
-        # We're composite word so walk through the stack effect for each one.
-        logging.debug("Composite word so walking through implementation.")
-        last_word : Operation
-        for word in self.words:
-            if not matches:
-                logging.error("This probably isn't possible. Broke match on word: %s." % last_word)
-                raise Exception("Stack mis-match for composite word!")
-            last_word = word
-            start_stack, matches = word.check_stack_effect(start_stack)
-
-        logging.debug("Returning output stack: %s with matches = %s." % (start_stack, matches))
-        return start_stack, matches
+        if consumed == SIG_MISMATCH:
+            msg = "Stack %s doesn't match %s." % (list(base), self)
+            trace(msg)
+            raise SigValueTypeMismatchException("Type or value mis-match! %s" % msg)
+
+        result = Stack(list(base[:len(base) - consumed]) + pushed)
+        trace("Returning output stack: %s with matches = %s.", result, True)
+        return result, True
 
 
 Op_list = List[Operation]
@@ -0,0 +1,169 @@
+"""
+optimizer.py - peephole optimization of compiled words.
+
+Once a word has been compiled its Operation.words is a flat list of calls,
+each of which costs a full trip around Continuation.execute. Type modules
+register Fusions here for sequences that commonly appear together (like
+`dup +` or `swap drop`) along with a single superinstruction that does
+the same job. When a word finishes compiling its code is scanned and each
+sequence is replaced by its superinstruction - but only if walking the
+original words over the fusion's declared input types produces exactly
+the fusion's declared output types.
+
+Patterns are matched on implementations (Operation.the_op) rather than
+names so that an overload of `+` for some other type won't be mistaken for
+Int's. The CONSTANT placeholder matches any literal folded into a constant
+by the compiler; the fusion's build function is handed the matched words so
+it can pick up those values.
+"""
+import logging
+from typing import Dict, List, Tuple, Callable, Any, Optional, Sequence, Union
+from dataclasses import dataclass
+from weakref import WeakKeyDictionary
+
+from aftype import AF_Type, StackObject
+from operation import Operation, Operation_def, TypeSignature, SIG_MATCH
+from tracing import trace
+
+
+# Pattern placeholder for a word that pushes a constant (see compiler.fold_literal).
+CONSTANT = "CONSTANT"
+
+
+def constant_of(op: Operation) -> Optional[StackObject]:
+    """
+    The StackObject pushed by a folded constant or None for any other word.
+    """
+    if op.words: return None
+    return getattr(op.the_op, "constant", None)
+
+
+@dataclass
+class Fusion:
+    name : str
+    pattern : Tuple[Union[Operation_def, str], ...]
+    build : Callable[[List[Operation]], Operation_def]
+    sig : TypeSignature
+
+    def matches(self, words: Sequence[Operation]) -> bool:
+        if len(words) < len(self.pattern): return False
+        for expected, word in zip(self.pattern, words):
+            if word.words: return False
+            if expected is CONSTANT:
+                if constant_of(word) is None: return False
+            elif word.the_op is not expected:
+                return False
+        return True
+
+    def verify(self, words: Sequence[Operation]) -> bool:
+        """
+        True if words have the same stack effect as our signature.
+        """
+        base = self.sig.stack_in.contents()
+        pushed : List[StackObject] = []
+        consumed = 0
+        for word in words:
+            consumed = word.stack_effect(base, consumed, pushed)
+            if consumed < SIG_MATCH: return False
+        result = list(base[:len(base)-consumed]) + pushed
+        expected = self.sig.stack_out.contents()
+        return len(result) == len(expected) \
+                and all(a.stype.name == b.stype.name for a, b in zip(result, expected))
+
+
+class Optimizer:
+
+    def __init__(self) -> None:
+        self.enabled : bool = True
+        # First implementation in the pattern -> candidate fusions, longest first.
+        self.fusions : Dict[Any, List[Fusion]] = {}
+        self.rewrites : int = 0
+        self.rejected : int = 0
+        # Operation -> its words before optimization, for dump().
+        self.originals : "WeakKeyDictionary[Operation, List[Operation]]" = WeakKeyDictionary()
+
+
+    def register(self, name: str, pattern: Sequence[Union[Operation_def, str]], build: Callable[[List[Operation]], Operation_def],
+                    in_seq: Sequence[AF_Type] = [], out_seq: Sequence[AF_Type] = []) -> Fusion:
+        sig = TypeSignature([StackObject(stype=x) for x in in_seq], [StackObject(stype=x) for x in out_seq])
+        fusion = Fusion(name, tuple(pattern), build, sig)
+        candidates = self.fusions.setdefault(fusion.pattern[0], [])
+        candidates.append(fusion)
+        candidates.sort(key = lambda f: len(f.pattern), reverse = True)
+        return fusion
+
+
+    def candidates(self, word: Operation) -> List[Fusion]:
+        if constant_of(word) is not None:
+            return self.fusions.get(CONSTANT, [])
+        return self.fusions.get(word.the_op, [])
+
+
+    def optimize(self, op: Operation) -> int:
+        """
+        Rewrites op.words in place. Returns the number of fusions applied.
+        """
+        if not self.enabled or not op.words: return 0
+
+        before = list(op.words)
+        result : List[Operation] = []
+        count = 0
+        pos = 0
+        while pos < len(before):
+            word = before[pos]
+            for fusion in self.candidates(word):
+                seq = before[pos:pos + len(fusion.pattern)]
+                if not fusion.matches(seq): continue
+                if not fusion.verify(seq):
+                    trace("Fusion '%s' rejected for %s in '%s'.", fusion.name, seq, op.name)
+                    self.rejected += 1
+                    continue
+                name = " ".join(w.name for w in seq)
+                result.append(Operation(name, fusion.build(seq), sig=fusion.sig, symbol=word.symbol))
+                pos += len(seq)
+                count += 1
+                break
+            else:
+                result.append(word)
+                pos += 1
+
+        if count:
+            op.words[:] = result
+            op.words_changed()
+            self.originals[op] = before
+            self.rewrites += count
+        return count
+
+
+    def dump(self, op: Operation) -> str:
+        """
+        Lists a word's code before and after optimization side by side.
+        """
+        before = [w.name for w in self.originals.get(op, op.words)]
+        after = [w.name for w in op.words]
+        width = max([len("before")] + [len(n) for n in before])
+        lines = ["%-*s | %s" % (width, "before", "after")]
+        for n in range(max(len(before), len(after))):
+            lines.append("%-*s | %s" % (width, before[n] if n < len(before) else "",
+                                        after[n] if n < len(after) else ""))
+        return "\n".join(lines)
+
+
+    def __str__(self) -> str:
+        return "Optimizer(enabled=%s, fusions=%s, rewrites=%s, rejected=%s)" % \
+            (self.enabled, sum(len(f) for f in self.fusions.values()), self.rewrites, self.rejected)
+
+
+optimizer = Optimizer()
+
+
+def register_fusion(name: str, pattern: Sequence[Union[Operation_def, str]], build: Callable[[List[Operation]], Operation_def],
+                    in_seq: Sequence[AF_Type] = [], out_seq: Sequence[AF_Type] = []) -> Fusion:
+    return optimizer.register(name, pattern, build, in_seq, out_seq)
+
+
+def fused(op_def: Operation_def) -> Callable[[List[Operation]], Operation_def]:
+    """
+    Build function for superinstructions that don't depend on the words they replace.
+    """
+    return lambda words: op_def
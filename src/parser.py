@@ -2,14 +2,55 @@
 #   parser.py   -   Parser for our language.
 #
 
+import io
+import mmap
+import os
+import re
+import sys
 from typing import List, TextIO, Optional, Iterator, Tuple
 from io import StringIO
 
 
 from af_types import Type 
 
+"""
+Lines containing strings are scanned by _PLAIN_SCAN which yields every
+token as well as the line feeds and tabs needed to track positions.
+Strings and comments are consumed as whole runs via the remaining patterns.
+"""
+_PLAIN_SCAN = re.compile(r'([^ \t\n.:;"#]+|[.:;][^ \t\n.:;"#]*)|(\n)|(\t)|(["#])')
+_REGULAR_RUN = re.compile(r'[^ \t\n.:;"#]+')
+_COMMENT_RUN = re.compile(r'[^\n]*')
+_QUOTED_RUN = re.compile(r'[^"#]+')
+
+
+def _expand_tabs(line: str) -> str:
+    """
+    Replaces tabs with the spaces needed to keep every other character
+    at the same column our tokenizer would count for it.
+    """
+    # Tabs are assumed to occur on every 4th character
+    # for purposes of column counting.
+    code = line.lstrip('\t')
+    if '\t' not in code:
+        # Only leading tabs which always advance four columns apiece
+        # beyond the first one which lands on column 4.
+        return ' ' * (4 * (len(line) - len(code)) - 1) + code
+
+    parts = line.split('\t')
+    result = parts[0]
+    for part in parts[1:]:
+        column = len(result) + 2
+        column += 4 - (column % 4)
+        result += ' ' * (column - 1 - len(result)) + part
+    return result
+
+
 class Parser:
 
+    # Characters requested per read() for handles we can't map into memory.
+    BLOCK_SIZE = 64 * 1024
+
     def __init__(self, filename: str = None) -> None:
         self.file_handle : Optional[TextIO] = None
         self.reset()
@@ -38,10 +79,230 @@ class Parser:
         assert self.file_handle
         return self
 
+    def _mapped_text(self) -> Optional[str]:
+        """
+        Returns the entire remaining content of a real, regular file via mmap
+        or None if our handle isn't one (or has already been partially read).
+        """
+        handle = self.file_handle
+        assert handle
+        try:
+            if handle is sys.stdin or handle.isatty() or handle.tell() != 0:
+                return None
+            fileno = handle.fileno()
+            if os.fstat(fileno).st_size == 0:
+                return None
+            with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as data:
+                text = str(data, getattr(handle, 'encoding', None) or 'utf-8',
+                            getattr(handle, 'errors', None) or 'strict')
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            return None
+
+        # Leave the handle where a full read() would have.
+        handle.seek(0, os.SEEK_END)
+
+        # Files are opened with universal newlines so honor that here too.
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+    def _blocks(self) -> Iterator[str]:
+        """
+        Generator yielding the input stream in large blocks of text. Every
+        block ends with a line feed (or the end of the stream) so tokens 
+        outside of strings never span two blocks.
+
+        Interactive streams are read a line at a time instead so we never
+        block waiting on input that isn't needed yet, nor consume input 
+        meant for whichever Parser reads that stream next.
+        """
+        handle = self.file_handle
+        assert handle
+
+        text = self._mapped_text()
+        if text is not None:
+            yield text
+            return
+
+        try:
+            interactive = handle is sys.stdin or handle.isatty() or not handle.seekable()
+        except (AttributeError, ValueError):
+            interactive = True
+
+        if interactive:
+            while block := handle.readline():
+                yield block
+        else:
+            while block := handle.read(self.BLOCK_SIZE):
+                if not block.endswith('\n'):
+                    block += handle.readline()
+                yield block
+
     def tokens(self) -> Iterator[Tuple[str, int, int]]:
         """
         Generator yielding tuples of 
           (token : str, linenum : int, token_column : int)
+
+        Produces exactly the same tokens as char_tokens() but works through 
+        whole lines at a time. Lines of plain code (and comments) are simply 
+        split on their white space. Lines with strings, or those continuing a
+        string, fall back to scanning with compiled regular expressions.
+
+        Columns on those lines are tracked via 'origin', the offset into the
+        line where column zero would be, so that column = position - origin.
+        """
+        assert self.file_handle
+
+        token = ""
+        token_column = 0
+        linenum = 1
+        column = 1  # Column of the first character of the next line.
+        quotes = False
+        comment = False
+
+        plain_scan = _PLAIN_SCAN.finditer
+        regular_run = _REGULAR_RUN.match
+        comment_run = _COMMENT_RUN.match
+        quoted_run = _QUOTED_RUN.match
+
+        for block in self._blocks():
+            lines = block.split('\n')
+            last = len(lines) - 1
+            for count, text in enumerate(lines):
+                line_feed = count < last
+                if not line_feed and not text:
+                    break
+
+                if not (quotes or comment or '"' in text):
+                    # Plain code. Tokens end at white space or punctuation
+                    # and punctuation doesn't need whitespace!
+                    text, hash, remark = text.partition('#')
+                    if '\t' in text:
+                        text = _expand_tabs(text)
+                    position = 1
+                    for word in text.split(' '):
+                        if word:
+                            if '.' in word or ':' in word or ';' in word:
+                                start = 0
+                                for offset in range(1, len(word)):
+                                    if word[offset] in '.:;':
+                                        yield (word[start:offset], linenum, position + start)
+                                        start = offset
+                                yield (word[start:], linenum, position + start)
+                            else:
+                                yield (word, linenum, position)
+                        position += len(word) + 1
+                    if hash:
+                        # Comment Token ended via line feed. Send it.
+                        yield (hash + remark, linenum, len(text) + 1)
+                    if line_feed:
+                        linenum += 1
+                    column = 1
+                    continue
+
+                if line_feed:
+                    text += '\n'
+                pos = 0
+                end = len(text)
+                origin = -column
+                while pos < end:
+
+                    # Handle comments
+                    if comment:
+                        match = comment_run(text, pos)
+                        assert match is not None    # Comments can be empty.
+                        token += match.group()
+                        pos = match.end()
+                        if pos < end:
+                            # Comment Token ended via line feed. Send it.
+                            yield (token, linenum, token_column)
+                            linenum += 1
+                            origin = pos
+                            pos += 1
+                            token = ""
+                            token_column = 1
+                            comment = False
+                        continue
+
+                    # Handle quotes
+                    if quotes:
+                        char = text[pos]
+                        if char == '"':
+                            # Ending a string.
+                            token += char
+                            yield (token, linenum, token_column)
+                            token = ""
+                            token_column = pos - origin
+                            quotes = False
+                            pos += 1
+                            # Regular characters immediately following a string
+                            # form a token that shares the closing quote's column.
+                            match = regular_run(text, pos)
+                            if match:
+                                yield (match.group(), linenum, token_column)
+                                pos = match.end()
+                        elif char == '#':
+                            # Comments even begin within strings.
+                            if token:
+                                yield (token, linenum, token_column)
+                            token = char
+                            token_column = pos - origin
+                            comment = True
+                            pos += 1
+                        else:
+                            # While quotes are on we'll take every char there is.
+                            # Line feeds within strings restart the column at zero.
+                            match = quoted_run(text, pos)
+                            assert match is not None    # There's at least this char.
+                            token += match.group()
+                            pos = match.end()
+                            if text[pos - 1] == '\n':
+                                linenum += 1
+                                origin = pos
+                        continue
+
+                    for match in plain_scan(text, pos):
+                        kind = match.lastindex
+                        if kind == 1:
+                            yield (match.group(), linenum, match.start() - origin)
+                        elif kind == 2:
+                            linenum += 1
+                            origin = match.start() # The column resets to 1.
+                        elif kind == 3:
+                            # Tabs are assumed to occur on every 4th character
+                            # for purposes of column counting.
+                            column = match.start() - origin + 1
+                            column += 4 - (column % 4)
+                            origin = match.end() - column
+                        else:
+                            break
+                    else:
+                        pos = end
+                        continue
+
+                    # Beginning a string or comment - which is always a new token.
+                    pos = match.start()
+                    token = text[pos]
+                    token_column = pos - origin
+                    if token == '#':
+                        comment = True
+                    else:
+                        quotes = True
+                    pos += 1
+
+                column = end - origin
+
+        # Handle any incremental token that may be left over.
+        if token:
+            yield (token, linenum, token_column)
+
+    def char_tokens(self) -> Iterator[Tuple[str, int, int]]:
+        """
+        Generator yielding tuples of 
+          (token : str, linenum : int, token_column : int)
+
+        The original character at a time tokenizer. tokens() supersedes it
+        but it remains as the reference behavior for tests and benchmarks.
         """
         assert self.file_handle
 
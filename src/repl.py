@@ -12,6 +12,7 @@ from io import StringIO
 
 from continuation import Continuation, Stack
 from interpret import interpret
+from image import load_image
 
 #from af_types.af_any import print_words
 #from af_types.af_debug import op_debug, op_on, op_off
@@ -28,19 +29,35 @@ from af_types.af_see import *
 from af_types.af_branch import *
 from af_types.af_environment import *
 from af_types.af_stream import *
+from af_types.af_actor import *
 from compiler import *
 
 def print_continuation_stats(cont : Continuation):
     print("")
     print(cont)
+    print("Stack telemetry = %s" % cont.stack.telemetry)
     print("Stack max_depth = %s" % cont.stack.max_depth())
     print("Stack depth_history = %s" % cont.stack.depth_history())
     print("Stack total operations = %s" % cont.stack.total_operations())
+    print("Dispatch cache = %s" % Type.dispatch_cache)
 
 """
 INTRO 1.2 : Input always comes from a file whether that's the default
             stdin or a filename passed to the system.
 """
+def setup_image() -> None:
+    # Restarts from the dictionaries saved with save_image if given --image <filename>.
+    if "--image" in sys.argv:
+        pos = sys.argv.index("--image")
+        if pos + 1 >= len(sys.argv):
+            print("Usage: %s [--image <filename>] [<filename>]" % sys.argv[0])
+            sys.exit(2)
+        image = sys.argv[pos + 1]
+        del sys.argv[pos:pos + 2]
+        load_image(image)
+        print("Loaded image: '%s'." % image)
+
+
 def setup_stream_for_interpreter(force_stdio: bool = False) -> Tuple[str, TextIO]:
     handle = sys.stdin
     filename = sys.stdin.name
@@ -153,6 +170,7 @@ def do_repl(filename: str, handle: TextIO):
         return None
 
 if __name__ == "__main__":
+    setup_image()
     filename, handle = setup_stream_for_interpreter()
     do_repl(filename, handle)
 
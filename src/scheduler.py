@@ -0,0 +1,429 @@
+"""
+scheduler.py - lots of actors taking turns on a single thread.
+
+Each Actor is a Continuation of its own (so its own data and return
+stacks) along with a mailbox of the StackObjects sent to it. The Scheduler
+keeps a queue of the actors that are ready to run and gives each in turn a
+slice of Scheduler.SLICE reductions (instructions - see Continuation.resume)
+before moving on to the next so no actor can keep the others from running.
+
+An actor that tries to `receive` from an empty mailbox (or one with
+nothing `receive_match` is looking for) isn't scheduled again until
+something is sent to it. One that sends to a full mailbox that blocks
+isn't scheduled again until there's room. One that runs out of code is
+finished and anything sent to it afterwards is dropped. Continuations
+that aren't actors (like the one the REPL runs) can send messages too and,
+when they `receive`, run the scheduler until a reply turns up.
+
+Spread over several processes (see cluster.py) each has a Scheduler of
+its own with a transport to carry messages between them. Every pid says
+which of them the actor started in (pid % nodes) so actors elsewhere are
+just an Actor with the pid and no Continuation. Actors that are ready to
+run can also be moved (see migrate.py) to another process that has
+nothing to do, with the transport forwarding their messages on to them.
+
+The words for all this are in af_types/af_actor.py.
+"""
+from collections import deque, OrderedDict
+from typing import Deque, Dict, Optional, Callable, Any, Iterator, TYPE_CHECKING
+from weakref import WeakValueDictionary
+
+from aftype import StackObject
+from stack import Stack, TELEMETRY_OFF
+from continuation import Continuation, Code
+
+if TYPE_CHECKING:
+    from cluster import Transport
+
+
+# What happens to messages sent to a full Mailbox.
+BLOCK = "block"                 # The sender waits until there's room.
+DROP_OLDEST = "drop_oldest"     # The oldest message is thrown away to make room.
+FAIL = "fail"                   # The send raises an exception.
+POLICIES = (BLOCK, DROP_OLDEST, FAIL)
+
+
+class Mailbox:
+    """
+    Messages sent to an actor in the order they arrived. receive takes the
+    oldest and receive_match the oldest of a Type (or of a Type and value).
+
+    Looking for a particular message by going through all of them would
+    mean going through the same unwanted messages on every receive. So
+    the first time a Type is asked for we make an index of the sequence
+    numbers of its messages, and the first time a value of a Type is
+    asked for an index per value of all its messages, and keep them up to
+    date as more arrive. The front of each index is where the last look
+    left off and indexes for values are dropped once they're empty.
+    Messages taken some other way are skipped when they get to the front
+    and indexes made mostly of those are rebuilt.
+
+    Only senders in the same process can be held back (BLOCK) or refused
+    (FAIL) when a bounded mailbox is full. Messages from other processes
+    are always delivered, their senders are only held back once too many
+    are waiting to go to this process (see cluster.py).
+    """
+    # One per actor, so only made bigger once receive_match is used.
+    __slots__ = ("messages", "types", "values", "seq", "capacity", "policy", "senders")
+
+    def __init__(self, capacity: Optional[int] = None, policy: str = BLOCK) -> None:
+        self.messages : "OrderedDict[int, StackObject]" = OrderedDict()
+        self.types : Optional[Dict[str, Deque[int]]] = None               # Type name -> seqs.
+        self.values : Optional[Dict[str, Dict[Any, Deque[int]]]] = None   # Type name -> value -> seqs.
+        self.seq : int = 0
+        self.capacity = capacity
+        self.policy = policy
+        self.senders : Deque["Actor"] = deque()                           # Blocked until there's room.
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __iter__(self) -> Iterator[StackObject]:
+        return iter(self.messages.values())
+
+    def full(self) -> bool:
+        return self.capacity is not None and len(self.messages) >= self.capacity
+
+    def stale(self, size: int) -> bool:
+        # Too big to be mostly messages we still have.
+        return size > 2 * len(self.messages) + 16
+
+    def append(self, message: StackObject) -> None:
+        self.seq += 1
+        seq = self.seq
+        self.messages[seq] = message
+        name = message.stype.name
+        if self.types is not None:
+            index = self.types.get(name)
+            if index is not None:
+                index.append(seq)
+                if self.stale(len(index)):
+                    self.types[name] = deque(s for s in index if s in self.messages)
+        if self.values is not None:
+            values = self.values.get(name)
+            if values is not None:
+                try:
+                    index = values.get(message.value)
+                except TypeError:
+                    return      # Unhashable values can't be looked for.
+                if index is None:
+                    values[message.value] = deque((seq,))
+                    if self.stale(len(values)):
+                        self.values[name] = self.by_value(name)
+                else:
+                    index.append(seq)
+                    if self.stale(len(index)):
+                        values[message.value] = deque(s for s in index if s in self.messages)
+
+    def by_value(self, name: str) -> Dict[Any, Deque[int]]:
+        values : Dict[Any, Deque[int]] = {}
+        for seq, message in self.messages.items():
+            if message.stype.name == name:
+                try:
+                    index = values.get(message.value)
+                except TypeError:
+                    continue
+                if index is None:
+                    values[message.value] = deque((seq,))
+                else:
+                    index.append(seq)
+        return values
+
+    def first(self, index: Deque[int]) -> Optional[StackObject]:
+        messages = self.messages
+        while index:
+            message : Optional[StackObject] = messages.pop(index.popleft(), None)
+            if message is not None: return message
+        return None
+
+    def popleft(self) -> StackObject:
+        return self.messages.popitem(last = False)[1]
+
+    def take(self, name: str, value: Any = None) -> Optional[StackObject]:
+        """
+        The oldest message of Type name (equal to value unless that's None) if there is one.
+        """
+        if value is None:
+            if self.types is None: self.types = {}
+            index = self.types.get(name)
+            if index is None:
+                index = self.types[name] = deque(seq for seq, message in self.messages.items() if message.stype.name == name)
+            return self.first(index)
+
+        if self.values is None: self.values = {}
+        values = self.values.get(name)
+        if values is None:
+            values = self.values[name] = self.by_value(name)
+        try:
+            index = values.get(value)
+        except TypeError:
+            # Unhashable so never indexed.
+            for seq, message in self.messages.items():
+                if message.stype.name == name and message.value == value:
+                    return self.messages.pop(seq)
+            return None
+        if index is None: return None
+        found = self.first(index)
+        if not index: del values[value]
+        return found
+
+    def clear(self) -> None:
+        self.messages.clear()
+        self.types = None
+        self.values = None
+
+
+class Actor:
+    # There can be tens of thousands of these.
+    __slots__ = ("pid", "cont", "mailbox", "waiting", "scheduled", "__weakref__")
+
+    def __init__(self, pid: int, cont: Optional[Continuation], scheduled: bool = True) -> None:
+        self.pid = pid
+        self.cont = cont                # None for actors in other processes.
+        self.mailbox = Mailbox()
+        self.waiting : bool = False     # Blocked in receive (or send) until a message (or room) arrives.
+        self.scheduled = scheduled      # False for Continuations run by somebody else (like the REPL).
+        if cont is not None: cont.actor = self
+
+    # Actors are passed around by reference (dup copies values).
+    def __copy__(self) -> "Actor":
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "Actor":
+        return self
+
+    def __repr__(self) -> str:
+        return "Actor(%s)" % self.pid
+
+
+class Scheduler:
+
+    SLICE = 100
+
+    def __init__(self, slice: int = SLICE) -> None:
+        assert slice > 0, "Actors given no reductions would never get anywhere."
+        self.slice : int = slice
+        self.actors : Dict[int, Actor] = {}     # Every actor still alive by pid.
+        self.ready : Deque[Actor] = deque()
+        self.running : Optional[Actor] = None
+        self.next_pid : int = 1
+        self.spawned : int = 0
+        self.finished : int = 0
+        self.sent : int = 0
+        self.dropped : int = 0          # Sent to actors that had already finished or thrown away for room.
+        self.blocked : int = 0          # Sends held back by full mailboxes.
+        self.switches : int = 0
+        self.node : int = 0
+        self.nodes : int = 1
+        self.transport : Optional["Transport"] = None   # Carries messages to other processes (see cluster.py).
+        self.elsewhere : "WeakValueDictionary[int, Actor]" = WeakValueDictionary()
+
+
+    def configure(self, node: int, nodes: int, transport: Optional["Transport"] = None) -> None:
+        """
+        Makes us node of nodes (processes) with transport carrying messages
+        to actors in the others. Pids we hand out from now on are all
+        node modulo nodes.
+        """
+        assert not self.actors, "Actors already started here would have the wrong pids."
+        self.node, self.nodes, self.transport = node, nodes, transport
+        self.next_pid = (self.next_pid // nodes + 1) * nodes + node
+
+
+    def address(self, pid: int) -> Actor:
+        """
+        The Actor with pid, wherever it lives.
+        """
+        actor = self.actors.get(pid)
+        if actor is None:
+            actor = self.elsewhere.get(pid)
+            if actor is None:
+                actor = self.elsewhere[pid] = Actor(pid, None, scheduled = False)
+        return actor
+
+
+    def actor(self, cont: Continuation) -> Actor:
+        """
+        The Actor cont runs for, making one up if it isn't an actor yet
+        (or was forgotten by clear).
+        """
+        actor = cont.actor
+        if actor is None or (not actor.scheduled and actor.pid not in self.actors):
+            actor = self.add(Actor(self.next_pid, cont, scheduled = False))
+        return actor
+
+
+    def add(self, actor: Actor) -> Actor:
+        self.actors[actor.pid] = actor
+        self.next_pid = max(self.next_pid, actor.pid + self.nodes)
+        if actor.scheduled: self.ready.append(actor)
+        return actor
+
+
+    @staticmethod
+    def continuation(code: Code = []) -> Continuation:
+        # Stack telemetry would cost more than the rest of a small actor.
+        cont = Continuation(Stack(telemetry = TELEMETRY_OFF), Stack(telemetry = TELEMETRY_OFF))
+        cont.prompt = ""
+        cont.code = code
+        return cont
+
+
+    def spawn(self, code: Code) -> Actor:
+        """
+        Starts a new actor running code on empty stacks.
+        """
+        self.spawned += 1
+        return self.add(Actor(self.next_pid, self.continuation(code)))
+
+
+    def adopt(self, actor: Actor) -> Actor:
+        """
+        Takes on an actor that has moved here from another process.
+        """
+        self.actors[actor.pid] = actor
+        self.elsewhere.pop(actor.pid, None)
+        if actor.scheduled and not actor.waiting: self.ready.append(actor)
+        return actor
+
+
+    def release(self, actor: Actor) -> None:
+        """
+        Forgets an actor that has moved to another process. Anything still
+        holding on to it now holds its address there.
+        """
+        assert actor is not self.running and actor.cont is not None
+        del self.actors[actor.pid]
+        actor.cont.actor = None
+        actor.cont = None
+        actor.mailbox.clear()
+        self.elsewhere[actor.pid] = actor
+        self.make_room(actor)
+
+
+    def send(self, actor: Actor, message: StackObject) -> None:
+        self.sent += 1
+        if actor.cont is None and self.transport is not None:
+            # It may have moved here since we were given its address.
+            local = self.actors.get(actor.pid)
+            if local is None:
+                self.transport.send(actor, message)
+                return
+            actor = local
+        self.deliver(actor, message)
+
+
+    def deliver(self, actor: Actor, message: StackObject) -> None:
+        """
+        Puts a message for one of our actors in its mailbox.
+        """
+        if actor.pid not in self.actors:
+            self.dropped += 1
+            return
+        mailbox = actor.mailbox
+        if mailbox.policy == DROP_OLDEST and mailbox.full():
+            mailbox.popleft()
+            self.dropped += 1
+        mailbox.append(message)
+        if actor.waiting:
+            actor.waiting = False
+            if actor.scheduled: self.ready.append(actor)
+
+
+    def wait(self, actor: Actor) -> None:
+        """
+        Called when the running actor finds its mailbox empty. The receive
+        is tried again once a message has been sent.
+        """
+        assert actor is self.running and actor.cont is not None
+        actor.waiting = True
+        actor.cont.suspend()
+
+
+    def block(self, sender: Actor, actor: Actor) -> None:
+        """
+        Called when the running actor finds actor's mailbox full. The send
+        is tried again once something has been taken out of it.
+        """
+        assert sender is self.running and sender.cont is not None
+        actor.mailbox.senders.append(sender)
+        sender.waiting = True
+        sender.cont.suspend()
+        self.blocked += 1
+
+
+    def make_room(self, actor: Actor) -> None:
+        """
+        Called when messages have been taken out of actor's mailbox.
+        """
+        senders = actor.mailbox.senders
+        while senders and not actor.mailbox.full():
+            sender = senders.popleft()
+            # It may have been woken (or finished) already.
+            if sender.waiting and sender.pid in self.actors:
+                sender.waiting = False
+                self.ready.append(sender)
+                # Its send takes the room.
+                return
+
+
+    def exit(self, actor: Actor) -> None:
+        if self.actors.pop(actor.pid, None) is not None:
+            self.finished += 1
+            # Anything left (or still to be sent) goes nowhere.
+            actor.mailbox.clear()
+            while actor.mailbox.senders: self.make_room(actor)
+
+
+    def run(self, until: Optional[Callable[[], bool]] = None) -> None:
+        """
+        Runs ready actors, a slice at a time, until none are left or until() is True.
+        With other processes about, waiting on until() also means waiting
+        for their messages when there's nothing to run.
+        """
+        assert self.running is None, "The scheduler is already running."
+        ready = self.ready
+        transport = self.transport
+        while not (until is not None and until()):
+            if transport is not None:
+                transport.poll()
+            if not ready:
+                if transport is None or until is None: break
+                transport.wait()
+                continue
+            actor = ready.popleft()
+            cont = actor.cont
+            assert cont is not None
+            self.running = actor
+            self.switches += 1
+            try:
+                cont.resume(self.slice)
+                if not cont.suspended:
+                    self.exit(actor)
+                elif not actor.waiting:
+                    ready.append(actor)
+            except Exception:
+                # Whoever is running the scheduler gets the exception and the actor is gone.
+                self.exit(actor)
+                raise
+            finally:
+                self.running = None
+
+
+    def clear(self) -> None:
+        """
+        Forgets every actor (whether finished or not).
+        """
+        assert self.running is None, "The scheduler is running."
+        self.actors.clear()
+        self.ready.clear()
+        self.elsewhere.clear()
+
+
+    def __str__(self) -> str:
+        return "Scheduler(actors=%s, ready=%s, spawned=%s, finished=%s, sent=%s, dropped=%s, blocked=%s, switches=%s)" % \
+            (len(self.actors), len(self.ready), self.spawned, self.finished, self.sent, self.dropped, self.blocked,
+             self.switches)
+
+
+scheduler = Scheduler()
@@ -3,8 +3,23 @@
 
     But we're also interested in how deep our stack gets over its lifetime and, more
     specifically over the last 'n' operations (set in Stack.DEPTH_HISTORY).
+
+    Recording that costs more than the push or pop itself so it's selectable
+    through Stack.TELEMETRY (for the whole process) or per Stack:
+
+        off     - only the depth (push & pop counts) is tracked.
+        sampled - the depth is recorded every Stack.SAMPLE_RATE operations.
+        full    - the depth is recorded after every operation.
+
+    Recorded depths go into a ring buffer of the last DEPTH_HISTORY
+    entries along with a histogram of every depth recorded.
 """
-from typing import Sequence, Any
+from typing import Sequence, Any, List, Tuple, Optional, Union
+from array import array
+
+TELEMETRY_OFF = "off"
+TELEMETRY_SAMPLED = "sampled"
+TELEMETRY_FULL = "full"
 
 class KStack:
 
@@ -77,6 +92,11 @@ class KStack:
 class Stack(KStack):
 
     DEPTH_HISTORY = 1000
+    TELEMETRY = TELEMETRY_FULL
+    SAMPLE_RATE = 16
+
+    # True for stacks that keep their values in columns (see column_stack.py).
+    columnar = False
 
     def __str__(self):
         result = "\nstack:\n"
@@ -91,52 +111,87 @@ class Stack(KStack):
     def __repr__(self):
         return self.__str__()
 
-    def __init__(self, in_seq: Sequence[Any] = None):
-        self.reset()
+    def __init__(self, in_seq: Sequence[Any] = None, telemetry: str = None):
+        self.set_telemetry(telemetry or Stack.TELEMETRY)
         super(Stack, self).__init__()
         if in_seq is not None:
             for n in in_seq:
                 self.push(n)
 
+    def set_telemetry(self, mode: str, sample_rate: int = None) -> None:
+        """
+        Switches telemetry mode (see above) and clears the history.
+        """
+        assert mode in (TELEMETRY_OFF, TELEMETRY_SAMPLED, TELEMETRY_FULL), "Unknown telemetry mode '%s'." % mode
+        self.telemetry = mode
+        self._sample_rate = sample_rate or Stack.SAMPLE_RATE
+        # Plain functions rather than bound methods so Stacks don't reference themselves.
+        self._record = { TELEMETRY_OFF : None,
+                         TELEMETRY_SAMPLED : Stack._sample_depth_history,
+                         TELEMETRY_FULL : Stack._update_depth_history }[mode]
+        self.reset()
+
     def reset(self):
-        self._depth_history_count = {0:1}
-        self._depth_history = []
+        # Depth 0 is where every stack starts. The ring buffer is filled in
+        # place once it reaches DEPTH_HISTORY entries.
+        self._depth_history_count : List[int] = [1] if self._record else []
+        self._depth_history = array('l')
+        self._history_next = 0
+        self._until_sample = self._sample_rate
         self._push_count = 0
         self._pop_count = 0
         self._max_depth = 0
 
     def _update_depth_history(self):
-        stack_depth = self.depth()
+        stack_depth = self._push_count - self._pop_count
         if stack_depth > self._max_depth: self._max_depth = stack_depth
-        assert stack_depth >= 0, "Error - somehow we got more pops(%s) than pushes(%s)!" % (self._push_count, self._pop_count)
-        self._depth_history_count[stack_depth] = self._depth_history_count.get(stack_depth,0) + 1
-        self._depth_history.append(stack_depth)
-        if len(self._depth_history) > Stack.DEPTH_HISTORY:
-            self._depth_history.pop(0)
+        counts = self._depth_history_count
+        if stack_depth < len(counts):
+            counts[stack_depth] += 1
+        else:
+            counts.extend([0] * (stack_depth - len(counts)) + [1])
+        history = self._depth_history
+        if len(history) < Stack.DEPTH_HISTORY:
+            history.append(stack_depth)
+        else:
+            history[self._history_next] = stack_depth
+            self._history_next = (self._history_next + 1) % len(history)
+
+    def _sample_depth_history(self):
+        self._until_sample -= 1
+        if self._until_sample <= 0:
+            self._until_sample = self._sample_rate
+            self._update_depth_history()
 
-    def history_depth_count(self, depth = None):
+    def history_depth_count(self, depth = None) -> Union[int, List[Tuple[int, int]]]:
+        """
+        Number of times depth was recorded or, with no depth, a list of
+        (depth, count) for every depth recorded. Empty if telemetry is off.
+        """
+        counts = self._depth_history_count
         if depth is not None:
-            return self._depth_history_count.get(depth,0)
-        return [(k,self._depth_history_count.get(k,0)) for k in self._depth_history_count.keys()]
+            return counts[depth] if 0 <= depth < len(counts) else 0
+        return [(k, n) for k, n in enumerate(counts) if n]
 
-    def depth_history(self, count_limit = None):
+    def depth_history(self, count_limit = None) -> List[int]:
         """
-        Return the depth history of the stack.
+        Return the depth history of the stack, oldest first. At most the
+        last count_limit (or Stack.DEPTH_HISTORY) recorded depths.
         """
-        if count_limit is None:
+        if count_limit is None or count_limit > Stack.DEPTH_HISTORY:
             count_limit = Stack.DEPTH_HISTORY
-        else:
-            if count_limit > Stack.DEPTH_HISTORY:
-                count_limit = Stack.DEPTH_HISTORY
-        count_limit = count_limit * -1 # So we can return in reverse (most recent) order.
-        return [x for x in self._depth_history[count_limit::]]
+        history = self._depth_history
+        ordered = history[self._history_next:] + history[:self._history_next]
+        if count_limit <= 0: return []
+        return ordered[-count_limit:].tolist()
 
-    def max_depth(self, history_limit = None):
+    def max_depth(self, history_limit = None) -> Optional[int]:
         """
-        Returns the deepest depth of our stack over it's known history
-        up to 'history_limit' (if specified) or 'Stack.DEPTH_HISTORY'
-        operations whichever is smaller.
+        Returns the deepest depth of our stack over it's known history.
+        When sampled that's the deepest sample seen and when telemetry is
+        off there's no history so None.
         """
+        if self._record is None: return None
         return self._max_depth
 
     def depth(self):
@@ -172,6 +227,15 @@ class Stack(KStack):
                 return self._stack._data[last*-1:]                                    
         return []
 
+    def view(self) -> Sequence[Any]:
+        """
+        Returns the live contents of the stack (oldest first) without copying.
+        Callers must treat the result as read only.
+        """
+        if isinstance(self._stack, KStack.NonEmpty):
+            return self._stack._data
+        return ()
+
     def __len__(self):
         return self.depth()
 
@@ -180,7 +244,7 @@ class Stack(KStack):
         Adds item to top of stack and updates the stack_history.
         """
         self._push_count += 1
-        self._update_depth_history()
+        if self._record is not None: self._record(self)
 
         return super(Stack,self).push(item)
 
@@ -192,7 +256,7 @@ class Stack(KStack):
         result = super(Stack,self).pop()
         if result is not KStack.Empty:
             self._pop_count += 1
-            self._update_depth_history()
+            if self._record is not None: self._record(self)
 
         return result
 
@@ -203,13 +267,29 @@ class Stack(KStack):
         """
         return super(Stack,self).tos()
 
+    def tos_type(self):
+        """
+        For stacks of StackObjects, the Type on top of stack or None if empty.
+        """
+        tos = self.tos()
+        return None if tos is KStack.Empty else tos.stype
+
+    def types(self, last: int):
+        """
+        For stacks of StackObjects, the Types of the last 'n' items.
+        """
+        return [o.stype for o in self.contents(last)] if last > 0 else []
+
     def copy(self):
-        result = Stack()
+        result = Stack(telemetry = self.telemetry)
         result._stack = self._stack.copy()
-        result._depth_history_count = self._depth_history_count
-        result._depth_history = self._depth_history
+        result._sample_rate = self._sample_rate
+        result._depth_history_count = self._depth_history_count.copy()
+        result._depth_history = array('l', self._depth_history)
+        result._history_next = self._history_next
         result._push_count = self._push_count
         result._pop_count = self._pop_count
+        result._max_depth = self._max_depth
 
         return result
 
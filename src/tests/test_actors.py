@@ -0,0 +1,178 @@
+import unittest
+import io
+from copy import deepcopy
+
+from continuation import Continuation, Stack
+from interpret import *
+
+from af_types import Type, StackObject
+from af_types.af_int import TInt
+from af_types.af_bool import TBool
+from af_types.af_actor import TActor
+from scheduler import scheduler, Scheduler, Mailbox
+
+
+class TestActors(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.save_types = deepcopy(Type.types)
+        self.save_ctors = deepcopy(Type.ctors)
+        self.words = """
+                ponger : -> ;
+                    receive int receive actor 2dup send
+                    self swap send drop ponger.
+
+                volley : Int Actor ->
+                    : 0 Actor ->
+                    : Int Actor -> ;
+                        swap 1 int - swap 2dup send self swap send drop.
+
+                pinger : -> ;
+                    receive int receive actor volley pinger.
+
+                counter : Int Actor ->
+                    : 0 Actor ->
+                    : Int Actor -> ;
+                        2dup send swap 1 int - swap counter.
+
+                count : -> ; receive int receive actor counter.
+                """
+
+    def tearDown(self) -> None:
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+        scheduler.clear()
+        scheduler.slice = Scheduler.SLICE
+
+    def run_code(self, code: str, cont: Continuation = None) -> List[Any]:
+        cont = cont or Continuation(Stack())
+        cont.prompt = ""
+        cont.execute(interpret(cont, io.StringIO(code)))
+        return [(o.stype.name, o.value) for o in cont.stack.contents()]
+
+    def test_ping_pong(self) -> None:
+        sent = scheduler.sent
+        result = self.run_code(self.words + """
+                "pinger" spawn 100 int swap 2dup send swap drop
+                "ponger" spawn swap send
+                run_actors
+                """)
+        assert result == []
+        # Two to start then a count and a reply address each way per volley.
+        assert scheduler.sent - sent == 2 + 100 * 4
+        # Both are left waiting for more.
+        assert len(scheduler.actors) == 2 and not scheduler.ready
+        assert all(actor.waiting for actor in scheduler.actors.values())
+
+    def test_receive_outside_an_actor(self) -> None:
+        cont = Continuation(Stack())
+        self.run_code(self.words, cont)
+        # Replies come back to us once the scheduler has run the ponger.
+        assert self.run_code("""
+                "ponger" spawn 21 int swap 2dup send swap drop
+                self swap send
+                receive int receive actor
+                """, cont)[0] == ("Int", 21)
+        # Along with the ponger, now waiting for more.
+        ponger = cont.stack.tos().value
+        assert ponger is not cont.actor and ponger.waiting
+
+        # Nobody left to reply.
+        with self.assertRaises(Exception):
+            self.run_code("receive", cont)
+
+    def test_actors_take_turns(self) -> None:
+        scheduler.slice = 10
+        cont = Continuation(Stack())
+        self.run_code(self.words, cont)
+        result = self.run_code("""
+                "count" spawn 20 int swap 2dup send swap drop self swap send
+                "count" spawn 20 int swap 2dup send swap drop self swap send
+                """ + "receive int " * 40, cont)
+        assert [v for t, v in result] != sorted([v for t, v in result], reverse = True)
+        assert sorted(v for t, v in result) == sorted(list(range(1, 21)) * 2)
+        # Both counters ran to completion.
+        assert len(scheduler.actors) == 1
+        assert scheduler.finished >= 2
+
+    def test_spawn_unknown_word(self) -> None:
+        with self.assertRaises(Exception):
+            self.run_code('"nobody_home" spawn')
+        assert not scheduler.actors
+
+    def test_actor_stats_is_impure(self) -> None:
+        with self.assertRaises(Exception):
+            self.run_code("noisy : Int -> Int pure; actor_stats 1 int +.")
+
+    def test_receive_match(self) -> None:
+        cont = Continuation(Stack())
+        self.run_code(self.words, cont)
+        me = scheduler.actor(cont)
+        for message in [StackObject(value=1, stype=TInt), StackObject(value=True, stype=TBool),
+                        StackObject(value=2, stype=TInt), StackObject(value=3, stype=TInt)]:
+            scheduler.send(me, message)
+        assert self.run_code("Bool receive_match 3 int receive_match", cont) == [("Bool", True), ("Int", 3)]
+        # The rest are still there in the order they arrived.
+        assert self.run_code("receive receive", cont)[-2:] == [("Int", 1), ("Int", 2)]
+        assert not me.mailbox
+
+        # Actors wait until something matching turns up.
+        result = self.run_code("""
+                picky : -> ; receive actor 7 int receive_match swap send.
+                "picky" spawn self swap 2dup send swap drop
+                1 int swap 2dup send swap drop
+                7 int swap 2dup send swap drop
+                drop receive int
+                """, Continuation(Stack()))
+        assert result == [("Int", 7)]
+
+        # Nobody left to send one.
+        with self.assertRaises(Exception):
+            self.run_code("Bool receive_match", cont)
+
+    def test_mailbox_indexes(self) -> None:
+        mailbox = Mailbox()
+        for n in range(10000):
+            mailbox.append(StackObject(value=n, stype=TInt))
+        mailbox.append(StackObject(value=True, stype=TBool))
+        for n in range(10000, 0, -1):
+            assert mailbox.take("Int", n - 1).value == n - 1
+            assert mailbox.take("Int", -n) is None
+        # Drained indexes for values are dropped.
+        assert not mailbox.values["Int"]
+        assert mailbox.take("Bool").value is True and not mailbox
+
+        # As are ones left behind by messages taken some other way.
+        for n in range(10000):
+            mailbox.append(StackObject(value=n, stype=TInt))
+            mailbox.append(StackObject(value=n, stype=TInt))
+            mailbox.popleft()
+            mailbox.popleft()
+        assert len(mailbox.values["Int"]) <= 16
+
+    def test_mailbox_policies(self) -> None:
+        cont = Continuation(Stack())
+        self.run_code(self.words, cont)
+        me = scheduler.actor(cont)
+
+        self.run_code('2 int "drop_oldest" mailbox', cont)
+        self.run_code("1 int self send 2 int self send 3 int self send", cont)
+        assert [m.value for m in me.mailbox] == [2, 3]
+        self.run_code("receive receive", cont)
+
+        self.run_code('1 int "fail" mailbox 1 int self send', cont)
+        with self.assertRaises(Exception):
+            self.run_code("2 int self send", cont)
+        self.run_code("receive", cont)
+
+        # A counter can only get ahead of us by two before it has to wait.
+        self.run_code('2 int "block" mailbox', cont)
+        blocked = scheduler.blocked
+        result = self.run_code('"count" spawn 20 int swap 2dup send swap drop self swap send' +
+                               " receive int" * 20, cont)
+        assert [v for t, v in result[-20:]] == list(range(20, 0, -1))
+        assert scheduler.blocked > blocked
+        assert len(me.mailbox) == 0
+
+        with self.assertRaises(Exception):
+            self.run_code('2 int "wait_forever" mailbox', cont)
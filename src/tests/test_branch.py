@@ -12,6 +12,10 @@ from af_types.af_bool import *
 from af_types.af_any import *
 from af_types.af_branch import *
 
+import io
+from continuation import StreamCode
+from interpret import interpret
+
 TTest = Type("Test")
 TParm1 = Type("Parm1")
 TAny = Type("Any")
@@ -92,3 +96,43 @@ class TestGenericReturnStackOps(unittest.TestCase):
     	op_mov_to_rstack(self.c)
     	assert self.c.rstack.tos().value == "test"
     	assert self.c.stack.depth() == 0
+
+    def test_countdown_loop(self) -> None:
+        self.c.execute(interpret(self.c, io.StringIO("0 int 5 countdown lcount + loop")))
+        assert self.c.stack.tos().value == 15
+        assert self.c.rstack.depth() == 0
+
+        self.c.execute(interpret(self.c, io.StringIO("sum : Int Int -> Int; countdown lcount + loop.\n 4 int sum")))
+        assert self.c.stack.tos().value == 25
+        assert self.c.rstack.depth() == 0
+
+    def test_pcsave_holds_index(self) -> None:
+        self.c.code = [(Operation("nop", op_nop), self.c.symbol)] * 3
+        self.c.ip = 2
+        op_pcsave(self.c)
+        saved = self.c.rstack.tos().value
+        assert saved.code is self.c.code and saved.ip == 2
+        self.c.code, self.c.ip = [], 0
+        op_pcreturn(self.c)
+        assert self.c.ip == 2 and len(self.c.code) == 3
+        assert self.c.rstack.depth() == 0
+
+    def test_stream_code_keeps_pinned_positions(self) -> None:
+        StreamCode.TRIM_SIZE, size = 4, StreamCode.TRIM_SIZE
+        try:
+            code = StreamCode(iter(range(100)))
+            assert code[3] == 3
+            saved = PCSave(code, 3, None, None)
+            code.pin(saved)
+            assert code[50] == 50
+            assert code[3] == 3
+            del saved
+            assert code[60] == 60
+            assert code[70] == 70
+            assert code.offset == 61 and len(code.buffer) == 10
+            with self.assertRaises(AssertionError):
+                code[3]
+            with self.assertRaises(IndexError):
+                code[100]
+        finally:
+            StreamCode.TRIM_SIZE = size
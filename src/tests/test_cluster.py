@@ -0,0 +1,207 @@
+import unittest
+import io
+from copy import deepcopy
+
+from continuation import Continuation, Stack
+from interpret import *
+
+from af_types import Type, TAtom
+from af_types.af_int import TInt
+from af_types.af_bool import TBool
+from af_types.af_actor import TActor, spawn_word
+from scheduler import scheduler, Scheduler, Actor
+from cluster import Cluster, Ring, Transport, COUNTERS, PENDING, layout
+import wire
+import migrate
+
+
+class TestCluster(unittest.TestCase):
+
+    words = """
+            ponger : -> ;
+                receive int receive actor 2dup send
+                self swap send drop ponger.
+
+            volley : Int Actor ->
+                : 0 Actor ->
+                : Int Actor -> ;
+                    swap 1 int - swap 2dup send self swap send drop.
+
+            pinger : -> ;
+                receive int receive actor volley pinger.
+
+            burn : Int ->
+                : 0 ->
+                : Int -> ; 1 int - burn.
+
+            job : -> ;
+                receive actor 500 int burn self swap send
+                receive int receive actor send.
+
+            fan : Actor Int ->
+                : Actor 0 ->
+                : Actor Int -> ; swap "job" spawn 2dup send drop swap 1 int - fan.
+
+            starter : -> ; receive actor receive int fan.
+            """
+
+    def setUp(self) -> None:
+        self.save_types = deepcopy(Type.types)
+        self.save_ctors = deepcopy(Type.ctors)
+
+    def tearDown(self) -> None:
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+        scheduler.clear()
+        scheduler.slice = Scheduler.SLICE
+
+    def test_wire_round_trip(self) -> None:
+        actor = scheduler.address(12345)
+        for stype, value in [(TInt, -42), (TBool, True), (TAtom, "héllo"), (TActor, actor)]:
+            pid, message = wire.decode(wire.encode(7, StackObject(value=value, stype=stype)))
+            assert pid == 7 and message.stype == stype and message.value == value
+        with self.assertRaises(Exception):
+            wire.encode(7, StackObject(value=None, stype=Type("NotSendable")))
+
+    def test_ring_wraps(self) -> None:
+        buf = memoryview(bytearray(COUNTERS + 64))
+        ring = Ring(buf, 0, 64)
+        sent, received = [], []
+        for n in range(40):
+            message = bytes([n]) * (n % 13 + 1)
+            if not ring.put(message):
+                received += ring.get_all()
+                assert ring.put(message)
+            sent.append(message)
+        received += ring.get_all()
+        assert received == sent
+        assert ring.get_all() == []
+        ring.close()
+
+    def test_ring_always_makes_room(self) -> None:
+        buf = memoryview(bytearray(COUNTERS + 100))
+        ring = Ring(buf, 0, 100)
+        assert ring.put(b"x" * 20) and ring.put(b"x" * 40)
+        # Too big for the end but there's room at the start once the others are read.
+        assert not ring.put(b"y" * ring.largest)
+        assert ring.get_all() == [b"x" * 20, b"x" * 40]
+        assert ring.put(b"y" * ring.largest)
+        assert ring.get_all() == [b"y" * ring.largest]
+        with self.assertRaises(AssertionError):
+            ring.put(b"z" * (ring.largest + 1))
+        ring.close()
+
+        buf = memoryview(bytearray(layout(2, 256)))
+        transport = Transport(0, 2, buf, 256)
+        with self.assertRaises(ValueError):
+            transport.put(1, bytes(200))
+        assert not transport.pending[1]
+        transport.close()
+
+    def test_senders_wait_for_pending(self) -> None:
+        # Nobody reads what we send to node 1 until we say so.
+        buf = memoryview(bytearray(layout(2, 256)))
+        transport = Transport(0, 2, buf, 256)
+        other = Transport(1, 2, buf, 256, sched = Scheduler())
+        scheduler.configure(0, 2, transport)
+        try:
+            cont = Continuation(Stack())
+            cont.prompt = ""
+            cont.execute(interpret(cont, io.StringIO("""
+                    flood : Int Actor ->
+                        : 0 Actor ->
+                        : Int Actor -> ; 2dup send swap 1 int - swap flood.
+                    flooder : -> ; receive int receive actor flood.
+                    """)))
+            flooder = spawn_word("flooder")
+            scheduler.send(flooder, StackObject(value=3000, stype=TInt))
+            scheduler.send(flooder, StackObject(value=scheduler.address(1), stype=TActor))
+            blocked = scheduler.blocked
+            received = most = 0
+            while True:
+                received += len(other.inbound[0].get_all())
+                transport.poll()
+                if not scheduler.ready and not any(transport.pending): break
+                scheduler.run(until = lambda: not scheduler.ready)
+                most = max(most, len(transport.pending[1]))
+            received += len(other.inbound[0].get_all())
+            assert received == 3000 and not scheduler.actors
+            assert most == PENDING and scheduler.blocked > blocked
+        finally:
+            scheduler.clear()
+            scheduler.transport = None
+            scheduler.configure(0, 1)
+            transport.close()
+            other.close()
+
+    def test_ping_pong_across_processes(self) -> None:
+        with Cluster(2, self.words) as cluster:
+            pinger = cluster.spawn("pinger")
+            ponger = cluster.spawn("ponger")
+            assert pinger.pid % 3 == 0 and ponger.pid % 3 == 1
+            cluster.send(pinger, StackObject(value=50, stype=TInt))
+            cluster.send(pinger, StackObject(value=ponger, stype=TActor))
+            assert cluster.wait_idle()
+            workers = cluster.stats()[:2]
+            # Two to start then a count and a reply address each way per volley.
+            assert sum(s["messages"] for s in workers) == 50 * 4
+            assert workers[0]["received"] == 2 + 50 * 2
+
+            # We can take part too.
+            cont = Continuation(Stack())
+            cont.prompt = ""
+            cont.stack.push(StackObject(value=ponger, stype=TActor))
+            cont.execute(interpret(cont, io.StringIO("21 int swap 2dup send swap drop self swap send receive int")))
+            assert cont.stack.tos().value == 21
+        assert scheduler.transport is None and scheduler.nodes == 1
+
+    def test_migrate_round_trip(self) -> None:
+        cont = Continuation(Stack())
+        cont.prompt = ""
+        cont.execute(interpret(cont, io.StringIO("""
+                step : Int Actor -> Int Actor ; 2dup send swap 1 int - swap.
+                counter : Int Actor ->
+                    : 0 Actor ->
+                    : Int Actor -> ; step counter.
+                count : -> ; receive int receive actor counter.
+                "count" spawn 20 int swap 2dup send swap drop self swap send
+                """)))
+        # Move it out and back in every few reductions, often part way through step.
+        scheduler.slice = 3
+        frames = 0
+        while True:
+            runs = iter(range(3))
+            scheduler.run(until = lambda: next(runs, None) is None)
+            if not scheduler.ready: break
+            actor = scheduler.ready.pop()
+            frames += actor.cont.rstack.depth()
+            data = migrate.dumps(actor)
+            scheduler.release(actor)
+            assert actor.cont is None and scheduler.address(actor.pid) is actor
+            scheduler.adopt(migrate.loads(data))
+        assert frames
+        cont.execute(interpret(cont, io.StringIO("receive int " * 20)))
+        assert [o.value for o in cont.stack.contents()] == list(range(20, 0, -1))
+
+    def test_idle_workers_steal(self) -> None:
+        with Cluster(2, self.words) as cluster:
+            starter = cluster.spawn("starter", 0)
+            cont = Continuation(Stack())
+            cont.prompt = ""
+            cluster.send(starter, StackObject(value=scheduler.actor(cont), stype=TActor))
+            cluster.send(starter, StackObject(value=20, stype=TInt))
+            # Every job tells us where it is.
+            cont.execute(interpret(cont, io.StringIO("receive actor " * 20)))
+            jobs = [o.value for o in cont.stack.contents()]
+            stats = cluster.stats()
+            assert stats[1]["stolen"] > 0 and stats[1]["steals"] > 0 and stats[1]["slices"] > 0
+            assert stats[2]["stolen"] == 0
+
+            # Messages for the jobs that moved are passed on to them.
+            cont.stack = Stack()
+            for n, job in enumerate(jobs):
+                cluster.send(job, StackObject(value=n, stype=TInt))
+                cluster.send(job, StackObject(value=cont.actor, stype=TActor))
+            cont.execute(interpret(cont, io.StringIO("receive int " * 20)))
+            assert sorted(o.value for o in cont.stack.contents()) == list(range(20))
+            assert cluster.wait_idle()
@@ -0,0 +1,114 @@
+import unittest
+import io
+from copy import deepcopy
+
+from continuation import Continuation, Stack
+from interpret import *
+
+from af_types import Type
+from af_types.af_int import TInt, op_plus
+from af_types.af_bool import TBool
+from af_types.af_environment import *
+from codegen import codegen, NativeMismatch
+from memo import memo
+
+
+class TestCodegen(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.save_types = deepcopy(Type.types)
+        self.save_ctors = deepcopy(Type.ctors)
+        self.save_templates = dict(codegen.templates)
+        self.words = """
+                fib : Int -> Int
+                    : 0 -> 0
+                    : 1 -> 1
+                    : Int -> Int;
+                        dup 1 int - fib swap 2 int - fib +.
+
+                divmod : Int Int -> Int Int Bool; / 2dup <.
+
+                noisy : Int -> Int; dup print fib.
+
+                down : Int -> Int
+                    : 0 -> 0
+                    : Int -> Int; 1 int - down.
+                """
+
+    def tearDown(self) -> None:
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+        codegen.templates = self.save_templates
+        codegen.enabled = True
+        codegen.verify = False
+        memo.clear()
+
+    def run_code(self, code: str, cont: Continuation = None) -> List[Any]:
+        cont = cont or Continuation(Stack())
+        cont.prompt = ""
+        cont.execute(interpret(cont, io.StringIO(code)))
+        return [(o.stype.name, o.value) for o in cont.stack.contents()]
+
+    def word(self, name: str) -> Operation:
+        return [op for op in Type.types["Int"].find(name) if op.words][0]
+
+    def test_generated_code_matches_interpreter(self) -> None:
+        code = "15 int fib 17 int 5 int divmod 7 int noisy 3 int down"
+        codegen.enabled = False
+        plain = self.run_code(self.words + code)
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+        assert plain == [("Int", 610), ("Int", 3), ("Int", 2), ("Bool", False), ("Int", 13), ("Int", 0)]
+
+        codegen.enabled = True
+        generated, calls = codegen.generated, codegen.calls
+        assert self.run_code(self.words + code) == plain
+        assert codegen.generated - generated == 3
+        # noisy is interpreted but the fib it calls isn't.
+        assert codegen.calls - calls == 4
+        assert "def entry(a0):" in codegen.source(self.word("fib"))
+        assert codegen.source(self.word("noisy")) is None
+
+        codegen.verify = True
+        checks = codegen.checks
+        assert self.run_code(code) == plain
+        # Including every call the interpreted words make.
+        assert codegen.checks - checks > 1000
+
+        # Something wrong with the generated code is caught.
+        codegen.templates[op_plus] = lambda g, args, word: [(g.temp("%s - %s" % (args[0][0], args[1][0])), TInt)]
+        Type.dictionary_changed()
+        with self.assertRaises(NativeMismatch):
+            self.run_code("6 int fib")
+
+    def test_falls_back_to_interpreter(self) -> None:
+        self.run_code(self.words)
+        fallbacks = codegen.fallbacks
+        # Too deep for Python but the interpreter eliminates the tail call.
+        assert self.run_code("5000 int down") == [("Int", 0)]
+        assert codegen.fallbacks - fallbacks == 1
+
+        # Called from outside the interpreter.
+        cont = Continuation(Stack())
+        cont.stack.push(StackObject(stype=TInt, value=10))
+        cont.op = self.word("fib")
+        cont.op(cont)
+        assert [o.value for o in cont.stack.contents()] == [55]
+
+    def test_pure_words_use_the_memo(self) -> None:
+        self.run_code("""
+                pfib : Int -> Int pure
+                    : 0 -> 0
+                    : 1 -> 1
+                    : Int -> Int;
+                        dup 1 int - pfib swap 2 int - pfib +.
+                """)
+        hits, misses = memo.hits, memo.misses
+        assert self.run_code("50 int pfib 50 int pfib") == [("Int", 12586269025), ("Int", 12586269025)]
+        assert memo.misses - misses == 49
+        assert memo.hits - hits == 47 + 1
+        assert "def entry" in codegen.source(self.word("pfib"))
+
+    def test_codegen_stats_is_impure(self) -> None:
+        with self.assertRaises(Exception):
+            self.run_code("noisy : Int -> Int pure; codegen_stats 1 int +.")
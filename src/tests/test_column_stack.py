@@ -0,0 +1,88 @@
+import unittest
+import io
+from copy import deepcopy
+
+from stack import KStack, Stack
+from column_stack import ColumnStack, INT_MAX
+from continuation import Continuation
+from interpret import *
+
+from af_types import Type, TAny
+from af_types.af_int import TInt
+from af_types.af_bool import TBool
+
+
+class TestColumnStack(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.save_types = deepcopy(Type.types)
+        self.save_ctors = deepcopy(Type.ctors)
+
+    def tearDown(self) -> None:
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+
+    def test_ints_are_stored_unboxed(self) -> None:
+        s = ColumnStack()
+        flag = StackObject(stype=TBool, value=True)
+        s.push(StackObject(stype=TInt, value=7))
+        s.push(flag)
+        s.push(StackObject(stype=TInt, value=INT_MAX + 1))
+
+        assert s.depth() == 3
+        assert list(s._ints) == [7, 0, 0]
+        assert s._objects[0] is None
+        assert s._objects[1] is flag
+        assert s.types(2) == [TBool, TInt]
+        assert s.tos_type() == TInt
+
+        # Objects in the object lane keep their identity, ints come back as equal values.
+        assert s.pop_int() == INT_MAX + 1
+        assert s.pop() is flag
+        assert s.tos().value == 7 and s.tos().stype == TInt
+        assert s.pop_int() == 7
+        assert s.pop() == KStack.Empty
+        assert s.tos_type() is None
+        assert s.total_operations() == 6
+
+    def test_views_and_copies(self) -> None:
+        s = ColumnStack()
+        for n in range(5):
+            s.push_int(n, TInt)
+        s.push(StackObject(stype=TAny, value="x"))
+
+        view = s.view()
+        assert len(view) == 6
+        assert [o.value for o in view[1:3]] == [1, 2]
+        assert view[-1].value == "x"
+        assert [o.value for o in s.contents(2)] == [4, "x"]
+
+        c = s.copy()
+        s.pop()
+        s.push_int(99, TInt)
+        assert [o.value for o in c.contents()] == [0, 1, 2, 3, 4, "x"]
+        assert [o.value for o in view] == [0, 1, 2, 3, 4, 99]
+        assert c.max_depth() == s.max_depth()
+
+    def test_same_results_as_stack(self) -> None:
+        code = """
+                fib : Int -> Int
+                    : 0 -> 0
+                    : 1 -> 1
+                    : Int -> Int;
+                        dup 1 int - fib swap 2 int - fib +.
+
+                poly : Int -> Int;
+                    dup dup * swap 3 int * + 7 int - .
+
+                15 int fib 5 int poly 3 int 4 int < 20 int 6 int /
+                """
+        results = []
+        for stack in [Stack(), ColumnStack()]:
+            Type.types = deepcopy(self.save_types)
+            Type.ctors = deepcopy(self.save_ctors)
+            cont = Continuation(stack)
+            cont.execute(interpret(cont, io.StringIO(code)))
+            results.append([(o.stype.name, o.value) for o in cont.stack.contents()])
+        assert results[0] == results[1]
+        assert results[1][:3] == [("Int", 610), ("Int", 33), ("Bool", True)]
@@ -6,6 +6,8 @@ from continuation import Continuation, Stack
 from interpret import *
 
 from aftype import StackObject
+from codegen import codegen
+from optimizer import optimizer
 from af_types import Type, TypeSignature, \
                     make_atom, TAtom
 
@@ -116,4 +118,128 @@ class TestExecution(unittest.TestCase):
         op, found = Type.op("not found", cont)
         assert not found
 
-        
\ No newline at end of file
+        
+    def test_deep_recursion(self) -> None:
+        code =  """
+                sumto : Int -> Int
+                    : 0 -> 0
+                    : Int -> Int;
+                        dup 1 int - sumto +.
+
+                1500 int sumto
+                """
+        assert self.execute(code) == 1125750
+        assert self.cont.rstack.depth() == 0
+
+    def test_tail_call(self) -> None:
+        code =  """
+                down : Int -> Int
+                    : 0 -> 0
+                    : Int -> Int;
+                        1 int - down.
+
+                3000 int down
+                """
+        assert self.execute(code) == 0
+        assert self.cont.rstack.depth() == 0
+        # Tail calls reuse their caller's frame rather than pushing new ones.
+        assert self.cont.rstack.max_depth() <= 2
+
+    def test_preemption(self) -> None:
+        self.cont.execute(interpret(self.cont, io.StringIO("""
+                sumto : Int -> Int
+                    : 0 -> 0
+                    : Int -> Int;
+                        dup 1 int - sumto +.
+                """)))
+        code = "200 int sumto 10 int countdown lcount + loop"
+        assert self.execute(code) == 20155
+
+        # Interpreted so that the calls are all instructions we can stop between.
+        codegen.enabled = False
+        try:
+            cont = Continuation(Stack())
+            cont.execute(interpret(cont, io.StringIO(code)), reductions = 25)
+            resumes = frames = 0
+            while cont.suspended:
+                assert cont.budget == 0
+                resumes += 1
+                frames = max(frames, cont.frames)
+                cont.resume(25)
+        finally:
+            codegen.enabled = True
+        assert cont.stack.tos().value == 20155
+        # Stopped part way into the recursion with its frames left to return from.
+        assert resumes > 20 and frames > 100
+        assert cont.rstack.depth() == 0 and cont.frames == 0
+
+        # No reductions means nothing runs rather than no limit.
+        cont = Continuation(Stack())
+        cont.execute(interpret(cont, io.StringIO("1 int 2 int +")), reductions = 0)
+        assert cont.suspended and cont.stack.depth() == 0
+        cont.resume()
+        assert not cont.suspended and cont.stack.tos().value == 3
+
+    def test_preemption_generated(self) -> None:
+        self.cont.execute(interpret(self.cont, io.StringIO("""
+                fib : Int -> Int
+                    : 0 -> 0
+                    : 1 -> 1
+                    : Int -> Int;
+                        dup 1 int - fib swap 2 int - fib +.
+                """)))
+        code = "20 int fib"
+        cont = Continuation(Stack())
+        cont.execute(interpret(cont, io.StringIO(code)), reductions = 100)
+        resumes = 0
+        while cont.suspended:
+            assert cont.budget <= 0
+            resumes += 1
+            cont.resume(100)
+        assert cont.stack.tos().value == 6765
+        # Generated calls spend reductions too rather than running 20 int fib in one go.
+        assert resumes > 100
+        assert codegen.native(Type.op("fib", cont)[0]) is not None
+
+    def test_literal_folding(self) -> None:
+        code =  """
+                addone : Int -> Int;
+                    1 int + .
+
+                flip : -> Bool;
+                    True bool not .
+
+                nonsense : -> Int;
+                    abc int .
+
+                1 int addone addone
+                """
+        # Left unfused so we can see the folded literal.
+        optimizer.enabled = False
+        try:
+            assert self.execute(code) == 3
+        finally:
+            optimizer.enabled = True
+
+        addone = Type.op("addone", self.cont)[0]
+        assert addone.folds == 1
+        assert [w.name for w in addone.words] == ["1 int", "+"]
+        constant = addone.words[0]
+        assert constant.sig == TypeSignature([],[StackObject(stype=TInt)])
+
+        # Every execution pushes the same prebuilt object...
+        self.cont.stack.pop()
+        constant(self.cont)
+        constant(self.cont)
+        assert self.cont.stack.pop() is self.cont.stack.pop()
+
+        # ...so words must not modify it.
+        assert self.execute("flip flip") == False
+        self.cont.stack.pop()
+        assert self.cont.stack.pop().value == False
+
+        # Literals the ctor rejects are left to fail at runtime.
+        nonsense = Type.op("nonsense", self.cont)[0]
+        assert nonsense.folds == 0
+        with self.assertRaises(ValueError):
+            self.execute("nonsense")
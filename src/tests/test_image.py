@@ -0,0 +1,78 @@
+import unittest
+import io
+import pickle
+from copy import deepcopy
+
+from continuation import Continuation, Stack
+from interpret import *
+from compiler import *
+from af_types.af_bool import *
+from af_types.af_int import op_plus, TInt
+
+from image import write_image, read_image, ImagePickler
+
+
+class TestImage(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.save_types = deepcopy(Type.types)
+        self.save_ctors = deepcopy(Type.ctors)
+        self.words = """
+                fib : Int -> Int
+                    : 0 -> 0
+                    : 1 -> 1
+                    : Int -> Int;
+                        dup 1 int - fib swap 2 int - fib +.
+
+                same : Int Int -> Int Int Bool;
+                    2dup == .
+
+                label : Int -> Atom; drop hello.
+
+                answer : -> Int; 40 int 2 int + .
+                """
+        self.code = "15 int fib 3 int 3 int same 7 int label answer"
+
+    def tearDown(self) -> None:
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+
+    def run_code(self, code: str) -> List[Any]:
+        cont = Continuation(Stack())
+        cont.execute(interpret(cont, io.StringIO(code)))
+        return [(o.stype.name, o.value) for o in cont.stack.contents()]
+
+    def test_image_round_trip(self) -> None:
+        expected = self.run_code(self.words + self.code)
+        assert expected[0] == ("Int", 610)
+        assert expected[-2:] == [("Atom", "hello"), ("Int", 42)]
+
+        image = io.BytesIO()
+        write_image(image)
+
+        # Back to a dictionary that's never seen these words.
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+        assert self.run_code("answer") == [("Atom", "answer")]
+
+        image.seek(0)
+        read_image(image)
+        assert not Type.journal
+        assert self.run_code(self.code) == expected
+        # Primitives come back as themselves rather than copies.
+        assert Type.types["Int"].find("+")[0].the_op is op_plus
+
+    def test_closures_must_be_rebuildable(self) -> None:
+        Type.add_op(Operation("anonymous", lambda c: None), Stack())
+        with self.assertRaises(pickle.PicklingError):
+            write_image(io.BytesIO())
+
+        constant = op_push_constant(StackObject(stype=TInt, value=3))
+        copy = pickle.loads(self.dumps(constant))
+        assert copy.constant == constant.constant
+        assert copy.recipe[0] is op_push_constant
+
+    def dumps(self, obj: Any) -> bytes:
+        f = io.BytesIO()
+        ImagePickler(f).dump(obj)
+        return f.getvalue()
@@ -1,6 +1,8 @@
 import unittest
 import io
+import pickle
 from copy import deepcopy
+from dataclasses import FrozenInstanceError
 
 from continuation import Continuation, Stack
 from interpret import *
@@ -102,6 +104,17 @@ class TestLocation(unittest.TestCase):
         assert l.linenum == 1
         assert l.column == 2
 
+    def test_packed_location(self) -> None:
+        l = Location("fib.a4", linenum=123456, column=78)
+        assert l == Location("fib.a4", 123456, 78)
+        assert l != Location("fact.a4", 123456, 78)
+        assert l._file == Location("fib.a4")._file
+        assert not hasattr(l, "__dict__")
+        with self.assertRaises(FrozenInstanceError):
+            l.linenum = 3
+        assert pickle.loads(pickle.dumps(l)) == l
+        assert repr(l) == "Location(filename='fib.a4', linenum=123456, column=78)"
+
 
 class TestSymbol(unittest.TestCase):
 
@@ -122,3 +135,9 @@ class TestSymbol(unittest.TestCase):
         assert s.location.linenum == 10
         assert s.location.column == 4
 
+    def test_symbol_ids_are_interned(self) -> None:
+        name = "".join(["f", "ib"])
+        s = Symbol(name, Location())
+        assert s.s_id is Symbol("fib").s_id
+        assert not hasattr(s, "__dict__")
+
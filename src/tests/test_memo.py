@@ -0,0 +1,113 @@
+import unittest
+import io
+from copy import deepcopy
+
+from continuation import Continuation, Stack
+from interpret import *
+
+from af_types import Type
+from af_types.af_int import TInt
+from af_types.af_environment import *
+from memo import memo, Memo
+
+
+class TestMemo(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.save_types = deepcopy(Type.types)
+        self.save_ctors = deepcopy(Type.ctors)
+        memo.clear()
+        self.fib = """
+                fib : Int -> Int pure
+                    : 0 -> 0
+                    : 1 -> 1
+                    : Int -> Int;
+                        dup 1 int - fib swap 2 int - fib +.
+                """
+
+    def tearDown(self) -> None:
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+        memo.enabled = True
+        memo.resize(4096)
+        memo.clear()
+
+    def run_code(self, code: str, cont: Continuation = None) -> List[Any]:
+        cont = cont or Continuation(Stack())
+        cont.execute(interpret(cont, io.StringIO(code)))
+        return [(o.stype.name, o.value) for o in cont.stack.contents()]
+
+    def test_pure_words_are_memoized(self) -> None:
+        memo.enabled = False
+        plain = self.run_code(self.fib + "15 int fib 7 int 10 int fib")
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+        assert plain == [("Int", 610), ("Int", 7), ("Int", 55)]
+        assert len(memo.entries) == 0
+
+        memo.enabled = True
+        hits, misses = memo.hits, memo.misses
+        assert self.run_code(self.fib + "15 int fib 7 int 10 int fib") == plain
+        # Each of fib 2..15 only runs once. fib n-2 is found for n = 4..15 as is fib 10.
+        assert memo.misses - misses == 14
+        assert memo.hits - hits == 12 + 1
+        assert len(memo.entries) == 14
+
+        # Calls from outside the interpreter cache their results too.
+        memo.clear()
+        cont = Continuation(Stack())
+        cont.stack.push(StackObject(stype=TInt, value=12))
+        fib, found = Type.op("fib", cont)
+        cont.op = fib
+        fib(cont)
+        assert [o.value for o in cont.stack.contents()] == [144]
+        assert len(memo.entries) == 11
+
+        self.run_code("memo_clear")
+        assert len(memo.entries) == 0
+
+    def test_least_recently_used_are_evicted(self) -> None:
+        m = Memo(max_size = 2)
+        cont = Continuation(Stack())
+        self.run_code(self.fib, cont)
+        fib = [op for op in Type.types["Int"].find("fib") if op.sig.pure and op.words][0]
+        keys = []
+        for n in [5, 6, 7]:
+            cont.stack.push(StackObject(stype=TInt, value=n))
+            keys.append(m.key(fib, cont.stack))
+            assert m.lookup(keys[-1]) is None
+            m.store(keys[-1], cont.stack, 1)
+            cont.stack.pop()
+            if n == 6: assert m.lookup(keys[0]) is not None
+        assert m.evictions == 1
+        assert list(m.entries) == [keys[0], keys[2]]
+
+        m.resize(1)
+        assert m.evictions == 2 and list(m.entries) == [keys[2]]
+
+        self.run_code("3 int memo_size")
+        assert memo.max_size == 3
+        self.run_code("20 int fib")
+        assert len(memo.entries) == 3 and memo.evictions > 0
+
+    def test_pure_words_cannot_call_impure_words(self) -> None:
+        with self.assertRaises(Exception):
+            self.run_code("shout : Int -> Int pure; dup print.")
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+
+        # Found through the words called as well.
+        self.run_code("""
+                show : Int -> Int; dup print.
+                twice : Int -> Int; 2 int *.
+                """)
+        self.run_code("quiet : Int -> Int pure; twice.")
+        with self.assertRaises(Exception):
+            self.run_code("noisy : Int -> Int pure; twice show.")
+
+        # Words reporting on or changing the cache itself are impure too.
+        for word in ("memo_stats", "memo_clear", "3 int memo_size"):
+            Type.types = deepcopy(self.save_types)
+            Type.ctors = deepcopy(self.save_ctors)
+            with self.assertRaises(Exception):
+                self.run_code("noisy : Int -> Int pure; %s 1 int +." % word)
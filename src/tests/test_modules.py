@@ -0,0 +1,117 @@
+import unittest
+import io
+import os
+import tempfile
+from copy import deepcopy
+from unittest import mock
+
+from continuation import Continuation, Stack
+from interpret import *
+from af_types.af_environment import *
+from af_types.af_bool import TBool
+import modules
+
+
+class TestModules(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.save_types = deepcopy(Type.types)
+        self.save_ctors = deepcopy(Type.ctors)
+        self.dir = tempfile.TemporaryDirectory()
+        self.write("base.a4", """
+            double : Int -> Int; dup + .
+            """)
+        self.write("vocab.a4", "%s load\n" % self.path("base") + """
+            quad : Int -> Int; double double .
+            zero? : Int -> Bool
+                : 0 -> True
+                : Int -> Bool; drop False.
+            """)
+        self.write("script.a4", "%s load\n" % self.path("base") + """
+            5 int double
+            """)
+
+    def tearDown(self) -> None:
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+        self.dir.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir.name, name)
+
+    def write(self, name: str, code: str) -> None:
+        with open(self.path(name), "w") as f:
+            f.write(code)
+
+    def run_code(self, c: Continuation, code: str) -> List[Any]:
+        c.prompt = ""
+        c.execute(interpret(c, io.StringIO(code)))
+        return [(o.stype.name, o.value) for o in c.stack.contents()]
+
+    def fresh(self) -> Continuation:
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+        return Continuation(Stack())
+
+    def test_load_once(self) -> None:
+        c = Continuation(Stack())
+        code = "%s load %s load %s load 3 int quad" % (self.path("vocab"), self.path("base"), self.path("vocab"))
+        assert self.run_code(c, code) == [("Int", 12)]
+        assert sorted(p for p in modules.loaded() if p.startswith(os.path.realpath(self.dir.name))) == \
+                sorted(os.path.realpath(self.path(n)) for n in ["base.a4", "vocab.a4"])
+
+        # Rolling back the words means loading the module again.
+        c = self.fresh()
+        mark = Type.checkpoint()
+        self.run_code(c, "%s load" % self.path("vocab"))
+        Type.rollback(mark)
+        assert not Type.types["Int"].find("quad")
+        assert self.run_code(c, "%s load 0 int zero?" % self.path("vocab")) == [("Bool", True)]
+
+        # However much has been defined since the rollback.
+        c = self.fresh()
+        self.run_code(c, "checkpoint %s load restore" % self.path("vocab"))
+        assert not Type.types["Int"].find("quad")
+        self.run_code(c, " ".join("filler%s : Int -> Int; dup + ." % n for n in range(10)))
+        assert self.run_code(c, "%s load 3 int quad" % self.path("vocab")) == [("Int", 12)]
+
+        # Loaded is loaded, whichever Continuation asks.
+        with mock.patch("modules._compile") as compile, mock.patch("modules._install") as install:
+            assert self.run_code(Continuation(Stack()), "%s load 2 int quad" % self.path("vocab")) == [("Int", 8)]
+            assert not compile.called and not install.called
+
+    def test_modules_are_installed_from_the_cache(self) -> None:
+        c = self.fresh()
+        assert self.run_code(c, "%s load 3 int quad" % self.path("vocab")) == [("Int", 12)]
+        cached = sorted(os.listdir(self.path(modules.CACHE_DIR)))
+        assert [n.split(".")[0] for n in cached] == ["base", "vocab"]
+
+        c = self.fresh()
+        with mock.patch("modules._compile") as compile:
+            assert self.run_code(c, "%s load 3 int quad 0 int zero? 2 int double" % self.path("vocab")) \
+                    == [("Int", 12), ("Bool", True), ("Int", 4)]
+            assert not compile.called
+        assert len(modules.loaded()) == 2
+
+        # Scripts that do more than define words always run from source.
+        c = self.fresh()
+        assert self.run_code(c, "%s load" % self.path("script")) == [("Int", 10)]
+        assert len(os.listdir(self.path(modules.CACHE_DIR))) == 2
+
+        # Changing a module replaces its cache entry.
+        self.write("base.a4", "double : Int -> Int; 2 int * .")
+        c = self.fresh()
+        assert self.run_code(c, "%s load 3 int quad" % self.path("vocab")) == [("Int", 12)]
+        assert len(os.listdir(self.path(modules.CACHE_DIR))) == 2
+        assert sorted(os.listdir(self.path(modules.CACHE_DIR))) != cached
+
+    def test_stale_references_fall_back_to_source(self) -> None:
+        c = self.fresh()
+        self.run_code(c, "%s load" % self.path("vocab"))
+
+        # Same module but something else is where its words were compiled against.
+        c = self.fresh()
+        self.run_code(c, "filler : Int -> Int; dup * .")
+        self.run_code(c, "%s load" % self.path("base"))
+        Type.types["Int"].ops_list.insert(0, Operation("imposter", op_nop))
+        assert self.run_code(c, "%s load 3 int quad" % self.path("vocab")) == [("Int", 12)]
@@ -1,6 +1,7 @@
 import unittest
 
-from operation import TypeSignature, Operation, op_nop, Stack
+from operation import TypeSignature, Operation, op_nop, Stack, SigValueTypeMismatchException, \
+                      SIG_MATCH, SIG_MISMATCH, SIG_UNDERRUN
 
 
 import logging
@@ -47,3 +48,45 @@ class OperationTests(unittest.TestCase):
         sig, match = op.check_stack_effect(Stack([StackObject(stype=TBool), StackObject(stype=TInt)]))
         assert sig == Stack([StackObject(stype=TBool), StackObject(stype=TInt)])
         assert match == True
+
+    def test_signature_matcher(self) -> None:
+        op = Operation("nop", op_nop, sig=TypeSignature([StackObject(stype=TInt), StackObject(stype=TInt, value=1)],
+                                                        [StackObject(stype=TBool)]))
+        stack = Stack([StackObject(stype=TInt, value=5), StackObject(stype=TInt, value=1)])
+        operations = stack.total_operations()
+
+        assert op.match_stack(stack) == SIG_MATCH
+        stack.tos().value = 2
+        assert op.match_stack(stack) == SIG_MISMATCH
+        assert op.match_stack(Stack([StackObject(stype=TInt, value=1)])) == SIG_UNDERRUN
+        assert op.match_stack(Stack([StackObject(stype=TBool), StackObject(stype=TInt, value=1)])) == SIG_MISMATCH
+        # Matching happens in place so the stack isn't touched.
+        assert stack.total_operations() == operations
+
+        with self.assertRaises(SigValueTypeMismatchException):
+            op.check_stack_effect(stack)
+
+        # Generic outputs get specialized to what they were matched against.
+        swap = Operation("swap", op_nop, sig=TypeSignature([StackObject(stype=Type("_a")), StackObject(stype=Type("_b"))],
+                                                          [StackObject(stype=Type("_b")), StackObject(stype=Type("_a"))]))
+        sig, match = swap.check_stack_effect(Stack([StackObject(stype=TBool), StackObject(stype=TInt, value=3)]))
+        assert sig == Stack([StackObject(stype=TInt, value=3), StackObject(stype=TBool)])
+
+        # Signatures built up in place get recompiled.
+        sig = TypeSignature([StackObject(stype=TInt)],[])
+        assert sig.matcher().depth == 1
+        sig.stack_in.push(StackObject(stype=TBool))
+        assert sig.matcher().type_names == ("Bool", "Int")
+
+    def test_code_follows_words(self) -> None:
+        one = Operation("one", op_nop)
+        two = Operation("two", op_nop)
+        op = Operation("word", op_nop)
+        op.add_word(one)
+        assert [w for w, _ in op.code()] == [one]
+        # Replaced in place (as when folding literals) so the length is unchanged.
+        op.words[-1] = two
+        op.words_changed()
+        assert [w for w, _ in op.code()] == [two]
+        op.add_word(one)
+        assert [w for w, _ in op.code()] == [two, one]
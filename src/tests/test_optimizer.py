@@ -0,0 +1,94 @@
+import unittest
+import io
+from copy import deepcopy
+
+from continuation import Continuation, Stack
+from interpret import *
+
+from af_types import Type, TAny
+from af_types.af_any import op_dup, op_drop
+from af_types.af_int import TInt, op_plus
+from af_types.af_bool import TBool
+from optimizer import Optimizer, optimizer, fused, CONSTANT
+
+
+class TestOptimizer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.save_types = deepcopy(Type.types)
+        self.save_ctors = deepcopy(Type.ctors)
+        self.words = """
+                fib : Int -> Int
+                    : 0 -> 0
+                    : 1 -> 1
+                    : Int -> Int;
+                        dup 1 int - fib swap 2 int - fib +.
+
+                same : Int Int -> Int Int Bool;
+                    2dup == .
+
+                sums : Int Int -> Int;
+                    swap drop dup + 3 int * 2 int + .
+                """
+
+    def tearDown(self) -> None:
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+        optimizer.enabled = True
+
+    def run_code(self, code: str) -> List[Any]:
+        cont = Continuation(Stack())
+        cont.execute(interpret(cont, io.StringIO(code)))
+        return [(o.stype.name, o.value) for o in cont.stack.contents()]
+
+    def test_fused_words_match_unoptimized(self) -> None:
+        code = "15 int fib 4 int 5 int sums 6 int 6 int same"
+
+        optimizer.enabled = False
+        plain = self.run_code(self.words + code)
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+
+        optimizer.enabled = True
+        rewrites = optimizer.rewrites
+        assert self.run_code(self.words + code) == plain
+        assert plain == [("Int", 610), ("Int", 32), ("Int", 6), ("Int", 6), ("Bool", True)]
+        assert optimizer.rewrites > rewrites
+
+        cont = Continuation(Stack())
+        cont.stack.push(StackObject(stype=TInt, value=4))
+        cont.stack.push(StackObject(stype=TInt, value=5))
+        sums, found = Type.op("sums", cont)
+        assert found
+        assert [w.name for w in sums.words] == ["swap drop", "dup +", "3 int *", "2 int +"]
+        assert [w.name for w in optimizer.originals[sums]] == \
+                ["swap", "drop", "dup", "+", "3 int", "*", "2 int", "+"]
+
+        dump = optimizer.dump(sums).splitlines()
+        assert dump[0].split() == ["before", "|", "after"]
+        assert dump[1].split() == ["swap", "|", "swap", "drop"]
+        assert len(dump) == 9
+
+        same, found = Type.op("same", cont)
+        assert [w.name for w in same.words] == ["2dup =="]
+
+    def test_fusions_are_verified(self) -> None:
+        opt = Optimizer()
+        # Wrong output type for dup + so it must never be applied.
+        opt.register("bad", [op_dup, op_plus], fused(op_drop), [TInt], [TBool])
+        opt.register("dup drop", [op_dup, op_drop], fused(op_nop), [TAny], [TAny])
+
+        dup = Type.types["Any"].find("dup")[0]
+        drop = Type.types["Any"].find("drop")[0]
+        plus = Type.types["Int"].find("+")[0]
+        word = Operation("test", op_nop, words = [dup, plus, dup, drop])
+
+        assert opt.optimize(word) == 1
+        assert [w.name for w in word.words] == ["dup", "+", "dup drop"]
+        assert word.words[-1].the_op is op_nop
+        assert opt.rejected == 1
+
+        # Nothing to do leaves the word alone.
+        word = Operation("test", op_nop, words = [plus])
+        assert opt.optimize(word) == 0
+        assert word not in opt.originals
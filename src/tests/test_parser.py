@@ -1,6 +1,7 @@
 import unittest
 import sys
 import io
+import glob
 
 from parser import Parser, Type
 
@@ -127,3 +128,21 @@ Code# Comment
         #print(results)
         test = [a==b for a,b in zip(tokens,results)]
         assert all(test)
+
+    def test_tokens_match_char_tokens(self) -> None:
+        for filename in glob.glob("samples/**/*.a4", recursive=True) + glob.glob("lib/*.a4"):
+            assert list(Parser(filename).tokens()) == list(Parser(filename).char_tokens()), filename
+
+    def test_tokens_across_block_boundaries(self) -> None:
+        text =  """
+"A #string" with	tabs	.punct:uation;
+    "Multi
+line" after# Comment "with quotes"
+\t\tdone."""
+        reference = Parser().open_handle(io.StringIO(text)).char_tokens()
+        expected = [t for t in reference]
+        for block_size in [1, 2, 3, 5, 64]:
+            p = Parser()
+            p.open_handle(io.StringIO(text))
+            p.BLOCK_SIZE = block_size
+            assert [t for t in p.tokens()] == expected, block_size
@@ -4,6 +4,8 @@ from copy import deepcopy
 
 from continuation import Continuation, Stack
 from compiler import *
+from dispatch import DecisionTree
+from operation import SIG_MATCH, SIG_MISMATCH
 from interpret import *
 
 from aftype import StackObject
@@ -78,3 +80,61 @@ class TestPatternMatching(unittest.TestCase):
         curry(self.cont)
         
         assert self.cont.stack.pop().value == 99
+
+    def test_decision_tree(self) -> None:
+        # An opcode table : Bool Int -> Int with a value for each Int plus fallbacks.
+        words = [Operation("op", op_gen(StackObject(stype=TInt,value=n*10),2),
+                    sig = TypeSignature([self.true_pattern, StackObject(stype=TInt,value=n)],[self.int_pattern]))
+                    for n in range(20)]
+        words.append(Operation("op", op_gen(StackObject(stype=TInt,value=-1),2),
+                    sig = TypeSignature([self.false_pattern, StackObject(stype=TInt,value=3)],[self.int_pattern])))
+        words.append(Operation("op", op_gen(StackObject(stype=TInt,value=-2),2),
+                    sig = TypeSignature([self.any_pattern, self.int_pattern],[self.int_pattern])))
+
+        tree = DecisionTree(words)
+        assert tree.depth == 2
+        assert tree.position == 0 # The Int has the most distinct values.
+        assert len(tree.buckets) == 20
+
+        def run(flag, n) -> int:
+            data = [StackObject(stype=TBool,value=flag), StackObject(stype=TInt,value=n)]
+            op, result = tree.match(data)
+            assert result == SIG_MATCH
+            # Always the same answer as trying each in turn.
+            assert op is [w for w in words if w.sig.matcher().match(data) == SIG_MATCH][0]
+            op(self.cont)
+            return self.cont.stack.pop().value
+
+        assert run(True, 7) == 70
+        assert run(False, 3) == -1
+        assert run(False, 7) == -2
+        assert run(True, 99) == -2
+
+        # Nothing matches a Bool on top.
+        op, result = tree.match([StackObject(stype=TInt,value=3), StackObject(stype=TBool,value=True)])
+        assert op is None and result == SIG_MISMATCH
+
+        # Type.find_op uses a tree per name and rebuilds it when overloads are added.
+        for word in words[:-1]:
+            Type.add_op(word, word.sig.stack_in)
+        self.cont.stack.push(StackObject(stype=TBool,value=True))
+        self.cont.stack.push(StackObject(stype=TInt,value=5))
+        op, found = Type.find_op("op", self.cont, "Int")
+        assert found and op is words[5]
+        assert Type.types["Int"].tree("op").size == 21
+
+        self.cont.stack.tos().value = 55
+        with self.assertRaises(Exception):
+            Type.find_op("op", self.cont, "Int")
+        Type.add_op(words[-1], words[-1].sig.stack_in)
+        assert Type.types["Int"].tree("op").size == 22
+        op, found = Type.find_op("op", self.cont, "Int")
+        assert found and op is words[-1]
+
+        # Short stacks take the linear search so underruns are still reported.
+        self.cont.stack.pop()
+        self.cont.stack.pop()
+        self.cont.stack.push(StackObject(stype=TInt,value=5))
+        with self.assertRaises(Exception) as x:
+            Type.find_op("op", self.cont, "Int")
+        assert "Underrun" in str(x.exception)
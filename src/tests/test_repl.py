@@ -7,3 +7,12 @@ class TestRepl(unittest.TestCase):
     def test_simple_code(self) -> None:
         code = afc("1 int 2 int +")
         assert do_repl("test", code) == 3
+
+    def test_image_needs_a_filename(self) -> None:
+        argv = sys.argv
+        sys.argv = ["repl.py", "--image"]
+        try:
+            with self.assertRaises(SystemExit):
+                setup_image()
+        finally:
+            sys.argv = argv
@@ -2,7 +2,7 @@ import unittest
 
 from itertools import repeat
 
-from stack import KStack, Stack
+from stack import KStack, Stack, TELEMETRY_OFF, TELEMETRY_SAMPLED, TELEMETRY_FULL
 
 class StackTests(unittest.TestCase):
 
@@ -132,6 +132,46 @@ class StackTests(unittest.TestCase):
         s = Stack( self.init_list )
         (s == self.init_list) == NotImplemented
 
+    def test_history_ring_wraps_in_order(self) -> None:
+        s = Stack()
+        for n in range(Stack.DEPTH_HISTORY + 10):
+            s.push(n)
+        self.assertEqual(s.depth_history(3), [Stack.DEPTH_HISTORY + 8, Stack.DEPTH_HISTORY + 9, Stack.DEPTH_HISTORY + 10])
+        self.assertEqual(s.depth_history()[0], 11)
+        self.assertEqual(s.history_depth_count(Stack.DEPTH_HISTORY + 10), 1)
+        self.assertEqual(s.max_depth(), Stack.DEPTH_HISTORY + 10)
+
+        r = s.copy()
+        s.pop()
+        self.assertEqual(r.depth_history(1), [Stack.DEPTH_HISTORY + 10])
+        self.assertEqual(s.depth_history(1), [Stack.DEPTH_HISTORY + 9])
+
+    def test_telemetry_modes(self) -> None:
+        off = Stack(self.init_list, telemetry = TELEMETRY_OFF)
+        self.assertEqual(off.depth(), len(self.init_list))
+        self.assertEqual(off.total_operations(), len(self.init_list))
+        self.assertEqual(off.max_depth(), None)
+        self.assertEqual(off.depth_history(), [])
+        self.assertEqual(off.history_depth_count(), [])
+        self.assertEqual(off.history_depth_count(1), 0)
+
+        sampled = Stack(telemetry = TELEMETRY_SAMPLED)
+        sampled.set_telemetry(TELEMETRY_SAMPLED, sample_rate = 4)
+        for n in range(10):
+            sampled.push(n)
+        self.assertEqual(sampled.depth_history(), [4, 8])
+        self.assertEqual(sampled.history_depth_count(), [(0,1), (4,1), (8,1)])
+        self.assertEqual(sampled.max_depth(), 8)
+        self.assertEqual(sampled.total_operations(), 10)
+
+        saved = Stack.TELEMETRY
+        try:
+            Stack.TELEMETRY = TELEMETRY_OFF
+            self.assertEqual(Stack().telemetry, TELEMETRY_OFF)
+            self.assertEqual(Stack(telemetry = TELEMETRY_FULL).telemetry, TELEMETRY_FULL)
+        finally:
+            Stack.TELEMETRY = saved
+
 class KevlinsStackTest(unittest.TestCase):
     """
     https://youtu.be/nrVIlhtoE3Y?t=3630
@@ -0,0 +1,42 @@
+import unittest
+import io
+import logging
+
+from continuation import Continuation, Stack
+from interpret import *
+
+from af_types.af_debug import *
+import tracing
+from tracing import trace, Lazy
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.level = logging.getLogger().level
+
+    def tearDown(self) -> None:
+        logging.getLogger().setLevel(self.level)
+        tracing.sync()
+
+    def test_arguments_only_computed_when_tracing(self) -> None:
+        computed = []
+        def expensive() -> str:
+            computed.append(1)
+            return "stack"
+
+        cont = Continuation(Stack())
+        cont.execute(interpret(cont, io.StringIO("debug off")))
+        assert not tracing.enabled
+        trace("Stack: %s", Lazy(expensive))
+        assert computed == []
+
+        cont.execute(interpret(cont, io.StringIO("debug on")))
+        assert tracing.enabled
+        with self.assertLogs(level = logging.DEBUG) as logs:
+            trace("Stack: %s", Lazy(expensive))
+        assert computed == [1]
+        assert logs.output[-1].endswith("Stack: stack")
+
+        cont.execute(interpret(cont, io.StringIO("debug off")))
+        assert not tracing.enabled
@@ -1,4 +1,6 @@
 import unittest
+import io
+import pickle
 from copy import deepcopy
 
 from continuation import Continuation, Stack
@@ -10,6 +12,8 @@ from af_types import Type, TypeSignature, \
 from af_types.af_int import *
 from af_types.af_bool import *
 from af_types.af_any import *
+from af_types.af_environment import *
+from interpret import interpret
 
 TTest = Type("Test")
 TParm1 = Type("Parm1")
@@ -70,6 +74,60 @@ class TestTypeSignature(unittest.TestCase):
         l = []
         assert Type.find_ctor("Test",l) == None
 
+    def test_ops_index(self) -> None:
+        make_word_context("test", lambda cont: 42, [TParm1])
+        make_word_context("test", lambda cont: 43, [TParm1, TParm1])
+
+        t_def = Type.types["Parm1"]
+        assert [op.sig.stack_in.depth() for op in t_def.find("test")] == [1, 2]
+        assert t_def.find("not found") == []
+        assert [op for op in t_def.ops_list if op.name == "test"] == t_def.find("test")
+
+        # Checkpoints keep the index consistent with their own ops_list.
+        saved = deepcopy(t_def)
+        assert saved.find("test") == [op for op in saved.ops_list if op.name == "test"]
+        assert saved.find("test")[0] is not t_def.find("test")[0]
+
+    def test_dispatch_cache(self) -> None:
+        cache = Type.dispatch_cache
+        make_word_context("test", lambda cont: 42, [TParm1])
+        self.cont.stack.push(StackObject(stype=TParm1, value="tparm"))
+
+        hits, misses = cache.hits, cache.misses
+        first, found = Type.op("test", self.cont)
+        assert found
+        second, found = Type.op("test", self.cont)
+        assert second is first
+        assert (cache.hits, cache.misses) == (hits + 1, misses + 1)
+
+        # New words bump the epoch and so flush the cache.
+        epoch = Type.epoch
+        make_word_context("test", lambda cont: 43, [TTest])
+        assert Type.epoch == epoch + 1
+        Type.op("test", self.cont)
+        assert cache.misses == misses + 2
+
+        # Different type on TOS is a different entry.
+        self.cont.stack.push(StackObject(stype=TTest))
+        op, found = Type.op("test", self.cont)
+        assert found and op.sig.stack_in.tos().stype == TTest
+
+        # Value patterns can't be keyed on types alone.
+        pattern_sig = TypeSignature([StackObject(stype=TTest, value="x")],[])
+        Type.add_op(Operation("test", lambda cont: 44, sig=pattern_sig), pattern_sig.stack_in)
+        fallbacks = cache.fallbacks
+        op, found = Type.op("test", self.cont)
+        assert cache.fallbacks == fallbacks + 1
+        assert op is Type.resolve_op("test", self.cont)[0]
+
+        # Replacing the dictionaries outright (as checkpoints do) flushes too.
+        Type.op("test", self.cont)
+        Type.types = deepcopy(Type.types)
+        self.cont.stack.pop()
+        op, found = Type.op("test", self.cont)
+        assert op is not first
+        assert op.sig == first.sig
+
     def test_op_with_type_signature(self) -> None:
 
         stack = Stack()
@@ -89,6 +147,54 @@ class TestTypeSignature(unittest.TestCase):
         op, found = Type.op("not found", cont)
         assert not found
 
+    def test_ctor_index(self) -> None:
+        index = Type.ctor_index
+        # Inputs are matched against the top of the stack.
+        l = [StackObject(stype=TTest), StackObject(stype=TParm1)]
+        hits = index.hits
+        assert Type.find_ctor("Test",l).the_op == TOp
+        assert Type.find_ctor("Test",l).the_op == TOp
+        assert index.hits == hits + 1
+        assert index.resolved[("Test", "Parm1")].the_op == TOp
+
+        # Multiple inputs and value patterns are matched each time.
+        pair = Operation('pair', TOp)
+        Type.register_ctor("Test", pair, [StackObject(stype=TParm1), StackObject(stype=TTest, value=3)])
+        assert not index.resolved
+        assert Type.find_ctor("Test", [StackObject(stype=TParm1), StackObject(stype=TTest, value=3)]) is pair
+        assert Type.find_ctor("Test", [StackObject(stype=TParm1), StackObject(stype=TTest, value=4)]) is None
+        assert Type.find_ctor("Test", [StackObject(stype=TTest, value=3)]) is None
+        assert ("Test", "Test") not in index.resolved
+
+        # Replacing the dictionaries flushes the index.
+        Type.ctors = deepcopy(self.save_ctors)
+        Type("Test")
+        assert Type.find_ctor("Test", [StackObject(stype=TParm1)]) is None
+
+    def test_types_are_singletons(self) -> None:
+        assert Type("Test") is TTest
+        assert Type.by_id[TTest.id] is TTest
+        assert TTest.id != TParm1.id
+        assert deepcopy(TTest) is TTest
+        assert pickle.loads(pickle.dumps(TTest)) is TTest
+        assert Type("_a").is_generic() and Type("_a") is Type("_a")
+        assert Type("_a").definition() is Type.types["Any"]
+
+        assert TTest == TTest and TTest != TParm1 and TTest == "Test"
+        assert TAny == TTest and TTest != TAny
+
+        # Cached definitions follow Type.types being replaced.
+        saved = Type.types
+        Type.types = deepcopy(saved)
+        assert TTest.definition() is Type.types["Test"]
+        assert TTest.definition() is not saved["Test"]
+        assert TTest.handler() is Type.types["Test"].op_handler
+
+        # A type missing from restored dictionaries is recreated when named again.
+        Type.types = {n: d for n, d in Type.types.items() if n != "Test"}
+        assert Type("Test") is TTest
+        assert TTest.definition() is Type.types["Test"]
+
     def test_op_with_type_multi_input_signature(self) -> None:
 
         stack = Stack()
@@ -247,3 +353,70 @@ class TestGenericTypeStuff(unittest.TestCase):
         assert item2.value == item4.value
         assert item1.value != item2.value
         assert self.c.stack.depth() == 0
+
+
+class TestCheckpoints(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.save_types = deepcopy(Type.types)
+        self.save_ctors = deepcopy(Type.ctors)
+        # Starting with no checkpoints outstanding.
+        self.save_journal = Type.journal, Type.marks
+        Type.journal, Type.marks = [], []
+
+    def tearDown(self) -> None:
+        Type.types = deepcopy(self.save_types)
+        Type.ctors = deepcopy(self.save_ctors)
+        Type.journal, Type.marks = self.save_journal
+
+    def run_code(self, c: Continuation, code: str) -> None:
+        c.execute(interpret(c, io.StringIO(code)))
+
+    def test_rollback_undoes_dictionary_changes(self) -> None:
+        any_words = len(Type.types["Any"].ops_list)
+        int_words = len(Type.types["Int"].ops_list)
+        mark = Type.checkpoint()
+        assert Type.checkpoint() == mark
+
+        TNew = Type("CheckpointNew")
+        Type.register_ctor("Int", Operation('fake', op_nop), [StackObject(stype=TNew)])
+        c = Continuation(Stack())
+        self.run_code(c, "double : Int -> Int; dup + . triple : Int -> Int; dup dup + + . "
+                         "answer : -> Int; 42 int . 3 int double")
+        assert c.stack.pop().value == 6
+        assert Type.checkpoint() == mark + 6
+
+        epoch = Type.epoch
+        Type.rollback(mark)
+        assert Type.epoch > epoch
+        assert Type.checkpoint() == mark
+        assert "CheckpointNew" not in Type.types and "CheckpointNew" not in Type.ctors
+        assert len(Type.types["Any"].ops_list) == any_words
+        assert len(Type.types["Int"].ops_list) == int_words
+        assert not Type.types["Int"].find("double")
+        assert Type.find_ctor("Int", [StackObject(stype=TNew)]).name == "int"
+
+        # Names that were forgotten come back when used again.
+        assert Type("CheckpointNew") is TNew
+        assert "CheckpointNew" in Type.types
+
+    def test_journal_only_kept_for_checkpoints(self) -> None:
+        c = Continuation(Stack())
+        assert not Type.marks and not Type.journal
+        self.run_code(c, "unjournaled : Int -> Int; dup + .")
+        assert not Type.journal
+
+        mark = Type.checkpoint()
+        self.run_code(c, "journaled : Int -> Int; dup * .")
+        assert len(Type.journal) == mark + 1
+        # Releasing the last checkpoint keeps the words and forgets how to undo them.
+        Type.release(mark)
+        assert not Type.journal
+        assert Type.types["Int"].find("journaled")
+
+    def test_checkpoint_and_restore_words(self) -> None:
+        c = Continuation(Stack())
+        self.run_code(c, "checkpoint seven : -> Int; 7 int . seven")
+        assert c.stack.pop().value == 7
+        self.run_code(c, "restore seven")
+        assert c.stack.pop().stype.name == "Atom"
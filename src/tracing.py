@@ -0,0 +1,51 @@
+"""
+tracing.py - debug logging that costs nothing while it's off.
+
+Debug messages used to be formatted with % before being handed to
+log.debug so every word executed paid for turning symbols, operations and
+whole stacks into strings even when nothing was logged. Instead they now
+go through trace() which checks our enabled flag before doing anything
+else and leaves formatting its arguments to logging, which only happens
+if the message is actually written. Arguments that are expensive to even
+compute can be wrapped in Lazy. The very hottest spots (like the
+Continuation.execute loop) test tracing.enabled themselves rather than
+pay for the call.
+
+`debug on` and `debug off` (see af_debug.py) turn tracing on and off
+along with the log level. Anything else changing the root log level
+directly should call sync() afterwards.
+"""
+import logging
+from typing import Any, Callable
+
+
+enabled : bool = False
+
+
+def sync() -> None:
+    """
+    Turns tracing on if the root logger is writing debug messages.
+    """
+    global enabled
+    enabled = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+
+def trace(msg: str, *args: Any) -> None:
+    if enabled:
+        # Reported as coming from our caller.
+        logging.getLogger().debug(msg, *args, stacklevel = 2)
+
+
+class Lazy:
+    """
+    An argument to trace() that is only computed if the message is written.
+    """
+    __slots__ = ("func",)
+
+    def __init__(self, func: Callable[[], Any]) -> None:
+        self.func = func
+
+    def __str__(self) -> str:
+        return str(self.func())
+
+    __repr__ = __str__
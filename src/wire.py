@@ -0,0 +1,51 @@
+"""
+wire.py - StackObjects as bytes for sending to other processes.
+
+Messages between processes (see cluster.py) are encoded as the pid of
+the actor they're for, a one byte tag saying what Type the message is and
+then whatever that Type's codec makes of the value - 8 bytes for an Int,
+one for a Bool and so on. No pickling. Types register their codecs along
+with a tag that must be the same in every process:
+
+    register_codec(TInt, 2, lambda v: pack("<q", v), lambda b: unpack("<q", b)[0])
+
+Only Types with a codec can be sent to another process.
+"""
+import struct
+from typing import Any, Callable, Dict, Tuple
+
+from aftype import AF_Type, StackObject
+
+
+HEADER = struct.Struct("<QB")   # Pid of the actor it's for and the Type's tag.
+CONTROL = 0                     # Tag for messages between schedulers rather than actors (see cluster.py).
+
+Encoder = Callable[[Any], bytes]
+Decoder = Callable[[bytes], StackObject]
+
+# Type name -> (tag, encoder) and tag -> decoder.
+encoders : Dict[str, Tuple[int, Encoder]] = {}
+decoders : Dict[int, Decoder] = {}
+
+
+def register_codec(stype: AF_Type, tag: int, encode: Encoder, decode: Callable[[bytes], Any]) -> None:
+    """
+    encode turns a value of stype into bytes and decode turns them back.
+    """
+    assert 0 < tag < 256, "Codec tags are a single byte."
+    assert tag not in decoders or encoders.get(stype.name, (None,))[0] == tag, "Codec tag %s is already taken." % tag
+    encoders[stype.name] = (tag, encode)
+    decoders[tag] = lambda data: StackObject(value=decode(data), stype=stype)
+
+
+def encode(pid: int, message: StackObject) -> bytes:
+    codec = encoders.get(message.stype.name)
+    if codec is None:
+        raise Exception("Can't send %s to another process." % message.stype)
+    tag, encoder = codec
+    return HEADER.pack(pid, tag) + encoder(message.value)
+
+
+def decode(data: bytes) -> Tuple[int, StackObject]:
+    pid, tag = HEADER.unpack_from(data)
+    return pid, decoders[tag](data[HEADER.size:])